@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 import requests
 import json
-import time
 from datetime import datetime
 
 # Get the backend URL from the frontend .env file
@@ -408,13 +407,10 @@ def add_24_orders():
         }
     ]
     
-    # Add each order one by one
-    added_orders = []
-    for i, order in enumerate(orders, 1):
-        print(f"\nAdding order {i}/24: {order['klient']} - {order['druh']}")
-        
-        # Convert the order data to match the API expectations
-        api_order = {
+    # Convert the order data to match the API expectations
+    api_orders = []
+    for order in orders:
+        api_orders.append({
             "datum": order["datum"],
             "druh": order["druh"],
             "klient": order["klient"],
@@ -431,25 +427,29 @@ def add_24_orders():
             "doba_realizace": order.get("dobaRealizace", 1),  # Default to 1 if not provided
             "poznamky": order.get("poznamky", ""),  # Default to empty string if not provided
             "soubory": []  # Default empty array
-        }
-        
-        try:
-            response = requests.post(f"{api_url}/users/{user_id}/zakazky", json=api_order)
-            
-            if response.status_code == 200:
-                data = response.json()
-                print(f"✅ Order added successfully! Response: {data}")
-                added_orders.append(data)
-            else:
-                print(f"❌ Failed to add order! Status code: {response.status_code}")
-                print(f"Response: {response.text}")
-            
-            # Add a small delay between requests to avoid overwhelming the server
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"❌ Error adding order: {str(e)}")
-    
+        })
+
+    # All orders go in one batchCreate request (one Firestore commit per 500 orders)
+    added_orders = []
+    print(f"\nAdding {len(api_orders)} orders in one batch request")
+    try:
+        response = requests.post(f"{api_url}/users/{user_id}/zakazky:batchCreate", json=api_orders)
+
+        if response.status_code == 200:
+            data = response.json()
+            for i, (order, result) in enumerate(zip(orders, data.get("results", [])), 1):
+                if result.get("status") == "created":
+                    print(f"✅ Order {i}/24 added: {order['klient']} - {order['druh']} ({result.get('zakazka_id')})")
+                    added_orders.append(result)
+                else:
+                    print(f"❌ Order {i}/24 failed: {order['klient']} - {result}")
+        else:
+            print(f"❌ Failed to add orders! Status code: {response.status_code}")
+            print(f"Response: {response.text}")
+
+    except Exception as e:
+        print(f"❌ Error adding orders: {str(e)}")
+
     # Verify that all orders were added
     print("\n" + "=" * 50)
     print("Verifying all orders were added...")
@@ -0,0 +1,183 @@
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import analytics
+from zakazky_query import QueryError, ZakazkyFilter
+
+# Číselná pole zakázky, která lze sčítat a průměrovat
+AGGREGATABLE_FIELDS = ('castka', 'zisk', 'fee', 'feeOff', 'material', 'palivo', 'pomocnik', 'doba_realizace')
+
+# Výchozí součty, když klient žádné nezadá (tržby a zisk)
+DEFAULT_SUM_FIELDS = ['castka', 'zisk']
+
+# Firestore povoluje nejvýše 5 agregací v jednom dotazu
+MAX_AGGREGATIONS_PER_QUERY = 5
+
+# Stránka streamovacího reduceru - načítají se jen agregovaná pole, stránka může být větší
+SCAN_PAGE_SIZE = 1000
+
+
+def parse_aggregate_fields(name: str, value: Optional[str]) -> List[str]:
+    """Převede 'castka,zisk' na seznam agregovaných polí"""
+    if not value:
+        return []
+    selected = []
+    for field in value.split(','):
+        field = field.strip()
+        if not field:
+            continue
+        if field not in AGGREGATABLE_FIELDS:
+            raise QueryError(f"Pole {field} nelze agregovat v parametru {name} (povoleno: {', '.join(AGGREGATABLE_FIELDS)})")
+        if field not in selected:
+            selected.append(field)
+    return selected
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class _Reducer:
+    """Součty a průměry počítané po dokumentech - stejná pravidla jako Firestore
+    agregace (nečíselné a chybějící hodnoty se přeskakují)."""
+
+    def __init__(self, sum_fields: List[str], avg_fields: List[str]):
+        self.count = 0
+        self.sums = {field: 0 for field in set(sum_fields) | set(avg_fields)}
+        self.numeric = {field: 0 for field in avg_fields}
+
+    def add(self, zakazka: Dict[str, Any]):
+        self.count += 1
+        for field in self.sums:
+            value = zakazka.get(field)
+            if _is_number(value):
+                self.sums[field] += value
+                if field in self.numeric:
+                    self.numeric[field] += 1
+
+    def result(self, sum_fields: List[str], avg_fields: List[str]) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": {field: self.sums[field] for field in sum_fields},
+            "avg": {
+                field: self.sums[field] / self.numeric[field] if self.numeric[field] else None
+                for field in avg_fields
+            },
+        }
+
+
+class AggregationService:
+    """Součty, průměry a počty zakázek bez přenášení dokumentů do Pythonu.
+
+    Pořadí strategií:
+
+    1. ``store`` - sloupcová kopie zakázek v ``OrderStore``, spočítá se vektorově,
+    2. ``cache`` - zakázky uživatele jsou v in-process cache, spočítá se v paměti,
+    3. ``aggregation`` - Firestore ``count()``/``sum()``/``avg()`` (filtry, které
+       Firestore umí vyhodnotit; platí se 1 čtení za 1000 indexových záznamů),
+    4. ``scan`` - stránkovaný streamovací reducer s projekcí jen agregovaných
+       polí (filtry vyhodnocované v paměti nebo nedostupná agregace).
+    """
+
+    def __init__(self, firebase_service):
+        self._service = firebase_service
+        self._methods = {'store': 0, 'cache': 0, 'aggregation': 0, 'scan': 0}
+        self._pushdown_failures = 0
+
+    async def aggregate(
+        self,
+        user_id: str,
+        filters: Optional[ZakazkyFilter] = None,
+        sum_fields: Iterable[str] = (),
+        avg_fields: Iterable[str] = (),
+    ) -> Optional[Dict[str, Any]]:
+        """Vrací ``{"count", "sum": {pole: ...}, "avg": {pole: ...}, "method"}``; None = fallback režim"""
+        sum_fields, avg_fields = list(sum_fields), list(avg_fields)
+        await self._service.start()
+        if not self._service.db:
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            return None
+
+        columns = self._service.orders.get(user_id)
+        if columns is not None and all(field in analytics.NUMERIC_FIELDS for field in sum_fields + avg_fields):
+            # Zámek sloupců drží i buildery ve vláknech - mimo event loop
+            result = await asyncio.to_thread(self._aggregate_columns, columns, filters, sum_fields, avg_fields)
+            return self._finish(result, 'store')
+
+        cached = self._service.cache.get(user_id)
+        if cached is not None:
+            reducer = _Reducer(sum_fields, avg_fields)
+            for zakazka in cached:
+                if not filters or filters.matches_all(zakazka):
+                    reducer.add(zakazka)
+            return self._finish(reducer.result(sum_fields, avg_fields), 'cache')
+
+        if not filters or not filters.post_filtered:
+            try:
+                result = await self._aggregate_pushdown(user_id, filters, sum_fields, avg_fields)
+                return self._finish(result, 'aggregation')
+            except Exception as e:
+                # Např. chybějící index nebo SDK bez sum()/avg() - spočítá se postaru
+                self._pushdown_failures += 1
+                print(f"⚠️ Firestore agregace selhala, počítám po dokumentech: {e}")
+
+        result = await self._aggregate_scan(user_id, filters, sum_fields, avg_fields)
+        return self._finish(result, 'scan')
+
+    def stats(self) -> Dict[str, Any]:
+        return {"methods": dict(self._methods), "pushdown_failures": self._pushdown_failures}
+
+    def _finish(self, result: Dict[str, Any], method: str) -> Dict[str, Any]:
+        self._methods[method] += 1
+        result["method"] = method
+        return result
+
+    @staticmethod
+    def _aggregate_columns(columns, filters: Optional[ZakazkyFilter], sum_fields: List[str], avg_fields: List[str]) -> Dict[str, Any]:
+        metrics = [('count', None)] + [('sum', field) for field in sum_fields] + [('avg', field) for field in avg_fields]
+        with columns.lock:
+            columns.apply_pending()
+            # Stejný výběr jako výpis zakázek - včetně kalendářových
+            mask = columns.mask(filters, include_calendar=True)
+            groups = analytics.group_by(columns, [], metrics, mask)["groups"]
+        totals = groups[0] if groups else {}
+        return {
+            "count": totals.get('count') or 0,
+            "sum": {field: totals.get(f"sum_{field}") or 0 for field in sum_fields},
+            "avg": {field: totals.get(f"avg_{field}") for field in avg_fields},
+        }
+
+    async def _aggregate_pushdown(
+        self, user_id: str, filters: Optional[ZakazkyFilter], sum_fields: List[str], avg_fields: List[str]
+    ) -> Dict[str, Any]:
+        query = self._service.filtered_zakazky_query(user_id, filters)
+        specs: List[Tuple[str, Optional[str]]] = [('count', None)]
+        specs += [('sum', field) for field in sum_fields] + [('avg', field) for field in avg_fields]
+
+        def _run(group):
+            aggregation = query
+            for op, field in group:
+                alias = op if field is None else f"{op}_{field}"
+                aggregation = aggregation.count(alias=alias) if op == 'count' else getattr(aggregation, op)(field, alias=alias)
+            return {result.alias: result.value for result in aggregation.get()[0]}
+
+        groups = [specs[start:start + MAX_AGGREGATIONS_PER_QUERY] for start in range(0, len(specs), MAX_AGGREGATIONS_PER_QUERY)]
+        values: Dict[str, Any] = {}
+        for partial in await asyncio.gather(*(self._service.executor.run(_run, group) for group in groups)):
+            values.update(partial)
+        return {
+            "count": int(values['count']),
+            "sum": {field: values[f"sum_{field}"] for field in sum_fields},
+            "avg": {field: values[f"avg_{field}"] for field in avg_fields},
+        }
+
+    async def _aggregate_scan(
+        self, user_id: str, filters: Optional[ZakazkyFilter], sum_fields: List[str], avg_fields: List[str]
+    ) -> Dict[str, Any]:
+        reducer = _Reducer(sum_fields, avg_fields)
+        fields = sorted(set(sum_fields) | set(avg_fields))
+        async for zakazka in self._service.stream_user_zakazky(
+            user_id, fields=fields, filters=filters, page_size=SCAN_PAGE_SIZE
+        ):
+            reducer.add(zakazka)
+        return reducer.result(sum_fields, avg_fields)
@@ -0,0 +1,381 @@
+import re
+import threading
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from datum_utils import parse_datum
+from order_store import PendingWrites
+from zakazky_query import QueryError, ZakazkyFilter
+
+# Číselná pole, která lze agregovat
+NUMERIC_FIELDS = ('castka', 'zisk', 'fee', 'feeOff', 'material', 'palivo', 'pomocnik')
+
+# Dimenze, podle kterých lze seskupovat ('district' = část adresy za poslední čárkou)
+DIMENSIONS = ('druh', 'klient', 'typ', 'month', 'year', 'district')
+
+OPERATIONS = ('sum', 'avg', 'min', 'max', 'count')
+
+# Pole zakázky potřebná pro sloupcovou kopii
+SOURCE_FIELDS = list(NUMERIC_FIELDS) + ['druh', 'klient', 'typ', 'datum', 'adresa', 'idZakazky', 'calendar_origin']
+
+DEFAULT_METRICS = 'count,sum:castka,sum:zisk'
+
+# Hodnota dimenze, kterou nejde určit (chybějící typ, nerozpoznané datum, ...)
+UNKNOWN = 'Neuvedeno'
+
+# Epoch-day pro zakázky bez rozpoznaného data
+MISSING_DAY = np.iinfo(np.int32).min
+
+_EPOCH = date(1970, 1, 1)
+_POSTAL_CODE = re.compile(r'^\d{3}\s?\d{2}\s*')
+# Pole, jejichž prefix CAL- označuje kalendářovou zakázku (viz zakazky_stats.is_calendar_order)
+_CALENDAR_ID_FIELDS = ('idZakazky', 'id_zakazky', 'cislo')
+
+Metric = Tuple[str, Optional[str]]
+
+
+def district(adresa: Any) -> str:
+    """Obec/část obce z adresy: 'Národní 15, 110 00 Praha 1' -> 'Praha 1'"""
+    if not isinstance(adresa, str) or not adresa.strip():
+        return UNKNOWN
+    part = _POSTAL_CODE.sub('', adresa.rsplit(',', 1)[-1].strip())
+    return part or UNKNOWN
+
+
+def _label(value: Any) -> str:
+    if value is None:
+        return UNKNOWN
+    value = str(value).strip()
+    return value or UNKNOWN
+
+
+class OrderColumns(PendingWrites):
+    """Sloupcová (NumPy) kopie zakázek jednoho uživatele.
+
+    Čísla jsou ``float64`` (chybějící hodnota = NaN), dimenze jsou slovníkově
+    kódované do ``int32`` (``codes[dim][i]`` je index do ``labels[dim]``),
+    datum je epoch-day. Seskupení je pak jen ``bincount`` nad kódy.
+
+    Kopii lze průběžně upravovat (``upsert``/``delete``): pole mají rezervu
+    a rostou po násobcích, smazané řádky se jen označí a po čase se
+    kopie zhutní. Úpravy i výpočty mimo event loop drží ``lock``.
+    """
+
+    def __init__(self, capacity: int = 0):
+        super().__init__()
+        self.size = 0
+        self.capacity = capacity
+        self.numeric = {field: np.full(capacity, np.nan) for field in NUMERIC_FIELDS}
+        self.codes = {dim: np.zeros(capacity, dtype=np.int32) for dim in DIMENSIONS}
+        self.labels: Dict[str, List[str]] = {dim: [] for dim in DIMENSIONS}
+        self.days = np.full(capacity, MISSING_DAY, dtype=np.int32)
+        self.calendar_id = np.zeros(capacity, dtype=bool)
+        self.calendar_origin = np.zeros(capacity, dtype=bool)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.ids: List[Optional[str]] = []
+        self.lock = threading.RLock()
+        self._rows: Dict[str, int] = {}
+        self._lookup: Dict[str, Dict[str, int]] = {dim: {} for dim in DIMENSIONS}
+        self._label_bytes = 0
+        # Data a adresy se v historii opakují - každý text se rozebere jednou
+        self._dates: Dict[str, Tuple[int, str, str]] = {}
+        self._districts: Dict[str, str] = {}
+
+    @classmethod
+    def from_orders(cls, orders: Iterable[Dict[str, Any]]) -> 'OrderColumns':
+        orders = list(orders)
+        columns = cls(len(orders))
+        for zakazka in orders:
+            columns.upsert(zakazka.get('id'), zakazka)
+        return columns
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, zakazka_id: str) -> bool:
+        return zakazka_id in self._rows
+
+    @property
+    def nbytes(self) -> int:
+        """Přibližná paměť kopie (pole + popisky + ID)"""
+        arrays = list(self.numeric.values()) + list(self.codes.values())
+        arrays += [self.days, self.calendar_id, self.calendar_origin, self.alive]
+        return sum(array.nbytes for array in arrays) + self._label_bytes + len(self.ids) * 120
+
+    @property
+    def calendar(self) -> np.ndarray:
+        return self.calendar_id[:self.size] | self.calendar_origin[:self.size]
+
+    def rows(self) -> np.ndarray:
+        """Indexy živých (nesmazaných) řádků"""
+        return np.nonzero(self.alive[:self.size])[0]
+
+    def upsert(self, zakazka_id: Optional[str], zakazka: Dict[str, Any]):
+        """Přidá zakázku, nebo u existující přepíše jen předaná pole"""
+        row = self._rows.get(zakazka_id)
+        if row is not None:
+            self._write_row(row, zakazka, full=False)
+            return
+        if self.size == self.capacity:
+            self._resize(max(16, int(self.capacity * 1.5)))
+        row = self.size
+        self.size += 1
+        self.ids.append(zakazka_id)
+        self._rows[zakazka_id] = row
+        self.alive[row] = True
+        self._write_row(row, zakazka, full=True)
+
+    def delete(self, zakazka_id: str):
+        row = self._rows.pop(zakazka_id, None)
+        if row is None:
+            return
+        self.alive[row] = False
+        self.ids[row] = None
+        # Víc než čtvrtina mrtvých řádků - zhutnit
+        if self.size > 64 and len(self._rows) < self.size * 0.75:
+            self._compact()
+
+    def mask(self, filters: Optional[ZakazkyFilter] = None, include_calendar: bool = False) -> np.ndarray:
+        """Výběr zakázek podle filtrů výpisu (vektorově)"""
+        selected = self.alive[:self.size].copy()
+        if not include_calendar:
+            selected &= ~self.calendar
+        if filters is None:
+            return selected
+        for dim, value in (('druh', filters.druh), ('klient', filters.klient)):
+            if value:
+                selected &= self.codes[dim][:self.size] == self._lookup[dim].get(value, -1)
+        if filters.has_date_range:
+            days = self.days[:self.size]
+            selected &= days != MISSING_DAY
+            if filters.date_from:
+                selected &= days >= (filters.date_from - _EPOCH).days
+            if filters.date_to:
+                selected &= days <= (filters.date_to - _EPOCH).days
+        return selected
+
+    def _code(self, dim: str, value: str) -> int:
+        lookup = self._lookup[dim]
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(lookup)
+            self.labels[dim].append(value)
+            self._label_bytes += len(value) * 2 + 80
+        return code
+
+    def _parse_date(self, datum: Any) -> Tuple[int, str, str]:
+        parsed = self._dates.get(datum) if isinstance(datum, str) else None
+        if parsed is None:
+            day = parse_datum(datum)
+            parsed = (
+                ((day - _EPOCH).days, f"{day.year:04d}-{day.month:02d}", f"{day.year:04d}")
+                if day else (MISSING_DAY, UNKNOWN, UNKNOWN)
+            )
+            if isinstance(datum, str):
+                self._dates[datum] = parsed
+        return parsed
+
+    def _write_row(self, row: int, zakazka: Dict[str, Any], full: bool):
+        """Zapíše pole zakázky do řádku; při ``full=False`` jen ta, která jsou v ``zakazka``"""
+        for field in NUMERIC_FIELDS:
+            if full or field in zakazka:
+                value = zakazka.get(field)
+                is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                self.numeric[field][row] = value if is_number else np.nan
+        if full or 'datum' in zakazka:
+            day, month, year = self._parse_date(zakazka.get('datum'))
+            self.days[row] = day
+            self.codes['month'][row] = self._code('month', month)
+            self.codes['year'][row] = self._code('year', year)
+        for dim in ('druh', 'klient', 'typ'):
+            if full or dim in zakazka:
+                self.codes[dim][row] = self._code(dim, _label(zakazka.get(dim)))
+        if full or 'adresa' in zakazka:
+            adresa = zakazka.get('adresa')
+            key = adresa if isinstance(adresa, str) else ''
+            if key not in self._districts:
+                self._districts[key] = district(adresa)
+            self.codes['district'][row] = self._code('district', self._districts[key])
+        if full or any(key in zakazka for key in _CALENDAR_ID_FIELDS):
+            self.calendar_id[row] = any(str(zakazka.get(key) or '').startswith('CAL-') for key in _CALENDAR_ID_FIELDS)
+        if full or 'calendar_origin' in zakazka:
+            self.calendar_origin[row] = zakazka.get('calendar_origin') is True
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {f"numeric:{field}": array for field, array in self.numeric.items()}
+        arrays.update((f"codes:{dim}", array) for dim, array in self.codes.items())
+        arrays.update(days=self.days, calendar_id=self.calendar_id, calendar_origin=self.calendar_origin, alive=self.alive)
+        return arrays
+
+    def _set_arrays(self, arrays: Dict[str, np.ndarray]):
+        for name, array in arrays.items():
+            if name.startswith('numeric:'):
+                self.numeric[name[8:]] = array
+            elif name.startswith('codes:'):
+                self.codes[name[6:]] = array
+            else:
+                setattr(self, name, array)
+
+    def _resize(self, capacity: int):
+        resized = {}
+        for name, array in self._arrays().items():
+            fill = np.nan if array.dtype == np.float64 else (MISSING_DAY if name == 'days' else 0)
+            new = np.full(capacity, fill, dtype=array.dtype)
+            new[:self.size] = array[:self.size]
+            resized[name] = new
+        self._set_arrays(resized)
+        self.capacity = capacity
+
+    def _compact(self):
+        keep = self.rows()
+        compacted = {}
+        for name, array in self._arrays().items():
+            new = np.empty(max(len(keep), 16), dtype=array.dtype)
+            new[:len(keep)] = array[keep]
+            new[len(keep):] = np.nan if array.dtype == np.float64 else 0
+            compacted[name] = new
+        self._set_arrays(compacted)
+        self.ids = [self.ids[row] for row in keep]
+        self._rows = {zakazka_id: row for row, zakazka_id in enumerate(self.ids)}
+        self.size = len(keep)
+        self.capacity = len(compacted['alive'])
+
+
+def parse_group_by(value: Optional[str]) -> List[str]:
+    keys = [key.strip() for key in (value or '').split(',') if key.strip()]
+    for key in keys:
+        if key not in DIMENSIONS:
+            raise QueryError(f"Nelze seskupit podle {key} (povoleno: {', '.join(DIMENSIONS)})")
+    if len(set(keys)) != len(keys):
+        raise QueryError("Dimenze v group_by se opakuje")
+    return keys
+
+
+def parse_metrics(value: Optional[str]) -> List[Metric]:
+    """'count,sum:zisk,avg:castka' -> [('count', None), ('sum', 'zisk'), ('avg', 'castka')]"""
+    metrics: List[Metric] = []
+    for spec in (value or DEFAULT_METRICS).split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+        op, _, field = spec.partition(':')
+        if op not in OPERATIONS:
+            raise QueryError(f"Neznámá operace {op} (povoleno: {', '.join(OPERATIONS)})")
+        if op == 'count':
+            metric = ('count', None)
+        elif field not in NUMERIC_FIELDS:
+            raise QueryError(f"Pole {field or '?'} nelze agregovat (povoleno: {', '.join(NUMERIC_FIELDS)})")
+        else:
+            metric = (op, field)
+        if metric not in metrics:
+            metrics.append(metric)
+    if not metrics:
+        raise QueryError("Zadejte alespoň jednu metriku")
+    return metrics
+
+
+def metric_alias(metric: Metric) -> str:
+    op, field = metric
+    return op if field is None else f"{op}_{field}"
+
+
+def parse_sort(value: Optional[str], keys: List[str], metrics: List[Metric]) -> Tuple[str, bool]:
+    """'-sum_zisk' -> ('sum_zisk', True); výchozí je první metrika sestupně"""
+    if not value:
+        return metric_alias(metrics[0]), True
+    descending = value.startswith('-')
+    column = value.lstrip('-')
+    if column not in keys and column not in [metric_alias(metric) for metric in metrics]:
+        raise QueryError(f"Nelze řadit podle {column} - musí jít o dimenzi z group_by nebo metriku")
+    return column, descending
+
+
+def _number(value: float) -> Optional[float]:
+    if not np.isfinite(value):
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 6)
+
+
+def _label_ranks(labels: List[str]) -> np.ndarray:
+    """Pořadí popisků podle abecedy - ``ranks[kód]``"""
+    ranks = np.empty(len(labels), dtype=np.int64)
+    ranks[np.argsort(np.array(labels, dtype=object), kind='stable')] = np.arange(len(labels))
+    return ranks
+
+
+def group_by(
+    columns: OrderColumns,
+    keys: List[str],
+    metrics: List[Metric],
+    mask: Optional[np.ndarray] = None,
+    sort: Optional[Tuple[str, bool]] = None,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Seskupí vybrané zakázky podle ``keys`` a spočítá ``metrics`` pro každou skupinu.
+
+    Vrací ``{"groups": [...], "total_groups": n, "orders": počet zakázek}``;
+    ``limit`` ořízne seřazené skupiny (top-N).
+    """
+    rows = np.nonzero(mask)[0] if mask is not None else columns.rows()
+    if keys:
+        sizes = [max(len(columns.labels[key]), 1) for key in keys]
+        combined = np.ravel_multi_index([columns.codes[key][rows] for key in keys], sizes)
+        groups, inverse = np.unique(combined, return_inverse=True)
+        group_codes = np.unravel_index(groups, sizes)
+    else:
+        groups = np.zeros(1 if len(rows) else 0, dtype=np.int64)
+        inverse = np.zeros(len(rows), dtype=np.int64)
+        group_codes = ()
+    size = len(groups)
+
+    results: Dict[str, np.ndarray] = {}
+    counts = np.bincount(inverse, minlength=size)
+    for metric in metrics:
+        op, field = metric
+        if op == 'count':
+            results[metric_alias(metric)] = counts.astype(np.float64)
+            continue
+        values = columns.numeric[field][rows]
+        present = ~np.isnan(values)
+        if op in ('sum', 'avg'):
+            sums = np.bincount(inverse, weights=np.where(present, values, 0.0), minlength=size)
+            if op == 'sum':
+                results[metric_alias(metric)] = sums
+            else:
+                numbers = np.bincount(inverse, weights=present, minlength=size)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    results[metric_alias(metric)] = np.where(numbers > 0, sums / np.maximum(numbers, 1), np.nan)
+        else:
+            extreme = np.full(size, np.inf if op == 'min' else -np.inf)
+            (np.fmin if op == 'min' else np.fmax).at(extreme, inverse, values)
+            results[metric_alias(metric)] = extreme
+
+    # Základní pořadí podle popisků skupin - kódy závisí na historii zápisů
+    order = np.arange(size)
+    if keys and size:
+        ranks = [_label_ranks(columns.labels[key])[group_codes[k]] for k, key in enumerate(keys)]
+        order = np.lexsort(ranks[::-1])
+    if sort and size:
+        column, descending = sort
+        if column in results:
+            values = results[column][order]
+            # NaN/±inf (skupina bez hodnot) vždy na konec
+            finite = np.isfinite(values)
+            key = np.where(finite, -values if descending else values, np.inf)
+            order = order[np.argsort(key, kind='stable')]
+        else:
+            key = _label_ranks(columns.labels[column])[group_codes[keys.index(column)]][order]
+            order = order[np.argsort(-key if descending else key, kind='stable')]
+    if limit is not None:
+        order = order[:limit]
+
+    output = []
+    for i in order:
+        group = {key: columns.labels[key][group_codes[k][i]] for k, key in enumerate(keys)}
+        for alias, values in results.items():
+            group[alias] = _number(values[i])
+        output.append(group)
+    return {"groups": output, "total_groups": size, "orders": int(len(rows))}
@@ -0,0 +1,149 @@
+import bisect
+import threading
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from datum_utils import epoch_day, parse_datum
+from order_store import PendingWrites
+from zakazky_cache import estimate_size
+from zakazky_stats import is_calendar_order
+
+# Třídy délky zakázky ve dnech. Interval z třídy s limitem ``c`` začíná nejdřív
+# ``c - 1`` dní před oknem, takže dotaz prohledá v každé třídě jen úzký rozsah
+# začátků. Delší zakázky (poslední třída) se hledají podle největší délky v ní.
+DURATION_CLASSES = (1, 7, 31, 366)
+
+
+def _duration(zakazka: Dict[str, Any]) -> Optional[int]:
+    doba = zakazka.get('doba_realizace', zakazka.get('dobaRealizace'))
+    if isinstance(doba, (int, float)) and not isinstance(doba, bool) and doba > 1:
+        return int(doba)
+    return None
+
+
+def interval(zakazka: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """Interval zakázky v kalendáři jako ``[začátek, konec)`` v epoch-day.
+
+    Stejná pravidla jako ``CalendarComponent``: ``doba_realizace`` dní od
+    ``datum``, jinak do ``endDate`` včetně, jinak jeden den. None = datum
+    nejde rozpoznat.
+    """
+    start_date = parse_datum(zakazka.get('datum'))
+    if start_date is None:
+        return None
+    start = epoch_day(start_date)
+    doba = _duration(zakazka)
+    if doba:
+        return start, start + doba
+    end_date = parse_datum(zakazka.get('endDate'))
+    if end_date is not None:
+        return start, max(epoch_day(end_date) + 1, start + 1)
+    return start, start + 1
+
+
+class CalendarIndex(PendingWrites):
+    """Intervalový index zakázek jednoho uživatele pro kalendář.
+
+    Zakázky jsou rozdělené podle délky do tříd (``DURATION_CLASSES``), v každé
+    třídě seřazené podle začátku. Dotaz na okno ``[from, to)`` je pak jen
+    bisect v každé třídě - cena závisí na počtu zakázek v okně, ne na délce
+    historie. ``upsert``/``delete`` index upravují po jednotlivých zakázkách
+    (stejné rozhraní jako ``analytics.OrderColumns``, drží ho ``OrderStore``).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._items: Dict[str, Tuple[Optional[Tuple[int, int]], int, Dict[str, Any]]] = {}
+        self._classes: List[List[Tuple[int, str]]] = [[] for _ in range(len(DURATION_CLASSES) + 1)]
+        self._longest = 0
+        self._bytes = 0
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_orders(cls, orders: Iterable[Dict[str, Any]]) -> 'CalendarIndex':
+        index = cls()
+        for zakazka in orders:
+            zakazka = dict(zakazka)
+            index._store(zakazka['id'], zakazka, sort=False)
+        for entries in index._classes:
+            entries.sort()
+        return index
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, zakazka_id: str) -> bool:
+        return zakazka_id in self._items
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes + len(self._items) * 64
+
+    def span(self, zakazka_id: str) -> Optional[Tuple[int, int]]:
+        item = self._items.get(zakazka_id)
+        return item[0] if item else None
+
+    def upsert(self, zakazka_id: str, zakazka: Dict[str, Any]):
+        """Přidá zakázku, nebo u existující přepíše jen předaná pole"""
+        current = self._items.get(zakazka_id)
+        if current is not None:
+            self._discard(zakazka_id)
+            zakazka = dict(current[2], **zakazka)
+        self._store(zakazka_id, dict(zakazka, id=zakazka_id))
+
+    def delete(self, zakazka_id: str):
+        if zakazka_id in self._items:
+            self._discard(zakazka_id)
+
+    def query(self, date_from: date, date_to: date, calendar_only: bool = True) -> List[Dict[str, Any]]:
+        """Zakázky, jejichž interval zasahuje do dnů ``date_from`` až ``date_to`` (včetně), podle začátku"""
+        return [zakazka for _, zakazka in self.spans(date_from, date_to, calendar_only)]
+
+    def spans(
+        self, date_from: Optional[date] = None, date_to: Optional[date] = None, calendar_only: bool = False
+    ) -> List[Tuple[Tuple[int, int], Dict[str, Any]]]:
+        """Dvojice (interval, zakázka) zasahující do okna; bez mezí = celá historie"""
+        first = epoch_day(date_from) if date_from else None
+        end = epoch_day(date_to) + 1 if date_to else None
+        limits = list(DURATION_CLASSES) + [self._longest]
+        found: List[Tuple[int, str]] = []
+        for entries, limit in zip(self._classes, limits):
+            lo = bisect.bisect_left(entries, (first - limit + 1, '')) if first is not None else 0
+            hi = bisect.bisect_left(entries, (end, '')) if end is not None else len(entries)
+            found.extend(entries[lo:hi])
+        found.sort()
+        result = []
+        for _, zakazka_id in found:
+            span, _, zakazka = self._items[zakazka_id]
+            if (first is None or span[1] > first) and (not calendar_only or is_calendar_order(zakazka)):
+                result.append((span, zakazka))
+        return result
+
+    def _store(self, zakazka_id: str, zakazka: Dict[str, Any], sort: bool = True):
+        span = interval(zakazka)
+        size = estimate_size(zakazka)
+        self._items[zakazka_id] = (span, size, zakazka)
+        self._bytes += size
+        if span is None:
+            return
+        klass = self._class(span)
+        if klass == len(DURATION_CLASSES):
+            self._longest = max(self._longest, span[1] - span[0])
+        if sort:
+            bisect.insort(self._classes[klass], (span[0], zakazka_id))
+        else:
+            self._classes[klass].append((span[0], zakazka_id))
+
+    def _discard(self, zakazka_id: str):
+        span, size, _ = self._items.pop(zakazka_id)
+        self._bytes -= size
+        if span is None:
+            return
+        entries = self._classes[self._class(span)]
+        position = bisect.bisect_left(entries, (span[0], zakazka_id))
+        if position < len(entries) and entries[position] == (span[0], zakazka_id):
+            del entries[position]
+
+    @staticmethod
+    def _class(span: Tuple[int, int]) -> int:
+        return bisect.bisect_left(DURATION_CLASSES, span[1] - span[0])
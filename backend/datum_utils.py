@@ -0,0 +1,56 @@
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+# "11. 4. 2025", "11.4.2025", "11. 04. 2025"
+_CZECH_DATE = re.compile(r'^\s*(\d{1,2})\.\s*(\d{1,2})\.\s*(\d{4})\s*$')
+# "2025-04-11" (případně s časem za datem)
+_ISO_DATE = re.compile(r'^\s*(\d{4})-(\d{1,2})-(\d{1,2})')
+
+# Normalizovaná podoba ``datum`` ukládaná vedle původního textu - umožní
+# rozsahové dotazy a řazení přímo ve Firestore
+DATUM_ISO_FIELD = 'datum_iso'
+DATUM_DAY_FIELD = 'datum_epoch_day'
+
+_EPOCH = date(1970, 1, 1)
+
+
+def parse_datum(value: Any) -> Optional[date]:
+    """Převede datum zakázky (český formát nebo ISO) na ``date``; nerozpoznané vrací None"""
+    if isinstance(value, date):
+        return value
+    if not isinstance(value, str):
+        return None
+    match = _CZECH_DATE.match(value)
+    if match:
+        day, month, year = (int(part) for part in match.groups())
+    else:
+        match = _ISO_DATE.match(value)
+        if not match:
+            return None
+        year, month, day = (int(part) for part in match.groups())
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def epoch_day(value: date) -> int:
+    """Počet dní od 1. 1. 1970"""
+    return (value - _EPOCH).days
+
+
+def from_epoch_day(day: int) -> date:
+    return _EPOCH + timedelta(days=day)
+
+
+def normalized_datum(value: Any) -> Dict[str, Any]:
+    """Normalizovaná pole pro ``datum``: ``{"datum_iso": "2025-04-11", "datum_epoch_day": 20189}``.
+
+    Nerozpoznané datum dává None v obou polích, aby po opravě na neplatnou
+    hodnotu nezůstala stará normalizace.
+    """
+    parsed = parse_datum(value)
+    if parsed is None:
+        return {DATUM_ISO_FIELD: None, DATUM_DAY_FIELD: None}
+    return {DATUM_ISO_FIELD: parsed.isoformat(), DATUM_DAY_FIELD: epoch_day(parsed)}
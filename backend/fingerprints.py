@@ -0,0 +1,84 @@
+import hashlib
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from datum_utils import parse_datum
+
+# Pole, podle kterých se zakázky považují za duplicitní - stejná jako
+# ``remove_duplicates_supabase.sql`` (GROUP BY datum, klient, castka, druh, adresa)
+FINGERPRINT_FIELDS = ('datum', 'klient', 'castka', 'druh', 'adresa')
+
+# Pole zakázky s otiskem
+FINGERPRINT_FIELD = 'fingerprint'
+
+# Co dělat s pravděpodobnou duplicitou při zakládání zakázky
+DUPLICATES_FLAG = 'flag'
+DUPLICATES_REJECT = 'reject'
+DUPLICATE_MODES = (DUPLICATES_FLAG, DUPLICATES_REJECT)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ''
+    text = unicodedata.normalize('NFC', str(value))
+    return _WHITESPACE.sub(' ', text).strip().casefold()
+
+
+def _amount(value: Any) -> str:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"{value:.2f}"
+    return _text(value)
+
+
+def fingerprint(zakazka: Dict[str, Any]) -> str:
+    """Otisk obsahu zakázky (hex SHA-256).
+
+    Normalizuje se tak, aby se shodly i drobně odlišné zápisy téže zakázky:
+    datum "11. 4. 2025" = "2025-04-11", částka 1500 = 1500.0, texty bez
+    rozdílu velikosti písmen a vícenásobných mezer.
+    """
+    datum = parse_datum(zakazka.get('datum'))
+    parts = [
+        datum.isoformat() if datum else _text(zakazka.get('datum')),
+        _text(zakazka.get('klient')),
+        _amount(zakazka.get('castka')),
+        _text(zakazka.get('druh')),
+        _text(zakazka.get('adresa')),
+    ]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def touches_fingerprint(fields: Iterable[str]) -> bool:
+    """Mění úprava těchto polí otisk? (pak je potřeba číst původní zakázku)"""
+    return any(field in FINGERPRINT_FIELDS for field in fields)
+
+
+def group_duplicates(zakazky: Iterable[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Rozdělí zakázky podle otisku jedním průchodem (hash mapa místo porovnávání každé s každou)"""
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for zakazka in zakazky:
+        groups.setdefault(fingerprint(zakazka), []).append(zakazka)
+    return groups
+
+
+def split_duplicates(group: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Ze skupiny stejných zakázek ponechá nejstarší (nejdříve upravenou, pak podle ID) - jako SQL s MIN(id)"""
+    def _age(zakazka: Dict[str, Any]) -> Tuple[Any, ...]:
+        updated_at = zakazka.get('updated_at')
+        return (updated_at is None, str(updated_at or ''), zakazka['id'])
+
+    ordered = sorted(group, key=_age)
+    return ordered[0], ordered[1:]
+
+
+def stored_fingerprint(zakazka: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Otisk uložený u zakázky - jen takové zakázky jsou v indexu otisků"""
+    return (zakazka or {}).get(FINGERPRINT_FIELD)
+
+
+def duplicate_ids(existing: Optional[Dict[str, Any]]) -> List[str]:
+    """ID zakázek z dokumentu indexu otisků (users/{id}/fingerprints/{hash})"""
+    return list((existing or {}).get('zakazky') or [])
@@ -1,14 +1,194 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
+import asyncio
 import json
 import os
-from typing import Dict, Any, List, Optional
-from dotenv import load_dotenv
-from pathlib import Path
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple, AsyncIterator, Callable
+
+from datum_utils import DATUM_DAY_FIELD, DATUM_ISO_FIELD, from_epoch_day, normalized_datum
+from firestore_executor import FirestoreExecutor
+from idempotency import STATE_PENDING
+from fingerprints import (
+    DUPLICATES_FLAG, DUPLICATES_REJECT, FINGERPRINT_FIELD, FINGERPRINT_FIELDS, duplicate_ids, fingerprint, group_duplicates,
+    split_duplicates, stored_fingerprint, touches_fingerprint,
+)
+from zakazky_cache import ZakazkyCache
+from order_store import OrderStore
+import analytics
+import pricing
+from calendar_index import DURATION_CLASSES, CalendarIndex, interval
+from user_versions import DATA_VERSION_FIELD, UserVersions
+from zakazky_events import ZakazkyEventHub
+from zakazky_query import (
+    DATE_PUSHDOWN, STREAM_PAGE_SIZE, SYNC_OVERLAP, QueryError, ZakazkyFilter, decode_changes_cursor, encode_changes_cursor,
+    encode_cursor, parse_cursor_args, project,
+)
+import zakazky_stats
+
+# Firestore povoluje nejvýše 500 zápisů v jednom batch commitu
+FIRESTORE_BATCH_LIMIT = 500
+
+
+# Kolikrát se přepočet agregací zopakuje, když během něj proběhne zápis
+REBUILD_ATTEMPTS = 3
+
+
+# Stránka hromadného přepočtu fee a zisku (výpočet běží nad celou stránkou najednou)
+REPRICE_PAGE_SIZE = 1000
+
+
+# Commit s přírůstky souhrnu/rollupů zakládá značku ``users/{id}/commits/{uuid}`` -
+# opakování po nejednoznačné chybě (timeout) podle ní pozná, že první pokus
+# prošel, a přírůstky se nezapočítají dvakrát. Značky maže TTL politika nad
+# ``expires_at``. Do limitu batche se rezervují zápisy značky a verze dat.
+COMMIT_MARKER_TTL = timedelta(days=1)
+COMMIT_RESERVED_WRITES = 2
+
+# Prodlevy mezi opakováními batch commitu při přechodné chybě (sekundy)
+BATCH_RETRY_DELAYS = [
+    float(delay) for delay in os.environ.get('FIRESTORE_BATCH_RETRY_DELAYS', '0.2,0.5,1.0').split(',') if delay
+]
+
+# Chyby, po kterých má smysl commit zopakovat (plní se až s Firebase - viz _is_transient)
+_TRANSIENT_ERRORS: Optional[Tuple[type, ...]] = None
+
+
+def _stamp(zakazka_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Časová značka zápisu + normalizované datum (``datum_iso``, ``datum_epoch_day``), pokud se mění ``datum``.
+
+    ``updated_at`` je serverová značka - Firestore ji vyplní časem commitu,
+    takže pořadí značek odpovídá pořadí potvrzených zápisů (watermark delta
+    synchronizace). Posluchači zápisů dostanou data přes ``_resolve_timestamps``.
+    """
+    stamped = dict(zakazka_data, updated_at=_firestore().SERVER_TIMESTAMP)
+    if 'datum' in zakazka_data:
+        stamped.update(normalized_datum(zakazka_data['datum']))
+    return stamped
+
+
+def _commit_time(value: Optional[datetime]) -> datetime:
+    """Čas commitu z odpovědi Firestore (bez něj aktuální čas)"""
+    return value or datetime.now(timezone.utc)
+
+
+def _resolve_timestamps(data: Optional[Dict[str, Any]], commit_time: Optional[datetime]) -> Optional[Dict[str, Any]]:
+    """Kopie zapsaných dat se serverovými značkami nahrazenými časem commitu (pro posluchače zápisů)"""
+    if data is None:
+        return None
+    sentinel = _firestore().SERVER_TIMESTAMP
+    if not any(value is sentinel for value in data.values()):
+        return data
+    commit_time = _commit_time(commit_time)
+    return {key: commit_time if value is sentinel else value for key, value in data.items()}
+
+
+def _change_event(kind: str, zakazka_id: Optional[str], data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Kompaktní událost změny zakázky pro SSE"""
+    event = {"type": kind, "id": zakazka_id}
+    if data is not None:
+        event["data"] = data
+    return event
+
+
+def _chunks(items: List[Any], size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _repeated_positions(ids: List[str]) -> Set[int]:
+    """Pozice ID, která se v hromadném požadavku už jednou objevila"""
+    seen: Set[str] = set()
+    repeated = set()
+    for position, zakazka_id in enumerate(ids):
+        if zakazka_id in seen:
+            repeated.add(position)
+        seen.add(zakazka_id)
+    return repeated
+
+
+def _with_repeated(ids: List[str], results: List[Dict[str, Any]], repeated: Set[int]) -> List[Dict[str, Any]]:
+    """Výsledky v pořadí požadavku; opakované ID je ``invalid`` (zapsal se jen první výskyt)"""
+    merged = []
+    results_iter = iter(results)
+    for position, zakazka_id in enumerate(ids):
+        if position in repeated:
+            merged.append({
+                "id": zakazka_id,
+                "status": "invalid",
+                "errors": [{"msg": f"Zakázka {zakazka_id} je v požadavku vícekrát - zpracoval se jen první výskyt"}],
+            })
+        else:
+            merged.append(next(results_iter))
+    return merged
+
+
+def _is_transient(error: Exception) -> bool:
+    global _TRANSIENT_ERRORS
+    if _TRANSIENT_ERRORS is None:
+        from google.api_core import exceptions as google_exceptions
+
+        _TRANSIENT_ERRORS = (
+            google_exceptions.Aborted,
+            google_exceptions.DeadlineExceeded,
+            google_exceptions.InternalServerError,
+            google_exceptions.ResourceExhausted,
+            google_exceptions.ServiceUnavailable,
+            asyncio.TimeoutError,
+        )
+    return isinstance(error, _TRANSIENT_ERRORS)
+
+
+def _is_already_exists(error: Exception) -> bool:
+    from google.api_core import exceptions as google_exceptions
+
+    return isinstance(error, google_exceptions.AlreadyExists)
+
+
+def _firestore():
+    """Modul firebase_admin.firestore - importuje se až při prvním použití"""
+    from firebase_admin import firestore
+
+    return firestore
+
+
+def _start_after(field: str, last: Dict[str, Any]) -> Dict[str, Any]:
+    """Hodnoty pro Firestore start_after z posledního načteného dokumentu"""
+    values = {'__name__': last['id']}
+    if field != '__name__':
+        values[field] = last.get(field)
+    return values
+
+
+def _pack_writes(items: List[Any], deltas: List[Dict[str, Any]], writes_per_item: int):
+    """Rozdělí položky do commitů: zápisy položek + agregační dokumenty (souhrn,
+    rollupy) + rezerva ``_commit_with_retry`` se vejdou do limitu jednoho batche.
+    Vrací dvojice (položky, sečtené rozdíly).
+    """
+    group: List[Any] = []
+    aggregates: Dict[str, Dict[Tuple[str, ...], float]] = {}
+    for item, delta in zip(items, deltas):
+        documents = len(set(aggregates) | set(delta))
+        if group and (len(group) + 1) * writes_per_item + documents + COMMIT_RESERVED_WRITES > FIRESTORE_BATCH_LIMIT:
+            yield group, aggregates
+            group, aggregates = [], {}
+        group.append(item)
+        zakazky_stats.merge_aggregates(aggregates, delta)
+    if group:
+        yield group, aggregates
+
+
+def _select_fields(fields: List[str], filters: Optional[ZakazkyFilter], order_field: str = '__name__') -> List[str]:
+    """Projekce rozšířená o pole potřebná pro řazení a dodatečné filtry"""
+    selected = list(fields)
+    extra = filters.required_fields() if filters else []
+    if order_field != '__name__':
+        extra.append(order_field)
+    for field in extra:
+        if field not in selected:
+            selected.append(field)
+    return selected
 
-# Load environment variables
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
 
 class FirebaseService:
     _instance = None
@@ -22,9 +202,83 @@ class FirebaseService:
     
     def __init__(self):
         if not hasattr(self, '_initialized'):
-            self._initialize_firebase()
+            self._executor = FirestoreExecutor()
+            self._cache = ZakazkyCache()
+            self._orders = OrderStore()
+            self._order_builds: Dict[str, asyncio.Future] = {}
+            self._calendars = OrderStore(env_prefix='CALENDAR_INDEX', default_max_mb=64)
+            self._calendar_builds: Dict[str, asyncio.Future] = {}
+            self._aggregate_rebuilds: Dict[str, asyncio.Future] = {}
+            self._versions = UserVersions(on_stale=self._invalidate_user)
+            self._events = ZakazkyEventHub()
+            self._events.set_watch_factory(self._watch_zakazky)
+            # Posluchači zápisů: fn(user_id, kind, zakazka_id, data)
+            self._write_listeners: List[Callable[[str, str, Optional[str], Optional[Dict[str, Any]]], None]] = [
+                self._cache.apply_write,
+                self._orders.apply_write,
+                self._calendars.apply_write,
+                self._publish_fallback_write,
+            ]
+            # Firebase se inicializuje líně (start() z lifespanu nebo první požadavek)
+            self._init_future: Optional[asyncio.Future] = None
+            self._warmup_state = 'pending'
+            self._timings: Dict[str, float] = {}
             self._initialized = True
-    
+
+    def start(self):
+        """Spustí inicializaci Firebase na pozadí a po ní warmup klienta"""
+        if self._init_future is None:
+            self._init_future = asyncio.ensure_future(self._start())
+        return self._init_future
+
+    async def _start(self):
+        started = time.perf_counter()
+        await self._executor.run(self._initialize_firebase, timeout=0)
+        self._timings['init_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        if self._db:
+            asyncio.ensure_future(self._warmup())
+        else:
+            self._warmup_state = 'skipped'
+
+    async def _warmup(self):
+        """Otevře gRPC kanál a získá token jedním levným dotazem"""
+        started = time.perf_counter()
+        try:
+            await self._run(lambda: list(self._db.collection('users').limit(1).select([]).stream()))
+            self._warmup_state = 'done'
+        except Exception as e:
+            print(f"⚠️ Warmup Firestore klienta selhal: {e}")
+            self._warmup_state = 'failed'
+        self._timings['warmup_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    async def _ensure_ready(self) -> bool:
+        """Počká na dokončení inicializace; True = Firestore je k dispozici"""
+        if not self.is_initialized:
+            await asyncio.shield(self.start())
+        return self._db is not None
+
+    async def wait_until_ready(self) -> bool:
+        """Počká na inicializaci (pro komponenty mimo službu); True = Firestore je k dispozici"""
+        return await self._ensure_ready()
+
+    @property
+    def is_initialized(self) -> bool:
+        return self._init_future is not None and self._init_future.done()
+
+    def readiness(self) -> Dict[str, Any]:
+        """Stav pro /api/ready"""
+        if not self.is_initialized:
+            return {"ready": False, "mode": "initializing", "warmup": self._warmup_state}
+        return {
+            "ready": True,
+            "mode": "firebase" if self._db else "fallback",
+            "warmup": self._warmup_state,
+            "timings": dict(self._timings),
+        }
+
+    async def close(self):
+        self._executor.shutdown()
+
     def _initialize_firebase(self):
         """Inicializace Firebase Admin SDK s fallback pro produkci"""
         try:
@@ -38,7 +292,11 @@ class FirebaseService:
                 self._app = None
                 self._db = None
                 return
-            
+
+            # Import Google klientů (gRPC) je drahý - platí se jen s credentials
+            import firebase_admin
+            from firebase_admin import credentials, firestore
+
             # Kontrola, zda již není Firebase inicializován
             if not firebase_admin._apps:
                 # Použijeme environment variables místo hardcoded credentials
@@ -78,16 +336,99 @@ class FirebaseService:
     def db(self):
         """Getter pro Firestore databázi"""
         return self._db
+
+    @property
+    def executor(self) -> FirestoreExecutor:
+        """Executor, ve kterém běží blokující Firestore volání"""
+        return self._executor
+
+    @property
+    def cache(self) -> ZakazkyCache:
+        """Cache zakázek po uživatelích"""
+        return self._cache
+
+    @property
+    def orders(self) -> OrderStore:
+        """Sloupcové kopie zakázek po uživatelích (reporty, analytika)"""
+        return self._orders
+
+    @property
+    def calendars(self) -> OrderStore:
+        """Intervalové indexy kalendáře po uživatelích"""
+        return self._calendars
+
+    @property
+    def versions(self) -> UserVersions:
+        """Verze dat uživatelů (podklad pro ETagy)"""
+        return self._versions
+
+    async def data_version(self, user_id: str) -> Optional[int]:
+        """Verze dat uživatele z Firestore (``users/{id}.data_version``); None ve fallback režimu nebo při chybě.
+
+        Přečtená verze se porovná s očekávanou - zápis jiného procesu zahodí
+        lokální kopie dat uživatele.
+        """
+        if not await self._ensure_ready():
+            return None
+        try:
+            snapshot = await self._run(self._user_ref(user_id).get, field_paths=[DATA_VERSION_FIELD])
+        except Exception as e:
+            print(f"⚠️ Nepodařilo se načíst verzi dat ({user_id}): {e}")
+            return None
+        version = (snapshot.to_dict() or {}).get(DATA_VERSION_FIELD, 0) if snapshot.exists else 0
+        return self._versions.observe(user_id, version)
+
+    def _invalidate_user(self, user_id: str):
+        """Zahodí lokální kopie dat uživatele (cache, sloupcová kopie, kalendář)"""
+        self._cache.invalidate(user_id)
+        self._orders.invalidate(user_id)
+        self._calendars.invalidate(user_id)
+
+    async def _versioned(self, user_id: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Provede commit, který zvyšuje verzi dat uživatele (``_write_version``)"""
+        self._versions.begin(user_id)
+        committed = False
+        try:
+            result = await self._run(fn, *args, **kwargs)
+            committed = True
+            return result
+        finally:
+            self._versions.end(user_id, committed)
+
+    @property
+    def events(self) -> ZakazkyEventHub:
+        """Rozesílání živých změn zakázek (SSE)"""
+        return self._events
+
+    async def _run(self, fn, *args, **kwargs):
+        """Provede synchronní Firestore volání mimo event loop"""
+        return await self._executor.run(fn, *args, **kwargs)
+
+    def add_write_listener(self, listener: Callable[[str, str, Optional[str], Optional[Dict[str, Any]]], None]):
+        """Zaregistruje posluchače úspěšných zápisů.
+
+        ``kind`` je 'created', 'updated', 'deleted' (se ``zakazka_id``, u
+        'updated' jen změněná pole) nebo 'user' pro změnu uživatelského dokumentu.
+        """
+        self._write_listeners.append(listener)
+
+    def _notify_write(self, user_id: str, kind: str, zakazka_id: Optional[str] = None, data: Optional[Dict[str, Any]] = None):
+        for listener in self._write_listeners:
+            try:
+                listener(user_id, kind, zakazka_id, data)
+            except Exception as e:
+                print(f"⚠️ Chyba v posluchači zápisu: {e}")
     
     async def create_user_data(self, user_id: str, data: Dict[str, Any]) -> bool:
         """Vytvoření uživatelských dat - fallback na Supabase"""
-        if not self._db:
+        if not await self._ensure_ready():
             print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
             return True
             
         try:
-            user_ref = self._db.collection('users').document(user_id)
-            user_ref.set(data, merge=True)
+            user_ref = self._user_ref(user_id)
+            await self._versioned(user_id, user_ref.set, dict(data, **{DATA_VERSION_FIELD: _firestore().Increment(1)}), merge=True)
+            self._notify_write(user_id, 'user')
             return True
         except Exception as e:
             print(f"❌ Chyba při vytváření uživatelských dat: {e}")
@@ -95,15 +436,17 @@ class FirebaseService:
     
     async def get_user_data(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Získání uživatelských dat - fallback na Supabase"""
-        if not self._db:
+        if not await self._ensure_ready():
             print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
             return None
             
         try:
-            user_ref = self._db.collection('users').document(user_id)
-            doc = user_ref.get()
+            user_ref = self._user_ref(user_id)
+            doc = await self._run(user_ref.get)
             if doc.exists:
-                return doc.to_dict()
+                data = doc.to_dict()
+                data.pop(DATA_VERSION_FIELD, None)
+                return data
             return None
         except Exception as e:
             print(f"❌ Chyba při získávání uživatelských dat: {e}")
@@ -111,60 +454,1246 @@ class FirebaseService:
     
     async def update_user_data(self, user_id: str, data: Dict[str, Any]) -> bool:
         """Aktualizace uživatelských dat - fallback na Supabase"""
-        if not self._db:
+        if not await self._ensure_ready():
             print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
             return True
             
         try:
-            user_ref = self._db.collection('users').document(user_id)
-            user_ref.update(data)
+            user_ref = self._user_ref(user_id)
+            await self._versioned(user_id, user_ref.update, dict(data, **{DATA_VERSION_FIELD: _firestore().Increment(1)}))
+            self._notify_write(user_id, 'user')
             return True
         except Exception as e:
             print(f"❌ Chyba při aktualizaci uživatelských dat: {e}")
             return False
     
     async def add_zakazka(self, user_id: str, zakazka_data: Dict[str, Any]) -> Optional[str]:
-        """Přidání nové zakázky pro uživatele - fallback na Supabase"""
-        if not self._db:
+        """Přidání nové zakázky pro uživatele - fallback na Supabase (duplicity se jen označí v indexu)"""
+        result = await self.add_zakazka_checked(user_id, zakazka_data)
+        return result["zakazka_id"] if result else None
+
+    async def add_zakazka_checked(
+        self, user_id: str, zakazka_data: Dict[str, Any], duplicates: str = DUPLICATES_FLAG
+    ) -> Optional[Dict[str, Any]]:
+        """Přidání zakázky s kontrolou duplicit přes index otisků.
+
+        Otisk obsahu se v transakci vyhledá v ``users/{id}/fingerprints/{hash}``
+        (jedno čtení), takže ani dvojí odeslání formuláře neprojde bez
+        povšimnutí. Vrací ``{"status": "created", "zakazka_id", "duplicate_of"}``,
+        při ``duplicates="reject"`` a nalezené shodě ``{"status": "duplicate",
+        "duplicate_of"}``; None při chybě.
+        """
+        if not await self._ensure_ready():
             print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
-            return "supabase_fallback"
-            
+            self._notify_write(user_id, 'created', None, zakazka_data)
+            return {"status": "created", "zakazka_id": "supabase_fallback", "duplicate_of": []}
+
         try:
-            zakazky_ref = self._db.collection('users').document(user_id).collection('zakazky')
-            doc_ref = zakazky_ref.add(zakazka_data)
-            return doc_ref[1].id  # Vrátí ID nově vytvořené zakázky
+            zakazka_data = _stamp(zakazka_data)
+            zakazka_data.update(pricing.price(zakazka_data))
+            zakazka_data[FINGERPRINT_FIELD] = fingerprint(zakazka_data)
+            doc_ref = self._zakazky_ref(user_id).document()
+            fingerprint_ref = self._fingerprints_ref(user_id).document(zakazka_data[FINGERPRINT_FIELD])
+
+            @_firestore().transactional
+            def _add(transaction):
+                duplicate_of = duplicate_ids(fingerprint_ref.get(transaction=transaction).to_dict())
+                if duplicate_of and duplicates == DUPLICATES_REJECT:
+                    return duplicate_of, False
+                # Zakázka, index otisků, souhrn dashboardu a rollupy se zapíší atomicky
+                transaction.set(doc_ref, zakazka_data)
+                self._write_fingerprint(transaction, user_id, doc_ref.id, None, zakazka_data[FINGERPRINT_FIELD])
+                self._write_aggregates(transaction, user_id, zakazky_stats.aggregate_diff(None, zakazka_data))
+                self._write_version(transaction, user_id)
+                return duplicate_of, True
+
+            transaction = self._db.transaction()
+            duplicate_of, created = await self._versioned(user_id, _add, transaction)
+            if not created:
+                return {"status": "duplicate", "duplicate_of": duplicate_of}
+            self._notify_write(user_id, 'created', doc_ref.id, _resolve_timestamps(zakazka_data, transaction.commit_time))
+            return {"status": "created", "zakazka_id": doc_ref.id, "duplicate_of": duplicate_of}
         except Exception as e:
             print(f"❌ Chyba při přidávání zakázky: {e}")
             return None
-    
-    async def get_user_zakazky(self, user_id: str) -> List[Dict[str, Any]]:
-        """Získání všech zakázek uživatele - fallback na Supabase"""
-        if not self._db:
+
+    async def add_zakazky_batch(
+        self, user_id: str, zakazky: List[Dict[str, Any]], duplicates: str = DUPLICATES_FLAG
+    ) -> List[Dict[str, Any]]:
+        """Hromadné přidání zakázek přes Firestore WriteBatch (max. 500 zápisů na commit).
+
+        Součástí každého commitu jsou i přírůstky souhrnu dashboardu a rollupů
+        a záznamy v indexu otisků. Vrací výsledek pro každou položku ve stejném
+        pořadí: ``{"status": "created", "zakazka_id": ..., "duplicate_of": [...]}``,
+        ``{"status": "duplicate", "duplicate_of": [...]}`` (jen při
+        ``duplicates="reject"``) nebo ``{"status": "failed", "error": ...}``.
+        Duplicity se hledají v indexu i mezi položkami požadavku. Commit, který
+        selže, se nezapíše celý.
+        """
+        if not await self._ensure_ready():
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            for zakazka_data in zakazky:
+                self._notify_write(user_id, 'created', None, zakazka_data)
+            return [{"status": "created", "zakazka_id": "supabase_fallback", "duplicate_of": []} for _ in zakazky]
+
+        zakazky_ref = self._zakazky_ref(user_id)
+        stamped = [_stamp(zakazka_data) for zakazka_data in zakazky]
+        for zakazka_data in stamped:
+            zakazka_data.update(pricing.price(zakazka_data))
+            zakazka_data[FINGERPRINT_FIELD] = fingerprint(zakazka_data)
+        try:
+            known = await self._load_fingerprints(user_id, {zakazka_data[FINGERPRINT_FIELD] for zakazka_data in stamped})
+        except Exception as e:
+            print(f"❌ Chyba při hromadném přidávání zakázek: {e}")
+            return [{"status": "failed", "error": str(e)} for _ in zakazky]
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(stamped)
+        items = []
+        for position, zakazka_data in enumerate(stamped):
+            duplicate_of = list(known.setdefault(zakazka_data[FINGERPRINT_FIELD], []))
+            if duplicate_of and duplicates == DUPLICATES_REJECT:
+                results[position] = {"status": "duplicate", "duplicate_of": duplicate_of}
+                continue
+            # ID se generují lokálně - opakovaný commit po výpadku nezaloží duplicitu
+            doc_ref = zakazky_ref.document()
+            known[zakazka_data[FINGERPRINT_FIELD]].append(doc_ref.id)
+            items.append((position, doc_ref, zakazka_data, duplicate_of))
+        deltas = [zakazky_stats.aggregate_diff(None, zakazka_data) for _, _, zakazka_data, _ in items]
+
+        # Každé založení = 2 zápisy (dokument + index otisků)
+        for group, aggregates in _pack_writes(items, deltas, writes_per_item=2):
+
+            def _write(batch, group=group):
+                for _, doc_ref, zakazka_data, _ in group:
+                    batch.set(doc_ref, zakazka_data)
+                    self._write_fingerprint(batch, user_id, doc_ref.id, None, zakazka_data[FINGERPRINT_FIELD])
+
+            commit_time, error = await self._commit_with_retry(user_id, _write, aggregates)
+            for position, doc_ref, zakazka_data, duplicate_of in group:
+                if error:
+                    results[position] = {"status": "failed", "error": error}
+                else:
+                    self._notify_write(user_id, 'created', doc_ref.id, _resolve_timestamps(zakazka_data, commit_time))
+                    results[position] = {"status": "created", "zakazka_id": doc_ref.id, "duplicate_of": duplicate_of}
+            if error:
+                print(f"❌ Chyba při hromadném přidávání zakázek: {error}")
+        return results
+
+    async def _load_fingerprints(self, user_id: str, hashes: Iterable[str]) -> Dict[str, List[str]]:
+        """ID zakázek v indexu otisků pro dané otisky (get_all po 500 dokumentech)"""
+        refs = [self._fingerprints_ref(user_id).document(value) for value in hashes]
+        known: Dict[str, List[str]] = {}
+        for chunk in _chunks(refs, FIRESTORE_BATCH_LIMIT):
+            snapshots = await self._run(lambda chunk=chunk: list(self._db.get_all(chunk)))
+            for snapshot in snapshots:
+                if snapshot.exists:
+                    known[snapshot.id] = duplicate_ids(snapshot.to_dict())
+        return known
+
+    async def update_zakazky_batch(self, user_id: str, updates: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Hromadná aktualizace zakázek - dvojice (ID, změněná pole), commit po 500.
+
+        Neexistující zakázky se nezapisují (jinak by Firestore odmítl celý
+        batch) a vrací se pro ně ``{"status": "not_found"}``. Rozdíly souhrnu
+        a rollupů se počítají z verzí načtených před commitem - souběžný zápis
+        té samé zakázky je může rozladit, opraví je ``rebuild_aggregates``.
+        Opakované ID v jednom požadavku se nezapisuje (``invalid``) - obě úpravy
+        by vycházely ze stejné načtené verze.
+        """
+        repeated = _repeated_positions([zakazka_id for zakazka_id, _ in updates])
+        if repeated:
+            unique = [update for position, update in enumerate(updates) if position not in repeated]
+            return _with_repeated(
+                [zakazka_id for zakazka_id, _ in updates], await self.update_zakazky_batch(user_id, unique), repeated
+            )
+
+        if not await self._ensure_ready():
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            for zakazka_id, zakazka_data in updates:
+                self._notify_write(user_id, 'updated', zakazka_id, zakazka_data)
+            return [{"id": zakazka_id, "status": "updated"} for zakazka_id, _ in updates]
+
+        zakazky_ref = self._zakazky_ref(user_id)
+        results = []
+        for chunk in _chunks(updates, FIRESTORE_BATCH_LIMIT):
+            refs = [zakazky_ref.document(zakazka_id) for zakazka_id, _ in chunk]
+            try:
+                snapshots = await self._run(lambda refs=refs: list(self._db.get_all(refs)))
+                existing = {snapshot.id: snapshot.to_dict() for snapshot in snapshots if snapshot.exists}
+            except Exception as e:
+                print(f"❌ Chyba při hromadné aktualizaci zakázek: {e}")
+                results.extend({"id": zakazka_id, "status": "failed", "error": str(e)} for zakazka_id, _ in chunk)
+                continue
+
+            chunk = [(zakazka_id, _stamp(data) if data else data) for zakazka_id, data in chunk]
+            to_write = [
+                (ref, self._refingerprint(existing[ref.id], self._reprice(existing[ref.id], data)))
+                for ref, (_, data) in zip(refs, chunk) if ref.id in existing and data
+            ]
+            written = {ref.id: data for ref, data in to_write}
+            deltas = [
+                zakazky_stats.aggregate_diff(existing[ref.id], dict(existing[ref.id], **data)) for ref, data in to_write
+            ]
+            errors: Dict[str, str] = {}
+            committed: Dict[str, datetime] = {}
+            # Každá úprava = až 3 zápisy (dokument + přesun v indexu otisků)
+            for group, aggregates in _pack_writes(to_write, deltas, writes_per_item=3):
+
+                def _write(batch, group=group):
+                    for doc_ref, zakazka_data in group:
+                        old = existing[doc_ref.id]
+                        batch.update(doc_ref, zakazka_data)
+                        self._write_fingerprint(
+                            batch, user_id, doc_ref.id, stored_fingerprint(old), stored_fingerprint(dict(old, **zakazka_data))
+                        )
+
+                commit_time, error = await self._commit_with_retry(user_id, _write, aggregates)
+                if error:
+                    print(f"❌ Chyba při hromadné aktualizaci zakázek: {error}")
+                    errors.update((doc_ref.id, error) for doc_ref, _ in group)
+                else:
+                    committed.update((doc_ref.id, commit_time) for doc_ref, _ in group)
+
+            for zakazka_id, zakazka_data in chunk:
+                if zakazka_id not in existing:
+                    results.append({"id": zakazka_id, "status": "not_found"})
+                elif zakazka_id in errors:
+                    results.append({"id": zakazka_id, "status": "failed", "error": errors[zakazka_id]})
+                else:
+                    self._notify_write(
+                        user_id, 'updated', zakazka_id, _resolve_timestamps(written.get(zakazka_id, zakazka_data), committed.get(zakazka_id))
+                    )
+                    results.append({"id": zakazka_id, "status": "updated"})
+        return results
+
+    async def delete_zakazky_batch(self, user_id: str, zakazka_ids: List[str]) -> List[Dict[str, Any]]:
+        """Hromadné smazání zakázek podle ID (+ tombstone pro delta sync), commit po 500 zápisech.
+
+        Mazané zakázky se nejdřív načtou kvůli odečtení ze souhrnu a rollupů.
+        Opakované ID se podruhé nemaže ani neodečítá (``invalid``).
+        """
+        repeated = _repeated_positions(zakazka_ids)
+        if repeated:
+            unique = [zakazka_id for position, zakazka_id in enumerate(zakazka_ids) if position not in repeated]
+            return _with_repeated(zakazka_ids, await self.delete_zakazky_batch(user_id, unique), repeated)
+
+        if not await self._ensure_ready():
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            for zakazka_id in zakazka_ids:
+                self._notify_write(user_id, 'deleted', zakazka_id)
+            return [{"id": zakazka_id, "status": "deleted"} for zakazka_id in zakazka_ids]
+
+        zakazky_ref = self._zakazky_ref(user_id)
+        results = []
+        for chunk in _chunks(zakazka_ids, FIRESTORE_BATCH_LIMIT):
+            refs = [zakazky_ref.document(zakazka_id) for zakazka_id in chunk]
+            try:
+                snapshots = await self._run(lambda refs=refs: list(self._db.get_all(refs)))
+                existing = {snapshot.id: snapshot.to_dict() for snapshot in snapshots if snapshot.exists}
+            except Exception as e:
+                print(f"❌ Chyba při hromadném mazání zakázek: {e}")
+                results.extend({"id": zakazka_id, "status": "failed", "error": str(e)} for zakazka_id in chunk)
+                continue
+            deltas = [zakazky_stats.aggregate_diff(existing.get(zakazka_id), None) for zakazka_id in chunk]
+
+            # Každé smazání = 3 zápisy (dokument + tombstone + index otisků)
+            for group, aggregates in _pack_writes(chunk, deltas, writes_per_item=3):
+
+                def _write(batch, group=group):
+                    for zakazka_id in group:
+                        self._write_delete(batch, user_id, zakazka_id)
+                        self._write_fingerprint(batch, user_id, zakazka_id, stored_fingerprint(existing.get(zakazka_id)), None)
+
+                _, error = await self._commit_with_retry(user_id, _write, aggregates)
+                if error:
+                    print(f"❌ Chyba při hromadném mazání zakázek: {error}")
+                    results.extend({"id": zakazka_id, "status": "failed", "error": error} for zakazka_id in group)
+                else:
+                    for zakazka_id in group:
+                        self._notify_write(user_id, 'deleted', zakazka_id)
+                        results.append({"id": zakazka_id, "status": "deleted"})
+        return results
+
+    async def _commit_with_retry(
+        self,
+        user_id: str,
+        write: Callable[[Any], None],
+        aggregates: Optional[Dict[str, Dict[Tuple[str, ...], float]]] = None,
+    ) -> Tuple[Optional[datetime], Optional[str]]:
+        """Sestaví a odešle WriteBatch; přechodné chyby zkouší znovu podle BATCH_RETRY_DELAYS.
+
+        ``write`` naplní nový batch (při každém pokusu se staví znovu).
+        Přírůstky souhrnu a rollupů (``aggregates``) nejsou idempotentní - po
+        nejednoznačné chybě (timeout) mohl commit projít. Batch s nimi proto
+        zakládá značku commitu (``batch.create``); opakování, které narazí na
+        existující značku, se nezapíše a první pokus se bere jako úspěšný.
+        Každý commit zvyšuje verzi dat uživatele. Vrací (čas commitu, None)
+        při úspěchu, jinak (None, text poslední chyby).
+        """
+        marker_ref = None
+        if aggregates and any(aggregates.values()):
+            marker_ref = self._commits_ref(user_id).document(uuid.uuid4().hex)
+        attempt = 0
+        while True:
+            batch = self._db.batch()
+            write(batch)
+            self._write_version(batch, user_id)
+            if marker_ref is not None:
+                self._write_aggregates(batch, user_id, aggregates)
+                batch.create(marker_ref, {'expires_at': datetime.now(timezone.utc) + COMMIT_MARKER_TTL})
+            try:
+                await self._versioned(user_id, batch.commit)
+                return _commit_time(batch.commit_time), None
+            except Exception as e:
+                if attempt and marker_ref is not None and _is_already_exists(e):
+                    print("🔄 Commit prošel už při předchozím pokusu (značka commitu existuje)")
+                    marker = await self._run(marker_ref.get)
+                    return _commit_time(marker.create_time), None
+                if not _is_transient(e) or attempt >= len(BATCH_RETRY_DELAYS):
+                    return None, str(e) or type(e).__name__
+                delay = BATCH_RETRY_DELAYS[attempt]
+                attempt += 1
+                print(f"🔄 Přechodná chyba při commitu ({type(e).__name__}), pokus {attempt} za {delay}s")
+                await asyncio.sleep(delay)
+
+    async def get_user_zakazky(
+        self,
+        user_id: str,
+        fields: Optional[List[str]] = None,
+        filters: Optional[ZakazkyFilter] = None,
+    ) -> List[Dict[str, Any]]:
+        """Získání všech zakázek uživatele - fallback na Supabase
+
+        ``fields`` omezí načítaná pole (Firestore select) - méně dat z Firestore
+        i v odpovědi. ``filters`` se převádí na Firestore ``where``.
+
+        Celý výpis se drží v cache; dotazy s ``fields``/``filters`` se při
+        zásahu cache vyhodnotí nad ní, jinak jdou rovnou do Firestore.
+        """
+        if not await self._ensure_ready():
             print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
             return []
-            
+
+        cached = self._cache.get(user_id)
+        if cached is not None:
+            return [project(zakazka, fields) for zakazka in cached if not filters or filters.matches_all(zakazka)]
+
         try:
-            zakazky_ref = self._db.collection('users').document(user_id).collection('zakazky')
-            docs = zakazky_ref.stream()
-            zakazky = []
-            for doc in docs:
-                zakazka = doc.to_dict()
-                zakazka['id'] = doc.id
-                zakazky.append(zakazka)
-            return zakazky
+            if fields is None and filters is None:
+                generation = self._cache.generation(user_id)
+                zakazky_ref = self._zakazky_ref(user_id)
+                zakazky = await self._run(lambda: [self._doc_to_zakazka(doc) for doc in zakazky_ref.stream()])
+                self._cache.put(user_id, zakazky, generation)
+                return zakazky
+
+            query = self._zakazky_ref(user_id)
+            if filters:
+                query = filters.apply_where(query)
+            if fields is not None:
+                query = query.select(_select_fields(fields, filters))
+
+            def _load():
+                # stream() je generátor - musí se dočíst celý ve vlákně executoru
+                zakazky = (self._doc_to_zakazka(doc) for doc in query.stream())
+                return [project(zakazka, fields) for zakazka in zakazky if not filters or filters.matches(zakazka)]
+
+            return await self._run(_load)
         except Exception as e:
             print(f"❌ Chyba při získávání zakázek: {e}")
             return []
+
+    async def get_order_columns(self, user_id: str):
+        """Sloupcová kopie zakázek uživatele (``analytics.OrderColumns``) pro reporty.
+
+        Staví se z Firestore jen jednou (souběžné požadavky čekají na stejnou
+        stavbu), pak ji drží ``OrderStore`` a upravují ji zápisy. Ve fallback
+        režimu vrací None.
+        """
+        if not await self._ensure_ready():
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            return None
+
+        return await self._from_store(self._orders, self._order_builds, user_id, self._build_order_columns)
+
+    async def get_calendar_index(self, user_id: str) -> Optional[CalendarIndex]:
+        """Intervalový index zakázek uživatele pro kalendář (``calendar_index.CalendarIndex``).
+
+        Staví se jednou z kompletních zakázek (nebo z cache), pak ho upravují
+        zápisy. Ve fallback režimu vrací None.
+        """
+        if not await self._ensure_ready():
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            return None
+
+        return await self._from_store(self._calendars, self._calendar_builds, user_id, self._build_calendar_index)
+
+    async def get_schedule_spans(
+        self, user_id: str, zakazka_id: str
+    ) -> Optional[List[Tuple[Tuple[int, int], Dict[str, Any]]]]:
+        """Intervaly zakázek zasahujících do realizace zakázky ``zakazka_id`` (kontrola rozvrhu).
+
+        Bere se z hotového indexu kalendáře. Studený index se kvůli kontrole
+        nestaví v požadavku - stavba se spustí na pozadí a do té doby se se
+        ``ZAKAZKY_DATE_PUSHDOWN`` načte jen okno podle ``datum_epoch_day``,
+        bez něj vrací None (kontrola se vynechá).
+        """
+        if not await self._ensure_ready():
+            return None
+
+        index = self._calendars.get(user_id)
+        if index is None:
+            self._prefetch_calendar_index(user_id)
+            if not DATE_PUSHDOWN:
+                return None
+            return await self._window_spans(user_id, zakazka_id)
+        span = index.span(zakazka_id)
+        if span is None:
+            return None
+        return index.spans(from_epoch_day(span[0]), from_epoch_day(span[1] - 1))
+
+    def _prefetch_calendar_index(self, user_id: str):
+        """Spustí stavbu indexu kalendáře na pozadí (pokud už neběží)"""
+        if user_id in self._calendar_builds:
+            return
+
+        async def _build():
+            try:
+                await self._from_store(self._calendars, self._calendar_builds, user_id, self._build_calendar_index)
+            except Exception as e:
+                print(f"❌ Chyba při stavbě indexu kalendáře: {e}")
+
+        asyncio.ensure_future(_build())
+
+    async def _window_spans(
+        self, user_id: str, zakazka_id: str
+    ) -> Optional[List[Tuple[Tuple[int, int], Dict[str, Any]]]]:
+        """Intervaly z dočasného indexu nad zakázkami začínajícími v okně zakázky.
+
+        Okno začíná ``DURATION_CLASSES[-1]`` dní před zakázkou - delší zakázky
+        začínající ještě dřív se v kontrole neobjeví.
+        """
+        snapshot = await self._run(self._zakazky_ref(user_id).document(zakazka_id).get)
+        if not snapshot.exists:
+            return None
+        span = interval(self._doc_to_zakazka(snapshot))
+        if span is None:
+            return None
+        query = self._zakazky_ref(user_id).where(
+            filter=_firestore().FieldFilter(DATUM_DAY_FIELD, '>', span[0] - DURATION_CLASSES[-1])
+        ).where(filter=_firestore().FieldFilter(DATUM_DAY_FIELD, '<', span[1]))
+        zakazky = await self._run(lambda: [self._doc_to_zakazka(doc) for doc in query.stream()])
+        index = await asyncio.to_thread(CalendarIndex.from_orders, zakazky)
+        return index.spans(from_epoch_day(span[0]), from_epoch_day(span[1] - 1))
+
+    @staticmethod
+    async def _from_store(store: OrderStore, builds: Dict[str, asyncio.Future], user_id: str, build: Callable[[str], Any]):
+        """Index z ``store``; chybí-li, postaví ho ``build`` (souběžné požadavky čekají na stejnou stavbu)"""
+        index = store.get(user_id)
+        if index is not None:
+            return index
+        future = builds.get(user_id)
+        if future is None:
+            future = builds[user_id] = asyncio.ensure_future(build(user_id))
+            future.add_done_callback(lambda _: builds.pop(user_id, None))
+        return await asyncio.shield(future)
+
+    async def _build_calendar_index(self, user_id: str) -> CalendarIndex:
+        generation = self._calendars.generation(user_id)
+        zakazky = self._cache.get(user_id)
+        if zakazky is None:
+            # Načítá se celý výpis - poslouží i cache zakázek
+            cache_generation = self._cache.generation(user_id)
+            zakazky_ref = self._zakazky_ref(user_id)
+            zakazky = await self._run(lambda: [self._doc_to_zakazka(doc) for doc in zakazky_ref.stream()], timeout=0)
+            self._cache.put(user_id, zakazky, cache_generation)
+        index = await asyncio.to_thread(CalendarIndex.from_orders, zakazky)
+        self._calendars.put(user_id, index, generation)
+        return index
+
+    async def _build_order_columns(self, user_id: str):
+        generation = self._orders.generation(user_id)
+        zakazky = self._cache.get(user_id)
+        if zakazky is None:
+            query = self._zakazky_ref(user_id).select(analytics.SOURCE_FIELDS)
+            zakazky = await self._run(lambda: [self._doc_to_zakazka(doc) for doc in query.stream()], timeout=0)
+        # Stavba nad celou historií nesmí blokovat event loop
+        columns = await asyncio.to_thread(analytics.OrderColumns.from_orders, zakazky)
+        self._orders.put(user_id, columns, generation)
+        return columns
+
+    async def get_user_zakazky_page(
+        self,
+        user_id: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        order_by: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        filters: Optional[ZakazkyFilter] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Jedna stránka zakázek (keyset stránkování přes Firestore start_after).
+
+        Vrací (zakázky, next_cursor); next_cursor je None na poslední stránce.
+        Neplatný kurzor nebo řazení vyhodí ``QueryError``. Chyby Firestore se
+        propagují - prázdná stránka by vypadala jako konec výpisu.
+        """
+        field, descending, start_after = parse_cursor_args(order_by, cursor, filters)
+
+        if not await self._ensure_ready():
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            return [], None
+
+        zakazky, has_more = await self._fetch_page(
+            user_id, limit, field, descending, start_after, fields, filters
+        )
+        next_cursor = encode_cursor(field, descending, zakazky[-1]) if has_more else None
+        return [project(zakazka, fields) for zakazka in zakazky], next_cursor
+
+    async def stream_user_zakazky(
+        self,
+        user_id: str,
+        order_by: Optional[str] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        filters: Optional[ZakazkyFilter] = None,
+        page_size: int = STREAM_PAGE_SIZE,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Postupně vrací všechny zakázky uživatele po stránkách.
+
+        V paměti jsou nejvýše dvě stránky (aktuální + přednačítaná další),
+        takže spotřeba nezávisí na velikosti historie. Chyby Firestore se
+        propagují volajícímu.
+        """
+        field, descending, start_after = parse_cursor_args(order_by, cursor, filters)
+
+        if not await self._ensure_ready():
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            return
+
+        zakazky, has_more = await self._fetch_page(
+            user_id, page_size, field, descending, start_after, fields, filters
+        )
+        while True:
+            next_page = None
+            if has_more:
+                next_page = asyncio.ensure_future(self._fetch_page(
+                    user_id, page_size, field, descending, _start_after(field, zakazky[-1]), fields, filters
+                ))
+            try:
+                for zakazka in zakazky:
+                    yield project(zakazka, fields)
+            except BaseException:
+                if next_page:
+                    next_page.cancel()
+                raise
+            if not next_page:
+                return
+            zakazky, has_more = await next_page
+
+    async def _fetch_page(
+        self,
+        user_id: str,
+        limit: int,
+        field: str,
+        descending: bool,
+        start_after: Optional[Dict[str, Any]],
+        fields: Optional[List[str]] = None,
+        filters: Optional[ZakazkyFilter] = None,
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """Načte až ``limit`` zakázek; druhá hodnota říká, zda existuje další stránka.
+
+        Při projekci se navíc načítá pole řazení (potřebné pro kurzor) -
+        odstraní ho až ``project``. Filtry, které nejdou do Firestore ``where``,
+        se vyhodnotí tady; stránka se pak doplňuje dalšími dotazy.
+        """
+        query = self._build_page_query(user_id, field, descending, filters)
+        if fields is not None:
+            query = query.select(_select_fields(fields, filters, field))
+        # O jeden dokument navíc - zjistíme, zda existuje další stránka
+        batch_size = limit + 1
+
+        def _load(start_after):
+            page = query.start_after(start_after) if start_after else query
+            return [self._doc_to_zakazka(doc) for doc in page.limit(batch_size).stream()]
+
+        zakazky = []
+        while True:
+            batch = await self._run(_load, start_after)
+            zakazky.extend(z for z in batch if not filters or filters.matches(z))
+            if len(zakazky) > limit or len(batch) < batch_size:
+                break
+            start_after = _start_after(field, batch[-1])
+        return zakazky[:limit], len(zakazky) > limit
+
+    async def get_zakazky_changes(
+        self, user_id: str, since: datetime, limit: int, cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Změny zakázek od watermarku: upravené/nové dokumenty + tombstony smazaných.
+
+        ``updated_at``/``deleted_at`` jsou časy commitů. Čte se od ``since``
+        minus ``SYNC_OVERLAP``, takže se vrácené záznamy mohou opakovat -
+        klient je slučuje podle ``id``. Vrací ``{"changes", "deleted",
+        "watermark", "has_more", "cursor"}``. Při ``has_more`` se další dávka
+        načte se stejným ``since`` a vráceným ``cursor`` (pokračuje za
+        posledním vráceným záznamem), po poslední dávce si klient uloží
+        ``watermark``.
+        """
+        if not await self._ensure_ready():
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            return {"changes": [], "deleted": [], "watermark": since, "has_more": False, "cursor": None}
+
+        positions, watermark = decode_changes_cursor(cursor) if cursor else ({}, since)
+        start = since - SYNC_OVERLAP
+        field_filter = _firestore().FieldFilter
+
+        def _query(ref, field: str, name: str):
+            # Značka + ID dokumentu = jednoznačné pořadí i pro zápisy jednoho commitu
+            query = ref.where(filter=field_filter(field, '>=', start)).order_by(field).order_by('__name__')
+            if name in positions:
+                stamp, doc_id = positions[name]
+                query = query.start_after({field: stamp, '__name__': doc_id})
+            return query.limit(limit + 1)
+
+        changed_query = _query(self._zakazky_ref(user_id), 'updated_at', 'zakazky')
+        deleted_query = _query(self._tombstones_ref(user_id), 'deleted_at', 'deleted')
+        changes, deleted = await asyncio.gather(
+            self._run(lambda: [self._doc_to_zakazka(doc) for doc in changed_query.stream()]),
+            self._run(lambda: [dict(doc.to_dict(), id=doc.id) for doc in deleted_query.stream()]),
+        )
+
+        has_more = len(changes) > limit or len(deleted) > limit
+        changes, deleted = changes[:limit], deleted[:limit]
+        if changes:
+            positions['zakazky'] = (changes[-1]['updated_at'], changes[-1]['id'])
+        if deleted:
+            positions['deleted'] = (deleted[-1]['deleted_at'], deleted[-1]['id'])
+        timestamps = [zakazka['updated_at'] for zakazka in changes] + [tombstone['deleted_at'] for tombstone in deleted]
+        watermark = max([watermark] + timestamps)
+        return {
+            "changes": changes,
+            "deleted": deleted,
+            "watermark": watermark,
+            "has_more": has_more,
+            "cursor": encode_changes_cursor(positions, watermark) if has_more else None,
+        }
+
+    async def get_dashboard(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Data dashboardu ze souhrnného dokumentu - jedno čtení bez ohledu na počet zakázek"""
+        if not await self._ensure_ready():
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            return None
+
+        try:
+            summary = await self._load_summary(user_id)
+            return zakazky_stats.summary_view(summary) if summary is not None else None
+        except Exception as e:
+            print(f"❌ Chyba při získávání dashboardu: {e}")
+            return None
+
+    async def get_timeseries(
+        self,
+        user_id: str,
+        granularity: str,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        max_points: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Časová řada (tržby, zisk, počet, náklady) z rollup dokumentů - jedno čtení na období.
+
+        Bez ``date_from``/``date_to`` se rozsah bere od prvního do posledního
+        období s daty. Období bez zakázek se vrací s nulami. Rozsah delší než
+        ``max_points`` období vyhodí ``QueryError`` (i když hranice doplnila data).
+        """
+        if not await self._ensure_ready():
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            return None
+
+        try:
+            if await self._load_summary(user_id) is None:
+                return None
+            query = self._rollups_ref(user_id).where(
+                filter=_firestore().FieldFilter('granularity', '==', granularity)
+            )
+            if date_from:
+                query = query.where(filter=_firestore().FieldFilter(
+                    'period', '>=', zakazky_stats.period_key(granularity, date_from)
+                ))
+            if date_to:
+                query = query.where(filter=_firestore().FieldFilter(
+                    'period', '<=', zakazky_stats.period_key(granularity, date_to)
+                ))
+            rollups = await self._run(lambda: {doc.get('period'): doc.to_dict() for doc in query.stream()})
+
+            # Rollup bez zakázek (vše smazáno) se nepočítá do výchozího rozsahu
+            used = sorted(period for period, rollup in rollups.items() if rollup.get('pocet'))
+            first = date_from or (zakazky_stats.period_date(granularity, used[0]) if used else None)
+            last = date_to or (zakazky_stats.period_date(granularity, used[-1]) if used else None)
+            periods = zakazky_stats.periods(granularity, first, last) if first and last else []
+            if max_points is not None and len(periods) > max_points:
+                raise QueryError(
+                    f"Maximálně {max_points} období v jednom dotazu (data {first.isoformat()} až "
+                    f"{last.isoformat()}, zadejte from/to)"
+                )
+            return {
+                "granularity": granularity,
+                "from": first,
+                "to": last,
+                "points": [zakazky_stats.rollup_view(period, rollups.get(period[0])) for period in periods],
+            }
+        except QueryError:
+            raise
+        except Exception as e:
+            print(f"❌ Chyba při získávání časové řady: {e}")
+            return None
+
+    async def _load_summary(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Souhrnný dokument; souhrn, který ještě nikdy nebyl přepočítán (uživatel
+        se zakázkami z doby před souhrny), se napoprvé přepočítá z celé historie.
+        """
+        snapshot = await self._run(self._summary_ref(user_id).get)
+        summary = snapshot.to_dict() if snapshot.exists else None
+        if summary and 'rebuilt_at' in summary:
+            return summary
+        if not await self.rebuild_aggregates(user_id):
+            return None
+        snapshot = await self._run(self._summary_ref(user_id).get)
+        return snapshot.to_dict()
+
+    async def rebuild_aggregates(self, user_id: str) -> bool:
+        """Přepočítá souhrn dashboardu a rollupy časových řad ze všech zakázek.
+
+        Souběžná volání pro stejného uživatele čekají na jeden přepočet.
+        Zápis, který proběhne během přepočtu, by přepsaný rollup rozladil -
+        pozná se podle ``data_version`` a přepočet se zopakuje (nejvýše
+        ``REBUILD_ATTEMPTS`` krát). Souhrn se zapisuje až nakonec v transakci,
+        která verzi ověří.
+        """
+        if not await self._ensure_ready():
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            return False
+
+        future = self._aggregate_rebuilds.get(user_id)
+        if future is None:
+            future = self._aggregate_rebuilds[user_id] = asyncio.ensure_future(self._rebuild_aggregates(user_id))
+            future.add_done_callback(lambda _: self._aggregate_rebuilds.pop(user_id, None))
+        return await asyncio.shield(future)
+
+    async def _rebuild_aggregates(self, user_id: str) -> bool:
+        try:
+            for attempt in range(1, REBUILD_ATTEMPTS + 1):
+                result = await self._rebuild_aggregates_once(user_id)
+                if result is not None:
+                    summary, rollups = result
+                    print(f"📊 Agregace přepočítány: {user_id} ({summary['pocet']} zakázek, {len(rollups)} rollupů)")
+                    return True
+                print(f"🔄 Během přepočtu agregací se zapisovalo ({user_id}), pokus {attempt}/{REBUILD_ATTEMPTS}")
+            print(f"❌ Přepočet agregací se nepodařilo dokončit bez souběžných zápisů ({user_id})")
+            return False
+        except Exception as e:
+            print(f"❌ Chyba při přepočtu agregací: {e}")
+            return False
+
+    async def _rebuild_aggregates_once(self, user_id: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Jeden pokus o přepočet; None = během něj zapisoval někdo jiný"""
+        user_ref = self._user_ref(user_id)
+
+        def _version(snapshot) -> int:
+            return (snapshot.to_dict() or {}).get(DATA_VERSION_FIELD, 0) if snapshot.exists else 0
+
+        started = _version(await self._run(user_ref.get, field_paths=[DATA_VERSION_FIELD]))
+        query = self._zakazky_ref(user_id).select(zakazky_stats.SUMMARY_SOURCE_FIELDS)
+        zakazky = await self._run(lambda: [doc.to_dict() for doc in query.stream()], timeout=0)
+        existing = await self._run(
+            lambda: [ref.id for ref in self._rollups_ref(user_id).list_documents()], timeout=0
+        )
+        summary = zakazky_stats.build_summary(zakazky)
+        rollups = zakazky_stats.build_rollups(zakazky)
+        rebuilt_at = _firestore().SERVER_TIMESTAMP
+
+        writes: List[Callable[[Any], None]] = []
+        for doc_id, rollup in rollups.items():
+            rollup['updated_at'] = rebuilt_at
+            writes.append(lambda batch, doc_id=doc_id, rollup=rollup: batch.set(
+                self._rollups_ref(user_id).document(doc_id), rollup
+            ))
+        for doc_id in set(existing) - set(rollups):
+            writes.append(lambda batch, doc_id=doc_id: batch.delete(self._rollups_ref(user_id).document(doc_id)))
+
+        chunks = list(_chunks(writes, FIRESTORE_BATCH_LIMIT - COMMIT_RESERVED_WRITES))
+        for chunk in chunks:
+
+            def _write(batch, chunk=chunk):
+                for write in chunk:
+                    write(batch)
+
+            _, error = await self._commit_with_retry(user_id, _write)
+            if error:
+                raise RuntimeError(error)
+
+        # Každý commit rollupů zvýšil verzi o 1 - jiná hodnota = souběžný zápis
+        expected = started + len(chunks)
+        summary['rebuilt_at'] = summary['updated_at'] = rebuilt_at
+
+        @_firestore().transactional
+        def _finish(transaction):
+            if _version(user_ref.get(transaction=transaction, field_paths=[DATA_VERSION_FIELD])) != expected:
+                return False
+            # Souhrn (s příznakem rebuilt_at) se zapisuje až po rollupech
+            transaction.set(self._summary_ref(user_id), summary)
+            self._write_version(transaction, user_id)
+            return True
+
+        if not await self._versioned(user_id, _finish, self._db.transaction()):
+            return None
+        return summary, rollups
+
+    async def backfill_datum(
+        self, user_id: str, restart: bool = False, page_size: int = FIRESTORE_BATCH_LIMIT - 1 - COMMIT_RESERVED_WRITES
+    ) -> Optional[Dict[str, Any]]:
+        """Doplní ``datum_iso``/``datum_epoch_day`` do existujících zakázek uživatele.
+
+        Zakázky se procházejí podle ID po stránkách; každá stránka se zapíše
+        jedním batchem spolu s checkpointem (``users/{id}/migrations/datum``),
+        takže přerušená migrace pokračuje za poslední zapsanou stránkou a nic
+        se nezapíše dvakrát. Další stránka se načítá souběžně s commitem
+        předchozí. ``updated_at`` se nemění - migrace nemá vyvolat
+        synchronizaci všech zakázek u klientů. Vrací stav migrace, None při chybě.
+        """
+        if not await self._ensure_ready():
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            return None
+
+        checkpoint_ref = self._migrations_ref(user_id).document('datum')
+        try:
+            state = {} if restart else (await self._run(checkpoint_ref.get)).to_dict() or {}
+            if state.get('done'):
+                return state
+            state = {'last_id': state.get('last_id'), 'scanned': state.get('scanned', 0), 'updated': state.get('updated', 0)}
+            query = self._zakazky_ref(user_id).select(['datum', DATUM_ISO_FIELD, DATUM_DAY_FIELD]).order_by('__name__')
+
+            def _load(last_id):
+                page = query.start_after({'__name__': last_id}) if last_id else query
+                return [(doc.reference, doc.to_dict()) for doc in page.limit(page_size).stream()]
+
+            docs = await self._run(_load, state['last_id'])
+            while docs:
+                next_page = asyncio.ensure_future(self._run(_load, docs[-1][0].id)) if len(docs) == page_size else None
+                changes = []
+                for ref, data in docs:
+                    normalized = normalized_datum(data.get('datum'))
+                    if any(data.get(field) != value for field, value in normalized.items()):
+                        changes.append((ref, normalized))
+                state = dict(
+                    state,
+                    last_id=docs[-1][0].id,
+                    scanned=state['scanned'] + len(docs),
+                    updated=state['updated'] + len(changes),
+                    done=next_page is None,
+                    updated_at=datetime.now(timezone.utc),
+                )
+
+                def _write(batch, changes=changes, state=state):
+                    for ref, normalized in changes:
+                        batch.update(ref, normalized)
+                    batch.set(checkpoint_ref, state)
+
+                _, error = await self._commit_with_retry(user_id, _write)
+                if error:
+                    if next_page:
+                        next_page.cancel()
+                    print(f"❌ Chyba při migraci data zakázek ({user_id}): {error}")
+                    return None
+                docs = await next_page if next_page else []
+            if not state.get('done'):
+                # Žádné (další) zakázky - migrace je hotová
+                state = dict(state, done=True, updated_at=datetime.now(timezone.utc))
+                await self._run(checkpoint_ref.set, state)
+            return state
+        except Exception as e:
+            print(f"❌ Chyba při migraci data zakázek ({user_id}): {e}")
+            return None
+
+    async def reprice_zakazky(
+        self,
+        user_id: str,
+        dry_run: bool = False,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        page_size: int = REPRICE_PAGE_SIZE,
+        include_legacy: bool = False,
+    ) -> Optional[Dict[str, Any]]:
+        """Přepočítá fee a zisk všech zakázek uživatele podle ceníku (``pricing``).
+
+        Zakázky se načítají po stránkách jen s poli pro výpočet a souhrn,
+        každá stránka se spočítá vektorově a zapíšou se jen zakázky, jejichž
+        hodnoty nesedí - po commitech do 500 zápisů včetně rozdílů souhrnu a
+        rollupů. Další stránka se načítá souběžně se zápisem předchozí.
+        ``progress`` dostane průběžný stav po každé stránce. Souběžná úprava
+        téže zakázky může rozladit souhrn - opraví ho ``rebuild_aggregates``.
+        Zakázky bez verze ceníku (ručně zadané fee) se jen spočítají do
+        ``legacy``, přepočítají se až s ``include_legacy``. Vrací
+        ``{"scanned", "stale", "legacy", "updated", "failed", "commits", "version"}``,
+        None při chybě čtení.
+        """
+        if not await self._ensure_ready():
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            return None
+
+        fields = sorted(set(zakazky_stats.SUMMARY_SOURCE_FIELDS) | set(pricing.PRICING_INPUT_FIELDS) | set(pricing.PRICING_FIELDS))
+        query = self._zakazky_ref(user_id).select(fields).order_by('__name__')
+        state = {
+            "scanned": 0, "stale": 0, "legacy": 0, "updated": 0, "failed": 0, "commits": 0,
+            "version": pricing.current_version().version, "dry_run": dry_run, "include_legacy": include_legacy,
+        }
+
+        def _load(last_id):
+            page = query.start_after({'__name__': last_id}) if last_id else query
+            return [(doc.reference, doc.to_dict()) for doc in page.limit(page_size).stream()]
+
+        try:
+            docs = await self._run(_load, None)
+            while docs:
+                next_page = asyncio.ensure_future(self._run(_load, docs[-1][0].id)) if len(docs) == page_size else None
+                stale = pricing.stale_prices([data for _, data in docs], include_legacy=include_legacy)
+                state["scanned"] += len(docs)
+                state["legacy"] += sum(1 for _, data in docs if pricing.is_legacy(data))
+                state["stale"] += len(stale)
+                if not dry_run and stale:
+                    items = [(docs[position][0], docs[position][1], _stamp(changes)) for position, changes in stale]
+                    deltas = [zakazky_stats.aggregate_diff(old, dict(old, **changes)) for _, old, changes in items]
+                    for group, aggregates in _pack_writes(items, deltas, writes_per_item=1):
+                        def _write(batch, group=group):
+                            for ref, _, changes in group:
+                                batch.update(ref, changes)
+                        commit_time, error = await self._commit_with_retry(user_id, _write, aggregates)
+                        state["commits"] += 1
+                        if error:
+                            print(f"❌ Chyba při přepočtu fee a zisku ({user_id}): {error}")
+                            state["failed"] += len(group)
+                            continue
+                        state["updated"] += len(group)
+                        for ref, _, changes in group:
+                            self._notify_write(user_id, 'updated', ref.id, _resolve_timestamps(changes, commit_time))
+                if progress:
+                    progress(dict(state))
+                docs = await next_page if next_page else []
+            return state
+        except Exception as e:
+            print(f"❌ Chyba při přepočtu fee a zisku ({user_id}): {e}")
+            return None
+
+    async def dedupe_zakazky(self, user_id: str, delete: bool = False) -> Optional[Dict[str, Any]]:
+        """Přestaví index otisků z celé historie a najde duplicitní zakázky jedním průchodem.
+
+        Zakázky se seskupí podle otisku v hash mapě (O(n), bez porovnávání
+        každé s každou). Index ``users/{id}/fingerprints`` se zapíše znovu,
+        zastaralé otisky se smažou a zakázkám se doplní pole ``fingerprint``
+        (bez změny ``updated_at``). S ``delete=True`` se z každé skupiny
+        ponechá nejstarší zakázka a ostatní se smažou přes
+        ``delete_zakazky_batch`` (souhrn, rollupy, tombstony). Vrací přehled,
+        None při chybě.
+        """
+        if not await self._ensure_ready():
+            print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            return None
+
+        try:
+            query = self._zakazky_ref(user_id).select(list(FINGERPRINT_FIELDS) + [FINGERPRINT_FIELD, 'updated_at'])
+            zakazky = await self._run(lambda: [self._doc_to_zakazka(doc) for doc in query.stream()], timeout=0)
+            indexed = await self._run(
+                lambda: [ref.id for ref in self._fingerprints_ref(user_id).list_documents()], timeout=0
+            )
+            groups = group_duplicates(zakazky)
+            duplicates = {value: split_duplicates(group) for value, group in groups.items() if len(group) > 1}
+            removed = {zakazka['id'] for _, extra in duplicates.values() for zakazka in extra} if delete else set()
+
+            writes: List[Callable[[Any], None]] = []
+            for value, group in groups.items():
+                ids = [zakazka['id'] for zakazka in group if zakazka['id'] not in removed]
+                writes.append(lambda batch, value=value, ids=ids: batch.set(
+                    self._fingerprints_ref(user_id).document(value), {'zakazky': ids}
+                ))
+                for zakazka in group:
+                    if zakazka['id'] not in removed and zakazka.get(FINGERPRINT_FIELD) != value:
+                        writes.append(lambda batch, zakazka_id=zakazka['id'], value=value: batch.update(
+                            self._zakazky_ref(user_id).document(zakazka_id), {FINGERPRINT_FIELD: value}
+                        ))
+            for value in set(indexed) - set(groups):
+                writes.append(lambda batch, value=value: batch.delete(self._fingerprints_ref(user_id).document(value)))
+
+            for chunk in _chunks(writes, FIRESTORE_BATCH_LIMIT - COMMIT_RESERVED_WRITES):
+
+                def _write(batch, chunk=chunk):
+                    for write in chunk:
+                        write(batch)
+
+                _, error = await self._commit_with_retry(user_id, _write)
+                if error:
+                    print(f"❌ Chyba při přestavbě indexu otisků: {error}")
+                    return None
+
+            deleted = 0
+            if removed:
+                results = await self.delete_zakazky_batch(user_id, sorted(removed))
+                deleted = sum(1 for result in results if result["status"] == "deleted")
+            print(f"🔍 Otisky zakázek přestavěny: {user_id} ({len(zakazky)} zakázek, {len(duplicates)} skupin duplicit)")
+            return {
+                "orders": len(zakazky),
+                "fingerprints": len(groups),
+                "duplicate_groups": len(duplicates),
+                "duplicates": sum(len(extra) for _, extra in duplicates.values()),
+                "deleted": deleted,
+                "groups": [
+                    {
+                        "keep": keep['id'],
+                        "duplicates": [zakazka['id'] for zakazka in extra],
+                        **{field: keep.get(field) for field in FINGERPRINT_FIELDS},
+                    }
+                    for keep, extra in duplicates.values()
+                ],
+            }
+        except Exception as e:
+            print(f"❌ Chyba při hledání duplicitních zakázek: {e}")
+            return None
+
+    async def reserve_idempotency_key(self, user_id: str, key_id: str, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Zabere klíč ``Idempotency-Key`` v transakci.
+
+        Vrací platný existující záznam (klíč už patří jinému pokusu), jinak
+        zapíše ``record`` a vrací None. Když Firestore selže, zápis se
+        neblokuje - provede se jako bez klíče.
+        """
+        doc_ref = self._idempotency_ref(user_id).document(key_id)
+
+        @_firestore().transactional
+        def _reserve(transaction):
+            existing = doc_ref.get(transaction=transaction).to_dict()
+            if existing and existing.get('expires_at') and existing['expires_at'] > datetime.now(timezone.utc):
+                return existing
+            transaction.set(doc_ref, record)
+            return None
+
+        try:
+            return await self._run(_reserve, self._db.transaction())
+        except Exception as e:
+            print(f"⚠️ Nelze zabrat Idempotency-Key, zápis proběhne bez něj: {e}")
+            return None
+
+    async def save_idempotency_key(self, user_id: str, key_id: str, record: Dict[str, Any]):
+        """Uloží odpověď k ``Idempotency-Key`` (přepíše rozpracovaný záznam)"""
+        try:
+            await self._run(self._idempotency_ref(user_id).document(key_id).set, record)
+        except Exception as e:
+            print(f"⚠️ Odpověď k Idempotency-Key se nepodařilo uložit: {e}")
+
+    async def renew_idempotency_key(
+        self, user_id: str, key_id: str, request_hash: str, expires_at: datetime
+    ) -> bool:
+        """Prodlouží zámek rozpracovaného ``Idempotency-Key``; False = klíč už drží jiný pokus"""
+        doc_ref = self._idempotency_ref(user_id).document(key_id)
+
+        @_firestore().transactional
+        def _renew(transaction):
+            existing = doc_ref.get(transaction=transaction).to_dict()
+            if not existing or existing.get('request_hash') != request_hash or existing.get('state') != STATE_PENDING:
+                return False
+            transaction.update(doc_ref, {'expires_at': expires_at})
+            return True
+
+        try:
+            return await self._run(_renew, self._db.transaction())
+        except Exception as e:
+            print(f"⚠️ Zámek Idempotency-Key se nepodařilo prodloužit: {e}")
+            return False
+
+    async def delete_idempotency_key(self, user_id: str, key_id: str):
+        """Uvolní ``Idempotency-Key`` požadavku, který nic nezapsal"""
+        try:
+            await self._run(self._idempotency_ref(user_id).document(key_id).delete)
+        except Exception as e:
+            print(f"⚠️ Idempotency-Key se nepodařilo uvolnit: {e}")
+
+    async def list_user_ids(self) -> List[str]:
+        """ID všech uživatelů (včetně těch, kteří mají jen podkolekce)"""
+        if not await self._ensure_ready():
+            return []
+        return await self._run(lambda: [ref.id for ref in self._db.collection('users').list_documents()], timeout=0)
+
+    async def _watch_zakazky(self, user_id: str, emit: Callable[[Dict[str, Any]], None]) -> Optional[Callable[[], None]]:
+        """Jeden Firestore ``on_snapshot`` listener na uživatele pro SSE.
+
+        Callback běží ve vlákně Firestore; první snapshot (aktuální stav) se
+        přeskočí - posílají se jen změny.
+        """
+        if not await self._ensure_ready():
+            return None  # v režimu fallback události generují zápisové cesty
+        initial = {'pending': True}
+        kinds = {'ADDED': 'created', 'MODIFIED': 'updated', 'REMOVED': 'deleted'}
+
+        def _on_snapshot(col_snapshot, changes, read_time):
+            if initial['pending']:
+                initial['pending'] = False
+                return
+            for change in changes:
+                kind = kinds.get(change.type.name, 'updated')
+                emit(_change_event(kind, change.document.id, None if kind == 'deleted' else change.document.to_dict()))
+
+        watch = await self._run(self._zakazky_ref(user_id).on_snapshot, _on_snapshot)
+        return watch.unsubscribe
+
+    def _publish_fallback_write(self, user_id: str, kind: str, zakazka_id: Optional[str], data: Optional[Dict[str, Any]]):
+        """V režimu fallback nejsou Firestore listenery - události posílají zápisové cesty"""
+        if self._db or kind == 'user' or not self._events.has_subscribers(user_id):
+            return
+        self._events.publish(user_id, _change_event(kind, zakazka_id, data))
+
+    def _user_ref(self, user_id: str):
+        return self._db.collection('users').document(user_id)
+
+    def _zakazky_ref(self, user_id: str):
+        return self._db.collection('users').document(user_id).collection('zakazky')
+
+    def _tombstones_ref(self, user_id: str):
+        """Záznamy o smazaných zakázkách (delta synchronizace)"""
+        return self._db.collection('users').document(user_id).collection('zakazky_tombstones')
+
+    def _summary_ref(self, user_id: str):
+        """Souhrnný dokument dashboardu (udržovaný přírůstky při zápisech)"""
+        return self._db.collection('users').document(user_id).collection('stats').document('summary')
+
+    def _rollups_ref(self, user_id: str):
+        """Rollupy časových řad - dokument na období ({granularita}:{období})"""
+        return self._db.collection('users').document(user_id).collection('rollups')
+
+    def _migrations_ref(self, user_id: str):
+        """Checkpointy datových migrací uživatele (dokument na migraci)"""
+        return self._db.collection('users').document(user_id).collection('migrations')
+
+    def _commits_ref(self, user_id: str):
+        """Značky commitů s přírůstky (maže je TTL politika nad ``expires_at``)"""
+        return self._db.collection('users').document(user_id).collection('commits')
+
+    def _idempotency_ref(self, user_id: str):
+        """Záznamy ``Idempotency-Key`` (dokument na hash klíče, maže je TTL politika nad ``expires_at``)"""
+        return self._db.collection('users').document(user_id).collection('idempotency')
+
+    def _write_aggregates(self, writer, user_id: str, deltas: Dict[str, Dict[Tuple[str, ...], float]]):
+        """Přičte rozdíly souhrnu a rollupů v rámci batche/transakce (``writer``) - nulové rozdíly nic nezapisují"""
+        firestore = _firestore()
+        increment, updated_at = firestore.Increment, firestore.SERVER_TIMESTAMP
+        for doc_id, delta in deltas.items():
+            if not delta:
+                continue
+            data = zakazky_stats.nested(delta, increment)
+            data['updated_at'] = updated_at
+            if doc_id == zakazky_stats.SUMMARY_KEY:
+                writer.set(self._summary_ref(user_id), data, merge=True)
+            else:
+                data.update(zakazky_stats.rollup_fields(doc_id))
+                writer.set(self._rollups_ref(user_id).document(doc_id), data, merge=True)
+
+    def _write_version(self, writer, user_id: str):
+        """Zvýší verzi dat uživatele v rámci batche/transakce (ETagy, platnost lokálních kopií)"""
+        writer.set(self._user_ref(user_id), {DATA_VERSION_FIELD: _firestore().Increment(1)}, merge=True)
+
+    def _fingerprints_ref(self, user_id: str):
+        """Index otisků obsahu zakázek - dokument na otisk se seznamem ID zakázek"""
+        return self._db.collection('users').document(user_id).collection('fingerprints')
+
+    def _write_fingerprint(self, writer, user_id: str, zakazka_id: str, before: Optional[str], after: Optional[str]):
+        """Přesune ID zakázky v indexu otisků z ``before`` do ``after`` (None = zakázka v indexu není / nebude)"""
+        if before == after:
+            return
+        firestore = _firestore()
+        if before:
+            writer.set(self._fingerprints_ref(user_id).document(before), {'zakazky': firestore.ArrayRemove([zakazka_id])}, merge=True)
+        if after:
+            writer.set(self._fingerprints_ref(user_id).document(after), {'zakazky': firestore.ArrayUnion([zakazka_id])}, merge=True)
+
+    @staticmethod
+    def _refingerprint(old: Dict[str, Any], zakazka_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Úprava doplněná o nový otisk, pokud mění pole otisku (vstup se nemění)"""
+        if touches_fingerprint(zakazka_data):
+            return dict(zakazka_data, **{FINGERPRINT_FIELD: fingerprint(dict(old, **zakazka_data))})
+        return zakazka_data
+
+    @staticmethod
+    def _reprice(old: Dict[str, Any], zakazka_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Fee a zisk počítá server - úprava jejich vstupů je přepočítá podle ceníku (vstup se nemění)"""
+        if pricing.touches_pricing(zakazka_data):
+            return dict(zakazka_data, **pricing.reprice(old, zakazka_data))
+        return zakazka_data
+
+    def _write_delete(self, batch, user_id: str, zakazka_id: str):
+        """Smazání zakázky + tombstone (``deleted_at`` = čas commitu) v jednom batchi (nebo transakci)"""
+        batch.delete(self._zakazky_ref(user_id).document(zakazka_id))
+        batch.set(self._tombstones_ref(user_id).document(zakazka_id), {'deleted_at': _firestore().SERVER_TIMESTAMP})
+
+    def filtered_zakazky_query(self, user_id: str, filters: Optional[ZakazkyFilter] = None):
+        """Dotaz na zakázky uživatele s filtry, které umí vyhodnotit Firestore (bez řazení)"""
+        query = self._zakazky_ref(user_id)
+        if filters:
+            query = filters.apply_where(query)
+        return query
+
+    def _build_page_query(self, user_id: str, field: str, descending: bool, filters: Optional[ZakazkyFilter] = None):
+        """Dotaz seřazený podle pole + ID dokumentu (jednoznačné pořadí pro kurzor)"""
+        firestore = _firestore()
+        direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+        query = self.filtered_zakazky_query(user_id, filters)
+        if field != '__name__':
+            query = query.order_by(field, direction=direction)
+        return query.order_by('__name__', direction=direction)
+
+    @staticmethod
+    def _doc_to_zakazka(doc) -> Dict[str, Any]:
+        zakazka = doc.to_dict()
+        zakazka['id'] = doc.id
+        return zakazka
     
     async def update_zakazka(self, user_id: str, zakazka_id: str, zakazka_data: Dict[str, Any]) -> bool:
         """Aktualizace zakázky - fallback na Supabase"""
-        if not self._db:
+        if not await self._ensure_ready():
             print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            self._notify_write(user_id, 'updated', zakazka_id, zakazka_data)
             return True
             
         try:
-            zakazka_ref = self._db.collection('users').document(user_id).collection('zakazky').document(zakazka_id)
-            zakazka_ref.update(zakazka_data)
+            zakazka_data = _stamp(zakazka_data)
+            zakazka_ref = self._zakazky_ref(user_id).document(zakazka_id)
+            if not (
+                zakazky_stats.touches_summary(zakazka_data)
+                or touches_fingerprint(zakazka_data)
+                or pricing.touches_pricing(zakazka_data)
+            ):
+                batch = self._db.batch()
+                batch.update(zakazka_ref, zakazka_data)
+                self._write_version(batch, user_id)
+                await self._versioned(user_id, batch.commit)
+                self._notify_write(user_id, 'updated', zakazka_id, _resolve_timestamps(zakazka_data, batch.commit_time))
+                return True
+
+            @_firestore().transactional
+            def _update(transaction):
+                # Původní verze se čte v transakci - souhrn, rollupy a index otisků dostanou přesný rozdíl.
+                # Při opakování transakce se payload staví znovu z původní úpravy.
+                snapshot = zakazka_ref.get(transaction=transaction)
+                if not snapshot.exists:
+                    return None
+                old = snapshot.to_dict()
+                payload = self._refingerprint(old, self._reprice(old, zakazka_data))
+                transaction.update(zakazka_ref, payload)
+                self._write_fingerprint(
+                    transaction, user_id, zakazka_id, stored_fingerprint(old), stored_fingerprint(dict(old, **payload))
+                )
+                self._write_aggregates(transaction, user_id, zakazky_stats.aggregate_diff(old, dict(old, **payload)))
+                self._write_version(transaction, user_id)
+                return payload
+
+            transaction = self._db.transaction()
+            payload = await self._versioned(user_id, _update, transaction)
+            if payload is None:
+                print(f"❌ Zakázka {zakazka_id} neexistuje")
+                return False
+            self._notify_write(user_id, 'updated', zakazka_id, _resolve_timestamps(payload, transaction.commit_time))
             return True
         except Exception as e:
             print(f"❌ Chyba při aktualizaci zakázky: {e}")
@@ -172,13 +1701,25 @@ class FirebaseService:
     
     async def delete_zakazka(self, user_id: str, zakazka_id: str) -> bool:
         """Smazání zakázky - fallback na Supabase"""
-        if not self._db:
+        if not await self._ensure_ready():
             print("📝 Firebase nedostupný - data spravuje Supabase na frontendu")
+            self._notify_write(user_id, 'deleted', zakazka_id)
             return True
             
         try:
-            zakazka_ref = self._db.collection('users').document(user_id).collection('zakazky').document(zakazka_id)
-            zakazka_ref.delete()
+            zakazka_ref = self._zakazky_ref(user_id).document(zakazka_id)
+
+            @_firestore().transactional
+            def _delete(transaction):
+                snapshot = zakazka_ref.get(transaction=transaction)
+                old = snapshot.to_dict() if snapshot.exists else None
+                self._write_delete(transaction, user_id, zakazka_id)
+                self._write_fingerprint(transaction, user_id, zakazka_id, stored_fingerprint(old), None)
+                self._write_aggregates(transaction, user_id, zakazky_stats.aggregate_diff(old, None))
+                self._write_version(transaction, user_id)
+
+            await self._versioned(user_id, _delete, self._db.transaction())
+            self._notify_write(user_id, 'deleted', zakazka_id)
             return True
         except Exception as e:
             print(f"❌ Chyba při mazání zakázky: {e}")
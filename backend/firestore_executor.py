@@ -0,0 +1,105 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class FirestoreExecutor:
+    """Omezený a instrumentovaný thread pool pro synchronní Firestore klienta.
+
+    Firestore Admin SDK je blokující - každé volání proto běží ve vlastním
+    vlákně, aby jeden pomalý ``stream()`` nezastavil event loop uvicornu.
+    Souběh je omezen semaforem, každé volání má vlastní timeout.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.max_workers = max_workers or int(os.environ.get('FIRESTORE_MAX_WORKERS', '16'))
+        self.max_concurrency = max_concurrency or int(
+            os.environ.get('FIRESTORE_MAX_CONCURRENCY', str(self.max_workers))
+        )
+        self.timeout = timeout if timeout is not None else float(
+            os.environ.get('FIRESTORE_CALL_TIMEOUT', '10')
+        )
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='firestore')
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        # Metriky
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._timeouts = 0
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._waiting = 0
+        self._total_time = 0.0
+        self._max_time = 0.0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Spustí blokující volání mimo event loop a počká na výsledek.
+
+        Při překročení timeoutu vyhodí ``asyncio.TimeoutError``; vlákno samo
+        doběhne na pozadí, ale slot semaforu se uvolní hned.
+        """
+        loop = asyncio.get_running_loop()
+        call_timeout = self.timeout if timeout is None else timeout
+        semaphore = self._get_semaphore()
+
+        self._submitted += 1
+        self._waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        started = time.perf_counter()
+        try:
+            future = loop.run_in_executor(self._pool, lambda: fn(*args, **kwargs))
+            result = await asyncio.wait_for(future, timeout=call_timeout or None)
+            self._completed += 1
+            return result
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self._total_time += elapsed
+            self._max_time = max(self._max_time, elapsed)
+            self._in_flight -= 1
+            semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Aktuální metriky executoru"""
+        finished = self._completed + self._failed + self._timeouts
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "timeout_s": self.timeout,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "timeouts": self._timeouts,
+            "in_flight": self._in_flight,
+            "peak_in_flight": self._peak_in_flight,
+            "waiting": self._waiting,
+            "avg_latency_ms": round(self._total_time / finished * 1000, 2) if finished else 0.0,
+            "max_latency_ms": round(self._max_time * 1000, 2),
+        }
+
+    def shutdown(self, wait: bool = False):
+        self._pool.shutdown(wait=wait)
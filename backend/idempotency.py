@@ -0,0 +1,256 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+# Hlavička, kterou klient označí opakovaný pokus o stejný zápis
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# Hlavička odpovědi přehrané z uloženého výsledku
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+MAX_KEY_LENGTH = 255
+
+# Firestore dokument má nejvýše 1 MiB - větší (komprimovaná) odpověď se neukládá
+MAX_STORED_RESPONSE_BYTES = 900_000
+
+STATE_PENDING = 'pending'
+STATE_DONE = 'done'
+
+
+class IdempotencyError(Exception):
+    """Klíč nejde použít (neplatný, jiný požadavek, požadavek ještě běží)"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def request_hash(method: str, path: str, query: str, body: bytes) -> str:
+    """Otisk požadavku - stejný klíč s jiným požadavkem se odmítne"""
+    digest = hashlib.sha256()
+    for part in (method.upper().encode('utf-8'), path.encode('utf-8'), query.encode('utf-8'), body):
+        digest.update(part)
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def key_id(key: str) -> str:
+    """ID záznamu klíče (klíč od klienta může obsahovat i znaky, které Firestore v ID nepovolí)"""
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _encode_body(body: Any) -> Optional[bytes]:
+    packed = zlib.compress(json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    return packed if len(packed) <= MAX_STORED_RESPONSE_BYTES else None
+
+
+def _decode_body(packed: bytes) -> Any:
+    return json.loads(zlib.decompress(packed).decode('utf-8'))
+
+
+class MemoryIdempotencyStore:
+    """Klíče v paměti procesu (LRU + TTL + limit paměti) - stačí pro jednu instanci.
+
+    Stejně jako ``ZakazkyCache`` se používá jen z event loopu, zámky nepotřebuje.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_keys: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.max_keys = max_keys or int(os.environ.get('IDEMPOTENCY_MAX_KEYS', '10000'))
+        self.max_bytes = max_bytes or int(float(os.environ.get('IDEMPOTENCY_MAX_MB', '32')) * 1024 * 1024)
+        self._records: 'OrderedDict[Tuple[str, str], Dict[str, Any]]' = OrderedDict()
+        self._bytes = 0
+        self._evictions = 0
+
+    async def reserve(self, user_id: str, record_id: str, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Zabere klíč pro nový požadavek; když už je platný záznam, vrátí ho a nic nemění"""
+        existing = self._records.get((user_id, record_id))
+        if existing is not None and existing['expires_at'] > _now():
+            self._records.move_to_end((user_id, record_id))
+            return dict(existing)
+        self._put(user_id, record_id, record)
+        return None
+
+    async def complete(self, user_id: str, record_id: str, record: Dict[str, Any]):
+        self._put(user_id, record_id, record)
+
+    async def renew(self, user_id: str, record_id: str, request_hash: str, expires_at: datetime) -> bool:
+        """Prodlouží zámek rozpracovaného klíče; False = klíč už drží jiný pokus"""
+        record = self._records.get((user_id, record_id))
+        if record is None or record.get('request_hash') != request_hash or record.get('state') != STATE_PENDING:
+            return False
+        record['expires_at'] = expires_at
+        return True
+
+    async def release(self, user_id: str, record_id: str):
+        self._remove((user_id, record_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "store": self.name,
+            "keys": len(self._records),
+            "bytes": self._bytes,
+            "max_keys": self.max_keys,
+            "max_bytes": self.max_bytes,
+            "evictions": self._evictions,
+        }
+
+    def _put(self, user_id: str, record_id: str, record: Dict[str, Any]):
+        self._remove((user_id, record_id))
+        self._records[(user_id, record_id)] = dict(record)
+        self._bytes += self._size(record)
+        while self._records and (len(self._records) > self.max_keys or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._records)))
+            self._evictions += 1
+
+    def _remove(self, key: Tuple[str, str]):
+        record = self._records.pop(key, None)
+        if record is not None:
+            self._bytes -= self._size(record)
+
+    @staticmethod
+    def _size(record: Dict[str, Any]) -> int:
+        return len(record.get('body') or b'') + 300
+
+
+class FirestoreIdempotencyStore:
+    """Klíče ve Firestore (``users/{id}/idempotency/{hash klíče}``) - sdílené všemi instancemi.
+
+    Zabrání klíče je transakce, takže dva souběžné pokusy nezapíšou oba.
+    Staré záznamy maže Firestore TTL politika nad polem ``expires_at``. Ve
+    fallback režimu (bez Firestore) se klíče drží v paměti.
+    """
+
+    name = 'firestore'
+
+    def __init__(self, firebase_service, fallback: Optional[MemoryIdempotencyStore] = None):
+        self._service = firebase_service
+        self._fallback = fallback or MemoryIdempotencyStore()
+
+    async def reserve(self, user_id: str, record_id: str, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not await self._service.wait_until_ready():
+            return await self._fallback.reserve(user_id, record_id, record)
+        return await self._service.reserve_idempotency_key(user_id, record_id, record)
+
+    async def complete(self, user_id: str, record_id: str, record: Dict[str, Any]):
+        if not await self._service.wait_until_ready():
+            return await self._fallback.complete(user_id, record_id, record)
+        await self._service.save_idempotency_key(user_id, record_id, record)
+
+    async def renew(self, user_id: str, record_id: str, request_hash: str, expires_at: datetime) -> bool:
+        if not await self._service.wait_until_ready():
+            return await self._fallback.renew(user_id, record_id, request_hash, expires_at)
+        return await self._service.renew_idempotency_key(user_id, record_id, request_hash, expires_at)
+
+    async def release(self, user_id: str, record_id: str):
+        if not await self._service.wait_until_ready():
+            return await self._fallback.release(user_id, record_id)
+        await self._service.delete_idempotency_key(user_id, record_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"store": self.name, "fallback": self._fallback.stats()}
+
+
+class IdempotencyKeys:
+    """Idempotentní zápisy podle hlavičky ``Idempotency-Key``.
+
+    Před zápisem se klíč zabere (záznam ``pending`` s krátkou platností, aby
+    spadlý požadavek klíč neblokoval navždy). Dokud zápis běží, ``hold`` zámek
+    průběžně prodlužuje, takže ani dlouhá dávka klíč neuvolní. Po úspěšném zápisu se uloží
+    stav a tělo odpovědi na ``IDEMPOTENCY_TTL`` sekund. Opakovaný pokus pak
+    dostane původní odpověď bez dalšího zápisu.
+    """
+
+    def __init__(self, store, ttl: Optional[float] = None, lock_ttl: Optional[float] = None):
+        self.store = store
+        self.ttl = ttl if ttl is not None else float(os.environ.get('IDEMPOTENCY_TTL', '86400'))
+        self.lock_ttl = lock_ttl if lock_ttl is not None else float(os.environ.get('IDEMPOTENCY_LOCK_TTL', '60'))
+        self._outcomes = {'stored': 0, 'replayed': 0, 'conflicts': 0, 'mismatches': 0, 'released': 0, 'renewed': 0}
+
+    async def begin(self, user_id: str, key: str, fingerprint: str) -> Optional[Tuple[int, Any]]:
+        """Zabere klíč; vrací (status, tělo) uložené odpovědi, None = požadavek se má provést.
+
+        Vyhodí ``IdempotencyError``, když klíč patří jinému požadavku nebo
+        první pokus ještě běží.
+        """
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise IdempotencyError(f"Hlavička {IDEMPOTENCY_HEADER} musí mít 1 až {MAX_KEY_LENGTH} znaků")
+        pending = {
+            'request_hash': fingerprint,
+            'state': STATE_PENDING,
+            'expires_at': _now() + timedelta(seconds=self.lock_ttl),
+        }
+        existing = await self.store.reserve(user_id, key_id(key), pending)
+        if existing is None:
+            return None
+        if existing.get('request_hash') != fingerprint:
+            self._outcomes['mismatches'] += 1
+            raise IdempotencyError(f"Klíč {IDEMPOTENCY_HEADER} už byl použit pro jiný požadavek", status_code=422)
+        if existing.get('state') != STATE_DONE:
+            self._outcomes['conflicts'] += 1
+            raise IdempotencyError("Požadavek s tímto klíčem se ještě zpracovává", status_code=409)
+        self._outcomes['replayed'] += 1
+        if existing.get('body') is None:
+            # Odpověď byla příliš velká na uložení - zápis ale proběhl, neopakuje se
+            return existing['status_code'], {"detail": "Požadavek s tímto klíčem už byl proveden, výsledek není uložen"}
+        return existing['status_code'], _decode_body(existing['body'])
+
+    @contextlib.asynccontextmanager
+    async def hold(self, user_id: str, key: str, fingerprint: str) -> AsyncIterator[None]:
+        """Drží zámek zabraného klíče po dobu bloku - prodlužuje ho každou třetinu ``lock_ttl``"""
+
+        async def _renew():
+            while True:
+                await asyncio.sleep(self.lock_ttl / 3)
+                expires_at = _now() + timedelta(seconds=self.lock_ttl)
+                if not await self.store.renew(user_id, key_id(key), fingerprint, expires_at):
+                    return
+                self._outcomes['renewed'] += 1
+
+        renewal = asyncio.ensure_future(_renew())
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await renewal
+
+    async def finish(self, user_id: str, key: str, fingerprint: str, status_code: int, body: Any):
+        """Uloží odpověď provedeného požadavku pro opakované pokusy"""
+        await self.store.complete(user_id, key_id(key), {
+            'request_hash': fingerprint,
+            'state': STATE_DONE,
+            'status_code': status_code,
+            'body': _encode_body(body),
+            'expires_at': _now() + timedelta(seconds=self.ttl),
+        })
+        self._outcomes['stored'] += 1
+
+    async def abort(self, user_id: str, key: str):
+        """Uvolní klíč požadavku, který nic nezapsal - další pokus se provede znovu"""
+        await self.store.release(user_id, key_id(key))
+        self._outcomes['released'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.store.stats(), "ttl_s": self.ttl, "lock_ttl_s": self.lock_ttl, **self._outcomes}
+
+
+def create_idempotency_keys(firebase_service) -> IdempotencyKeys:
+    """Úložiště podle ``IDEMPOTENCY_STORE`` (firestore | memory)"""
+    kind = os.environ.get('IDEMPOTENCY_STORE', 'firestore').lower()
+    if kind == 'memory':
+        return IdempotencyKeys(MemoryIdempotencyStore())
+    if kind != 'firestore':
+        raise ValueError(f"Neznámé IDEMPOTENCY_STORE: {kind} (povoleno: firestore, memory)")
+    return IdempotencyKeys(FirestoreIdempotencyStore(firebase_service))
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Údržbové příkazy backendu Dušan - Správa zakázek.
+
+Použití:
+    python manage.py rebuild-aggregates USER_ID [USER_ID ...]
+    python manage.py rebuild-aggregates --all
+    python manage.py backfill-dates --all [--concurrency 4] [--restart]
+    python manage.py dedupe --all [--delete]
+    python manage.py reprice --all [--dry-run] [--include-legacy]
+"""
+import asyncio
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+sys.path.insert(0, str(ROOT_DIR))
+
+from firebase_service import get_firebase_service
+
+app = typer.Typer(help="Údržbové příkazy backendu (Firebase)")
+
+
+@app.callback()
+def main():
+    """Údržbové příkazy backendu (Firebase)"""
+
+
+async def _with_service(action):
+    service = get_firebase_service()
+    try:
+        await service.start()
+        if not service.db:
+            typer.echo("❌ Firebase není nakonfigurován - příkaz nemá co dělat")
+            raise typer.Exit(code=1)
+        return await action(service)
+    finally:
+        await service.close()
+
+
+@app.command("rebuild-aggregates")
+def rebuild_aggregates(
+    user_ids: Optional[List[str]] = typer.Argument(None, help="ID uživatelů"),
+    all_users: bool = typer.Option(False, "--all", help="Přepočítat všechny uživatele"),
+):
+    """Přepočítá souhrn dashboardu (users/{id}/stats/summary) a rollupy časových řad z kompletní historie zakázek"""
+    if not user_ids and not all_users:
+        typer.echo("Zadejte ID uživatelů nebo --all")
+        raise typer.Exit(code=2)
+
+    async def _rebuild(service):
+        ids = await service.list_user_ids() if all_users else user_ids
+        failed = 0
+        for user_id in ids:
+            if await service.rebuild_aggregates(user_id):
+                typer.echo(f"✅ {user_id}")
+            else:
+                failed += 1
+        typer.echo(f"Hotovo: {len(ids) - failed} přepočteno, {failed} chyb")
+        return failed
+
+    if asyncio.run(_with_service(_rebuild)):
+        raise typer.Exit(code=1)
+
+
+@app.command("backfill-dates")
+def backfill_dates(
+    user_ids: Optional[List[str]] = typer.Argument(None, help="ID uživatelů"),
+    all_users: bool = typer.Option(False, "--all", help="Migrovat všechny uživatele"),
+    concurrency: int = typer.Option(4, "--concurrency", min=1, help="Počet uživatelů migrovaných souběžně"),
+    restart: bool = typer.Option(False, "--restart", help="Ignorovat checkpointy a projít vše znovu"),
+):
+    """Doplní normalizované datum (datum_iso, datum_epoch_day) do existujících zakázek.
+
+    Migrace je checkpointovaná po stránkách - opakované spuštění pokračuje tam,
+    kde skončilo, a hotové uživatele přeskočí.
+    """
+    if not user_ids and not all_users:
+        typer.echo("Zadejte ID uživatelů nebo --all")
+        raise typer.Exit(code=2)
+
+    async def _backfill(service):
+        ids = await service.list_user_ids() if all_users else user_ids
+        limit = asyncio.Semaphore(concurrency)
+
+        async def _one(user_id):
+            async with limit:
+                state = await service.backfill_datum(user_id, restart=restart)
+            if state is None:
+                return False
+            typer.echo(f"✅ {user_id}: {state['updated']} upraveno z {state['scanned']}")
+            return True
+
+        results = await asyncio.gather(*(_one(user_id) for user_id in ids))
+        failed = results.count(False)
+        typer.echo(f"Hotovo: {len(ids) - failed} migrováno, {failed} chyb")
+        return failed
+
+    if asyncio.run(_with_service(_backfill)):
+        raise typer.Exit(code=1)
+
+
+@app.command("dedupe")
+def dedupe(
+    user_ids: Optional[List[str]] = typer.Argument(None, help="ID uživatelů"),
+    all_users: bool = typer.Option(False, "--all", help="Projít všechny uživatele"),
+    delete: bool = typer.Option(False, "--delete", help="Smazat duplicity (ponechá se nejstarší zakázka ze skupiny)"),
+):
+    """Přestaví index otisků zakázek a najde duplicity (datum, klient, castka, druh, adresa)"""
+    if not user_ids and not all_users:
+        typer.echo("Zadejte ID uživatelů nebo --all")
+        raise typer.Exit(code=2)
+
+    async def _dedupe(service):
+        ids = await service.list_user_ids() if all_users else user_ids
+        failed = 0
+        for user_id in ids:
+            report = await service.dedupe_zakazky(user_id, delete=delete)
+            if report is None:
+                failed += 1
+                continue
+            typer.echo(
+                f"✅ {user_id}: {report['orders']} zakázek, {report['duplicate_groups']} skupin duplicit "
+                f"({report['duplicates']} navíc), smazáno {report['deleted']}"
+            )
+            if not delete:
+                for group in report["groups"]:
+                    typer.echo(f"   {group['datum']} | {group['klient']} | {group['castka']}: "
+                               f"ponechat {group['keep']}, duplicity {', '.join(group['duplicates'])}")
+        typer.echo(f"Hotovo: {len(ids) - failed} zpracováno, {failed} chyb")
+        return failed
+
+    if asyncio.run(_with_service(_dedupe)):
+        raise typer.Exit(code=1)
+
+
+@app.command("reprice")
+def reprice(
+    user_ids: Optional[List[str]] = typer.Argument(None, help="ID uživatelů"),
+    all_users: bool = typer.Option(False, "--all", help="Přepočítat všechny uživatele"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Jen spočítat zakázky, které by se změnily"),
+    include_legacy: bool = typer.Option(
+        False, "--include-legacy", help="Přepočítat i zakázky bez verze ceníku (ručně zadané fee se přepíše)"
+    ),
+):
+    """Přepočítá fee a zisk zakázek podle aktuálního ceníku (pricing.py) - po změně sazby"""
+    if not user_ids and not all_users:
+        typer.echo("Zadejte ID uživatelů nebo --all")
+        raise typer.Exit(code=2)
+
+    async def _reprice(service):
+        ids = await service.list_user_ids() if all_users else user_ids
+        failed = 0
+        for user_id in ids:
+            def _progress(state, user_id=user_id):
+                typer.echo(f"   {user_id}: {state['scanned']} prošlo, {state['stale']} nesedí, {state['updated']} upraveno")
+
+            report = await service.reprice_zakazky(
+                user_id, dry_run=dry_run, progress=_progress, include_legacy=include_legacy
+            )
+            if report is None:
+                failed += 1
+                continue
+            if report['failed']:
+                typer.echo(f"❌ {user_id}: {report['failed']} zakázek se nepodařilo zapsat (stačí spustit znovu)")
+                failed += 1
+                continue
+            action = "k úpravě" if dry_run else "upraveno"
+            typer.echo(
+                f"✅ {user_id}: {report['stale']} {action} z {report['scanned']} (ceník v{report['version']}, "
+                f"{report['legacy']} bez verze ceníku)"
+            )
+        typer.echo(f"Hotovo: {len(ids) - failed} přepočteno, {failed} chyb")
+        return failed
+
+    if asyncio.run(_with_service(_reprice)):
+        raise typer.Exit(code=1)
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class _Entry:
+    __slots__ = ('columns', 'size', 'expires_at')
+
+    def __init__(self, columns, size: int, expires_at: float):
+        self.columns = columns
+        self.size = size
+        self.expires_at = expires_at
+
+
+class PendingWrites:
+    """Fronta zápisů, které event loop odložil, protože index drží výpočet ve vlákně.
+
+    Event loop na ``lock`` indexu nikdy nečeká - zápis zařadí do fronty a
+    promítne ji jen tehdy, když je zámek volný. Kdo ``lock`` drží, má před
+    čtením zavolat ``apply_pending``. Fronta má vlastní krátký zámek, který
+    se drží jen při vkládání a vybírání.
+    """
+
+    def __init__(self):
+        self._pending: List[Tuple[str, str, Optional[Dict[str, Any]]]] = []
+        self._pending_lock = threading.Lock()
+
+    def defer(self, kind: str, zakazka_id: str, data: Optional[Dict[str, Any]]):
+        with self._pending_lock:
+            self._pending.append((kind, zakazka_id, data))
+
+    def pending_exists(self, zakazka_id: str) -> Optional[bool]:
+        """Existence zakázky podle odložených zápisů; None = fronta o ní neví"""
+        with self._pending_lock:
+            for kind, pending_id, _ in reversed(self._pending):
+                if pending_id == zakazka_id:
+                    return kind != 'deleted'
+        return None
+
+    def apply_pending(self) -> int:
+        """Promítne odložené zápisy (volat s drženým ``lock``)"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        for kind, zakazka_id, data in pending:
+            if kind == 'deleted':
+                self.delete(zakazka_id)
+            else:
+                self.upsert(zakazka_id, data)
+        return len(pending)
+
+
+class OrderStore:
+    """Sloupcové kopie zakázek (``analytics.OrderColumns``) po uživatelích.
+
+    Stejně se drží i další indexy se stejným rozhraním (``upsert``, ``delete``,
+    ``nbytes``, ``lock``) - např. ``calendar_index.CalendarIndex``; limity se
+    pak čtou z proměnných prostředí s jiným prefixem.
+
+    Kopie se jednou postaví z Firestore a pak ji upravují zápisy přes
+    ``FirebaseService`` (``apply_write`` je posluchač zápisů). Celková paměť
+    je omezená globálním limitem - nejdéle nepoužité kopie se zahazují (LRU),
+    TTL pokrývá zápisy, které proběhly mimo tento proces. Stejně jako
+    ``ZakazkyCache`` se používá jen z event loopu; výpočty mimo loop drží
+    ``columns.lock`` a zápisy, které na zámek narazí, se odloží
+    (``PendingWrites``).
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        max_users: Optional[int] = None,
+        ttl: Optional[float] = None,
+        env_prefix: str = 'ORDER_STORE',
+        default_max_mb: float = 256,
+    ):
+        self.max_bytes = max_bytes or int(float(os.environ.get(f'{env_prefix}_MAX_MB', default_max_mb)) * 1024 * 1024)
+        self.max_users = max_users or int(os.environ.get(f'{env_prefix}_MAX_USERS', '1024'))
+        self.ttl = ttl if ttl is not None else float(os.environ.get(f'{env_prefix}_TTL', '900'))
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._bytes = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._builds = 0
+        self._evictions = {'lru': 0, 'ttl': 0, 'memory': 0}
+        self._invalidations = 0
+        self._patches = 0
+        self._deferred = 0
+
+    def generation(self, user_id: str) -> int:
+        """Značka před stavbou kopie - předává se do ``put``"""
+        return self._generations.get(user_id, 0)
+
+    def get(self, user_id: str):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self._misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(user_id)
+            self._evictions['ttl'] += 1
+            self._misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self._hits += 1
+        return entry.columns
+
+    def put(self, user_id: str, columns, generation: int) -> bool:
+        """Uloží postavenou kopii, pokud se mezitím nic nezapsalo a vejde se do limitu"""
+        self._builds += 1
+        if generation != self.generation(user_id) or columns.nbytes > self.max_bytes:
+            return False
+        self._remove(user_id)
+        self._entries[user_id] = _Entry(columns, columns.nbytes, time.monotonic() + self.ttl)
+        self._bytes += columns.nbytes
+        self._evict()
+        return user_id in self._entries
+
+    def invalidate(self, user_id: str):
+        self._bump(user_id)
+        if self._remove(user_id):
+            self._invalidations += 1
+
+    def apply_write(self, user_id: str, kind: str, zakazka_id: Optional[str], data: Optional[Dict[str, Any]]):
+        """Promítne zápis zakázky do kopie; změny uživatelského dokumentu ji nemění"""
+        if kind == 'user':
+            return
+        self._bump(user_id)
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        columns = entry.columns
+        exists = columns.pending_exists(zakazka_id) if zakazka_id is not None else None
+        if exists is None:
+            exists = zakazka_id in columns
+        if zakazka_id is None or (kind == 'updated' and not exists):
+            self.invalidate(user_id)
+            return
+        if kind not in ('created', 'updated', 'deleted') or (kind != 'deleted' and data is None):
+            self.invalidate(user_id)
+            return
+        columns.defer(kind, zakazka_id, data)
+        self._patches += 1
+        # Na zámek držený výpočtem ve vlákně se nečeká - zápis promítne čtenář
+        if not columns.lock.acquire(blocking=False):
+            self._deferred += 1
+            return
+        try:
+            columns.apply_pending()
+        finally:
+            columns.lock.release()
+        self._bytes += columns.nbytes - entry.size
+        entry.size = columns.nbytes
+        self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "orders": sum(len(entry.columns) for entry in self._entries.values()),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "max_users": self.max_users,
+            "ttl_s": self.ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": round(self._hits / lookups, 3) if lookups else 0.0,
+            "builds": self._builds,
+            "evictions": dict(self._evictions),
+            "invalidations": self._invalidations,
+            "patches": self._patches,
+            "deferred": self._deferred,
+        }
+
+    def _bump(self, user_id: str):
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def _remove(self, user_id: str) -> bool:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return False
+        self._bytes -= entry.size
+        return True
+
+    def _evict(self):
+        while len(self._entries) > self.max_users:
+            self._remove(next(iter(self._entries)))
+            self._evictions['lru'] += 1
+        while self._bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self._evictions['memory'] += 1
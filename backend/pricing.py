@@ -0,0 +1,174 @@
+import bisect
+import math
+from datetime import date
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from datum_utils import epoch_day, parse_datum
+
+
+class PricingVersion(NamedTuple):
+    """Sazba fee platná pro zakázky s datem od ``valid_from``"""
+    version: int
+    valid_from: date
+    fee_rate: float
+
+
+# Historie sazeb - změna = nová verze na konci (starší zakázky si ponechají
+# svou sazbu), pak ``python manage.py reprice --all``. Zakázky z doby před
+# ceníkem (bez ``pricing_version``) mají fee zadané ručně za různé sazby -
+# hromadný přepočet je nemění (viz ``is_legacy``).
+PRICING_VERSIONS = (
+    PricingVersion(1, date(2000, 1, 1), 0.261),
+)
+
+# Zakázka s fee (formulář "Fee: Ano/Ne")
+HAS_FEE_FIELD = 'hasFee'
+
+# Verze ceníku, podle které jsou spočítané ``fee`` a ``zisk``
+PRICING_VERSION_FIELD = 'pricing_version'
+
+COST_FIELDS = ('material', 'pomocnik', 'palivo')
+
+# Pole, jejichž změna znamená nový výpočet fee a zisku (fee/zisk od klienta se přepočítají)
+PRICING_INPUT_FIELDS = ('castka', 'datum', 'fee', 'zisk', HAS_FEE_FIELD) + COST_FIELDS
+
+# Pole, která výpočet zapisuje
+PRICING_FIELDS = ('fee', 'zisk', HAS_FEE_FIELD, PRICING_VERSION_FIELD)
+
+# Epoch-day pro zakázky bez rozpoznatelného data ve vektorovém výpočtu
+UNKNOWN_DAY = np.iinfo(np.int64).max
+
+_VALID_FROM_DAYS = [epoch_day(version.valid_from) for version in PRICING_VERSIONS]
+
+
+def current_version() -> PricingVersion:
+    return PRICING_VERSIONS[-1]
+
+
+def version_for(day: Optional[int]) -> PricingVersion:
+    """Verze ceníku pro zakázku z daného epoch-day (bez data = aktuální)"""
+    if day is None:
+        return current_version()
+    position = bisect.bisect_right(_VALID_FROM_DAYS, day) - 1
+    return PRICING_VERSIONS[max(position, 0)]
+
+
+def _number(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else 0.0
+
+
+def _round(value: float) -> float:
+    # Stejně jako Math.round na frontendu (polovina nahoru, ne bankéřské zaokrouhlení)
+    return float(math.floor(value + 0.5))
+
+
+def has_fee(zakazka: Dict[str, Any]) -> bool:
+    """Explicitní ``hasFee``, u starších zakázek podle nenulového fee"""
+    flag = zakazka.get(HAS_FEE_FIELD)
+    if isinstance(flag, bool):
+        return flag
+    return _number(zakazka.get('fee')) > 0
+
+
+def touches_pricing(fields: Iterable[str]) -> bool:
+    """Mění úprava těchto polí fee nebo zisk?"""
+    return any(field in PRICING_INPUT_FIELDS for field in fields)
+
+
+def price(zakazka: Dict[str, Any]) -> Dict[str, Any]:
+    """Fee a zisk zakázky podle ceníku platného k jejímu datu.
+
+    fee = round(castka * sazba) pro zakázky s fee, jinak 0;
+    zisk = castka - fee - material - pomocnik - palivo.
+    """
+    datum = parse_datum(zakazka.get('datum'))
+    version = version_for(epoch_day(datum) if datum else None)
+    castka = _number(zakazka.get('castka'))
+    applies = has_fee(zakazka)
+    fee = _round(castka * version.fee_rate) if applies and castka > 0 else 0.0
+    zisk = castka - fee - sum(_number(zakazka.get(field)) for field in COST_FIELDS)
+    return {'fee': fee, 'zisk': zisk, HAS_FEE_FIELD: applies, PRICING_VERSION_FIELD: version.version}
+
+
+def reprice(old: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Přepočet při úpravě - ``changes`` jsou jen měněná pole.
+
+    Poslané ``fee`` bez ``hasFee`` se bere jako volba Ano/Ne (nenulové = s fee).
+    """
+    merged = dict(old, **changes)
+    if 'fee' in changes and HAS_FEE_FIELD not in changes:
+        merged[HAS_FEE_FIELD] = _number(changes['fee']) > 0
+    return price(merged)
+
+
+def price_columns(
+    castka: np.ndarray,
+    costs: np.ndarray,
+    applies: np.ndarray,
+    days: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """Vektorový ``price`` pro celé sloupce (hromadný přepočet).
+
+    ``costs`` je součet material + pomocnik + palivo, ``days`` epoch-day
+    data zakázky (``UNKNOWN_DAY`` = bez data, použije se aktuální verze).
+    """
+    valid_from = np.asarray(_VALID_FROM_DAYS, dtype=np.int64)
+    rates = np.asarray([version.fee_rate for version in PRICING_VERSIONS])
+    numbers = np.asarray([version.version for version in PRICING_VERSIONS], dtype=np.int64)
+    index = np.maximum(np.searchsorted(valid_from, days, side='right') - 1, 0)
+    fee = np.where(applies & (castka > 0), np.floor(castka * rates[index] + 0.5), 0.0)
+    return {'fee': fee, 'zisk': castka - fee - costs, PRICING_VERSION_FIELD: numbers[index]}
+
+
+def is_legacy(zakazka: Dict[str, Any]) -> bool:
+    """Zakázka s fee zadaným ručně před zavedením ceníku (bez ``pricing_version``)"""
+    version = zakazka.get(PRICING_VERSION_FIELD)
+    return not isinstance(version, int) or isinstance(version, bool)
+
+
+def _column(orders: List[Dict[str, Any]], field: str, missing: float) -> np.ndarray:
+    return np.fromiter(
+        (value if isinstance(value, (int, float)) and not isinstance(value, bool) else missing
+         for value in (zakazka.get(field) for zakazka in orders)),
+        dtype=np.float64, count=len(orders),
+    )
+
+
+def stale_prices(orders: List[Dict[str, Any]], include_legacy: bool = False) -> List[Tuple[int, Dict[str, Any]]]:
+    """Zakázky, jejichž uložené fee/zisk/verze neodpovídají ceníku - (pozice, nové hodnoty).
+
+    Výpočet běží nad sloupci celé stránky najednou (``price_columns``), do
+    Pythonu se převádějí jen změněné řádky. Zakázky bez verze ceníku
+    (``is_legacy``) se přeskakují - jejich historické fee by se přepsalo
+    aktuální sazbou; ``include_legacy`` je přepočítá také.
+    """
+    if not orders:
+        return []
+    castka = _column(orders, 'castka', 0.0)
+    costs = sum(_column(orders, field, 0.0) for field in COST_FIELDS)
+    applies = np.fromiter((has_fee(zakazka) for zakazka in orders), dtype=bool, count=len(orders))
+    days = np.fromiter(
+        (epoch_day(datum) if datum else UNKNOWN_DAY for datum in (parse_datum(zakazka.get('datum')) for zakazka in orders)),
+        dtype=np.int64, count=len(orders),
+    )
+    priced = price_columns(castka, costs, applies, days)
+    # Chybějící nebo nečíselné uložené hodnoty (NaN) se vždy liší
+    stale = (
+        (_column(orders, 'fee', np.nan) != priced['fee'])
+        | (_column(orders, 'zisk', np.nan) != priced['zisk'])
+        | (_column(orders, PRICING_VERSION_FIELD, np.nan) != priced[PRICING_VERSION_FIELD])
+        | ~np.fromiter((isinstance(zakazka.get(HAS_FEE_FIELD), bool) for zakazka in orders), dtype=bool, count=len(orders))
+    )
+    if not include_legacy:
+        stale &= ~np.fromiter((is_legacy(zakazka) for zakazka in orders), dtype=bool, count=len(orders))
+    return [
+        (int(position), {
+            'fee': float(priced['fee'][position]),
+            'zisk': float(priced['zisk'][position]),
+            HAS_FEE_FIELD: bool(applies[position]),
+            PRICING_VERSION_FIELD: int(priced[PRICING_VERSION_FIELD][position]),
+        })
+        for position in np.flatnonzero(stale)
+    ]
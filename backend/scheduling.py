@@ -0,0 +1,169 @@
+import os
+from datetime import date
+from itertools import islice
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from datum_utils import epoch_day, from_epoch_day
+
+# Kolik lidí může v jednom dni pracovat na zakázkách (Dušan + pomocník)
+DEFAULT_CREW_SIZE = int(os.environ.get('SCHEDULING_CREW_SIZE', '2'))
+
+# Pole, jejichž změna může změnit rozvrh (interval nebo počet lidí)
+SCHEDULE_FIELDS = ('datum', 'doba_realizace', 'endDate', 'pomocnik')
+
+# Nejvíce vypsaných dvojic překrývajících se zakázek (celkový počet se počítá vždy)
+MAX_OVERLAPS = 1000
+
+
+class Job(NamedTuple):
+    """Zakázka v rozvrhu: ``[start, end)`` v epoch-day + počet lidí"""
+    start: int
+    end: int
+    zakazka_id: str
+    crew: int
+
+
+def crew_size(zakazka: Dict[str, Any]) -> int:
+    """Zakázka s placeným pomocníkem potřebuje dva lidi, jinak jednoho"""
+    pomocnik = zakazka.get('pomocnik')
+    if isinstance(pomocnik, (int, float)) and not isinstance(pomocnik, bool) and pomocnik > 0:
+        return 2
+    return 1
+
+
+def jobs_from_spans(spans: Iterable[Tuple[Tuple[int, int], Dict[str, Any]]]) -> List[Job]:
+    """Převede výstup ``CalendarIndex.spans`` na úlohy rozvrhu"""
+    return [Job(span[0], span[1], zakazka['id'], crew_size(zakazka)) for span, zakazka in spans]
+
+
+def sweep(
+    jobs: List[Job],
+    capacity: int = DEFAULT_CREW_SIZE,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    max_overlaps: Optional[int] = MAX_OVERLAPS,
+) -> Dict[str, Any]:
+    """Překryvy zakázek a dny s překročenou kapacitou jedním průchodem (sweep-line).
+
+    Začátky a konce se seřadí (O(n log n)); při každém začátku se nová
+    zakázka spáruje se všemi právě běžícími - dohromady O((n + k) log n) pro
+    k překryvů. Mezi dvěma událostmi je obsazenost konstantní, takže
+    přetížení se hlásí po souvislých úsecích. ``date_from``/``date_to``
+    (včetně) omezí výstup na překryvy a přetížení zasahující do okna.
+    """
+    first = epoch_day(date_from) if date_from else None
+    end = epoch_day(date_to) + 1 if date_to else None
+
+    events: List[Tuple[int, int, int]] = []
+    for index, job in enumerate(jobs):
+        # Konec (0) se zpracuje před začátkem (1) ve stejný den - intervaly jsou polootevřené
+        events.append((job.start, 1, index))
+        events.append((job.end, 0, index))
+    events.sort()
+
+    active: Dict[int, Job] = {}
+    load = 0
+    overlaps: List[Dict[str, Any]] = []
+    overlaps_total = 0
+    overruns: List[Dict[str, Any]] = []
+    position = 0
+    while position < len(events):
+        day = events[position][0]
+        while position < len(events) and events[position][0] == day:
+            _, kind, index = events[position]
+            position += 1
+            job = jobs[index]
+            if kind == 0:
+                del active[index]
+                load -= job.crew
+                continue
+            # Překryv začíná začátkem nové zakázky; od začátku okna končí všechny
+            # běžící zakázky až za ním, takže se dají jen sečíst
+            if end is not None and job.start >= end:
+                others = []
+            elif first is None or job.start >= first:
+                overlaps_total += len(active)
+                room = len(active) if max_overlaps is None else max(0, max_overlaps - len(overlaps))
+                others = islice(active.values(), room)
+            else:
+                others = [other for other in active.values() if min(job.end, other.end) > first]
+                overlaps_total += len(others)
+                if max_overlaps is not None:
+                    others = others[:max(0, max_overlaps - len(overlaps))]
+            for other in others:
+                overlaps.append({
+                    "zakazky": [other.zakazka_id, job.zakazka_id],
+                    "from": from_epoch_day(job.start).isoformat(),
+                    "to": from_epoch_day(min(job.end, other.end) - 1).isoformat(),
+                })
+            active[index] = job
+            load += job.crew
+
+        next_day = events[position][0] if position < len(events) else day
+        segment_start = day if first is None else max(day, first)
+        segment_end = next_day if end is None else min(next_day, end)
+        if load > capacity and segment_end > segment_start:
+            ids = sorted(job.zakazka_id for job in active.values())
+            last = overruns[-1] if overruns else None
+            if last and last["_end"] == segment_start and last["load"] == load and last["zakazky"] == ids:
+                last["_end"] = segment_end
+            else:
+                overruns.append({"_start": segment_start, "_end": segment_end, "load": load, "zakazky": ids})
+
+    return {
+        "jobs": len(jobs),
+        "capacity": capacity,
+        "overlaps": overlaps,
+        "overlaps_total": overlaps_total,
+        "truncated": overlaps_total > len(overlaps),
+        "overruns": [
+            {
+                "from": from_epoch_day(overrun.pop("_start")).isoformat(),
+                "to": from_epoch_day(overrun.pop("_end") - 1).isoformat(),
+                **overrun,
+            }
+            for overrun in overruns
+        ],
+    }
+
+
+def order_warnings(
+    spans: List[Tuple[Tuple[int, int], Dict[str, Any]]], zakazka_id: str, capacity: int = DEFAULT_CREW_SIZE
+) -> List[Dict[str, Any]]:
+    """Varování pro jednu zakázku: s čím se překrývá a kdy překračuje kapacitu.
+
+    ``spans`` stačí zakázky zasahující do intervalu kontrolované zakázky
+    (``CalendarIndex.spans``).
+    """
+    jobs = jobs_from_spans(spans)
+    target = next((job for job in jobs if job.zakazka_id == zakazka_id), None)
+    if target is None:
+        return []
+
+    warnings = []
+    for (start, end), zakazka in spans:
+        overlap_start, overlap_end = max(start, target.start), min(end, target.end)
+        if zakazka['id'] == zakazka_id or overlap_start >= overlap_end:
+            continue
+        overlap_from, overlap_to = from_epoch_day(overlap_start).isoformat(), from_epoch_day(overlap_end - 1).isoformat()
+        warnings.append({
+            "type": "overlap",
+            "zakazka_id": zakazka['id'],
+            "from": overlap_from,
+            "to": overlap_to,
+            "message": f"Překrývá se se zakázkou {zakazka.get('klient') or zakazka['id']} ({overlap_from} - {overlap_to})",
+        })
+    # Přetížení stačí ve dnech kontrolované zakázky; páry překryvů už jsou spočítané výše
+    report = sweep(jobs, capacity, from_epoch_day(target.start), from_epoch_day(target.end - 1), max_overlaps=0)
+    for overrun in report["overruns"]:
+        if zakazka_id not in overrun["zakazky"]:
+            continue
+        warnings.append({
+            "type": "capacity",
+            "from": overrun["from"],
+            "to": overrun["to"],
+            "load": overrun["load"],
+            "capacity": capacity,
+            "message": f"Překročena kapacita {overrun['load']}/{capacity} lidí ({overrun['from']} - {overrun['to']})",
+        })
+    return warnings
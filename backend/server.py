@@ -1,31 +1,67 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-import os
+from contextlib import asynccontextmanager
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Dict, Any, Optional, Tuple
 import uuid
-from datetime import datetime
+import json
+import asyncio
+from datetime import datetime, timezone
 import sys
-import os
-from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
 
 # Add current directory to Python path
-sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(ROOT_DIR))
 
 from firebase_service import get_firebase_service
+from aggregation_service import DEFAULT_SUM_FIELDS, AggregationService, parse_aggregate_fields
+import analytics
+import pricing
+import scheduling
+from fingerprints import DUPLICATE_MODES, DUPLICATES_FLAG, DUPLICATES_REJECT
+from idempotency import IDEMPOTENCY_HEADER, REPLAYED_HEADER, IdempotencyError, create_idempotency_keys, request_hash
+from zakazky_query import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, QueryError, ZakazkyFilter, decode_changes_cursor, parse_cursor_args, parse_date_param,
+    parse_fields, parse_watermark, project,
+)
+from zakazky_stats import GRANULARITIES, periods
+from zakazky_import import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, ImportFormatError, detect_format, open_import, spool_upload
+import zakazky_export
 
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
-# Firebase service (s fallback na Supabase)
+# Firebase service (s fallback na Supabase) - Firebase se inicializuje až v lifespanu
 firebase_service = get_firebase_service()
+aggregation_service = AggregationService(firebase_service)
+idempotency_keys = create_idempotency_keys(firebase_service)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Inicializace Firebase a warmup klienta běží na pozadí - server přijímá
+    # požadavky hned, stav hlásí /api/ready
+    firebase_service.start()
+    logger.info("🔥 Hybrid server spuštěn (Supabase + Firebase)")
+    logger.info("✅ Dušan - Správa zakázek API připraveno")
+    yield
+    await firebase_service.close()
+    logger.info("🔥 Hybrid server zastaven")
+
 
 # Create the main app without a prefix
-app = FastAPI(title="Dušan - Správa zakázek", version="1.0.0")
+app = FastAPI(title="Dušan - Správa zakázek", version="1.0.0", lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -46,13 +82,15 @@ class ZakazkaCreate(BaseModel):
     klient: str
     idZakazky: str
     castka: float
-    fee: float
     feeOff: float
     palivo: float
     material: float
     pomocnik: float
-    zisk: float
     adresa: str
+    fee: float = 0  # fee a zisk počítá server podle ceníku (pricing.py), nenulové fee = zakázka s fee
+    zisk: float = 0
+    hasFee: Optional[bool] = None  # explicitní volba Ano/Ne místo odvození z fee
+    typ: Optional[str] = ""  # typ objektu (byt, dům, pension, obchod, ...)
     telefon: Optional[str] = ""  # NEW - telefon field
     doba_realizace: Optional[int] = None  # NEW - doba realizace field (počet dní)
     poznamky: Optional[str] = None  # NEW - poznámky field
@@ -70,12 +108,17 @@ class ZakazkaUpdate(BaseModel):
     material: Optional[float] = None
     pomocnik: Optional[float] = None
     zisk: Optional[float] = None
+    hasFee: Optional[bool] = None
     adresa: Optional[str] = None
+    typ: Optional[str] = None
     telefon: Optional[str] = None  # NEW - telefon field
     doba_realizace: Optional[int] = None  # NEW - doba realizace field
     poznamky: Optional[str] = None  # NEW - poznámky field
     soubory: Optional[List[str]] = None
 
+class ZakazkaBatchUpdate(ZakazkaUpdate):
+    id: str
+
 class UserData(BaseModel):
     userId: str
     zakazky: List[Dict[str, Any]]
@@ -96,28 +139,703 @@ async def create_status_check(input: StatusCheckCreate):
 async def get_status_checks():
     return {"message": "Status checks - Hybrid API (Supabase + Firebase)", "timestamp": datetime.utcnow()}
 
+@api_router.get("/ready")
+async def get_readiness():
+    """Readiness - 200 po dokončení inicializace Firebase (nebo přechodu do fallback režimu)"""
+    readiness = firebase_service.readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Provozní metriky backendu (Firestore executor, cache zakázek, SSE)"""
+    return {
+        "firestore_executor": firebase_service.executor.stats(),
+        "zakazky_cache": firebase_service.cache.stats(),
+        "order_store": firebase_service.orders.stats(),
+        "calendar_index": firebase_service.calendars.stats(),
+        "data_versions": firebase_service.versions.stats(),
+        "zakazky_events": firebase_service.events.stats(),
+        "aggregations": aggregation_service.stats(),
+        "idempotency": idempotency_keys.stats(),
+        "startup": firebase_service.readiness(),
+        "timestamp": datetime.utcnow(),
+    }
+
 # Hybrid API endpointy - Firebase s fallback na Supabase frontend
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def ndjson_lines(items):
+    """Převede asynchronní proud dokumentů na řádky NDJSON"""
+    try:
+        async for item in items:
+            yield json.dumps(jsonable_encoder(item), ensure_ascii=False) + "\n"
+    except Exception as e:
+        # Hlavičky už odešly - chybu oznámíme posledním řádkem
+        logger.error(f"❌ Chyba při streamování: {e}")
+        yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+
+
+async def request_etag(request: Request, user_id: str, scope: str) -> Optional[str]:
+    """ETag odpovědi: verze dat uživatele + varianta (cesta, parametry, Accept).
+
+    Verze je ``data_version`` z Firestore (jedno čtení pole), takže ETag
+    platí napříč procesy. V režimu fallback (data spravuje Supabase) ani při
+    chybě čtení verze se ETag neposílá.
+    """
+    version = await firebase_service.data_version(user_id)
+    if version is None:
+        return None
+    variant = "|".join([
+        scope,
+        request.headers.get("accept", ""),
+        str(sorted(request.query_params.multi_items())),
+    ])
+    return firebase_service.versions.etag(user_id, version, variant)
+
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    if not etag:
+        return False
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
 @api_router.get("/users/{user_id}/zakazky")
-async def get_user_zakazky(user_id: str):
-    """Získání všech zakázek uživatele - Firebase s fallback na Supabase"""
+async def get_user_zakazky(
+    request: Request,
+    response: Response,
+    user_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    order_by: Optional[str] = None,
+    fields: Optional[str] = None,
+    druh: Optional[str] = None,
+    klient: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+):
+    """Získání zakázek uživatele - Firebase s fallback na Supabase
+
+    Bez parametrů vrací všechny zakázky. S ``limit``/``cursor``/``order_by``
+    vrací jednu stránku a ``next_cursor`` pro načtení další. S hlavičkou
+    ``Accept: application/x-ndjson`` streamuje celou historii po dokumentech
+    (``order_by`` a ``cursor`` platí, ``limit`` se ignoruje).
+    ``fields=datum,druh,castka`` vrátí jen vybraná pole (+ id).
+    Filtry ``druh``, ``klient`` (přesná shoda) a ``date_from``/``date_to``
+    (ISO nebo "11. 4. 2025", včetně hranic) platí ve všech režimech.
+
+    JSON odpovědi nesou ETag; shodný ``If-None-Match`` vrátí 304 jen po
+    přečtení verze dat (jedno pole uživatelského dokumentu).
+    """
     try:
-        zakazky = await firebase_service.get_user_zakazky(user_id)
-        return {"zakazky": zakazky, "source": "firebase" if zakazky else "supabase_frontend"}
+        # Validace parametrů ještě před odesláním hlaviček
+        selected_fields = parse_fields(fields)
+        filters = ZakazkyFilter.from_params(druh, klient, date_from, date_to)
+        parse_cursor_args(order_by, cursor, filters)
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if filters.is_empty:
+        filters = None
+
+    if wants_ndjson(request):
+        # Stream může selhat až po odeslání hlaviček - ETag se nenastavuje
+        items = firebase_service.stream_user_zakazky(
+            user_id, order_by=order_by, cursor=cursor, fields=selected_fields, filters=filters
+        )
+        return StreamingResponse(ndjson_lines(items), media_type=NDJSON_MEDIA_TYPE)
+
+    # Verze se bere před čtením - souběžný zápis ETag jen zneplatní
+    etag = await request_etag(request, user_id, "zakazky")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    if limit is None and cursor is None and order_by is None:
+        try:
+            zakazky = await firebase_service.get_user_zakazky(user_id, fields=selected_fields, filters=filters)
+            # Prázdný výsledek může znamenat i chybu čtení - ten se necachuje
+            if etag and zakazky:
+                response.headers["ETag"] = etag
+            return {"zakazky": zakazky, "source": "firebase" if zakazky else "supabase_frontend"}
+        except Exception as e:
+            return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
+
+    try:
+        zakazky, next_cursor = await firebase_service.get_user_zakazky_page(
+            user_id, limit or DEFAULT_PAGE_SIZE, cursor=cursor, order_by=order_by,
+            fields=selected_fields, filters=filters,
+        )
+        if etag and zakazky:
+            response.headers["ETag"] = etag
+        return {
+            "zakazky": zakazky,
+            "next_cursor": next_cursor,
+            "source": "firebase" if zakazky else "supabase_frontend",
+        }
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
 
-@api_router.post("/users/{user_id}/zakazky")
-async def create_zakazka(user_id: str, zakazka: ZakazkaCreate):
-    """Vytvoření nové zakázky - Firebase s fallback na Supabase"""
+@api_router.get("/users/{user_id}/zakazky:aggregate")
+async def aggregate_zakazky(
+    user_id: str,
+    sums: Optional[str] = Query(None, alias="sum", description="Pole k sečtení, např. castka,zisk (výchozí castka,zisk)"),
+    avgs: Optional[str] = Query(None, alias="avg", description="Pole k zprůměrování"),
+    druh: Optional[str] = Query(None),
+    klient: Optional[str] = Query(None),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+):
+    """Počet, součty a průměry zakázek se stejnými filtry jako výpis - bez přenosu dokumentů.
+
+    Filtry ``druh``/``klient`` počítá přímo Firestore (agregační dotaz),
+    rozsah data se zatím vyhodnocuje stránkovaným průchodem.
+    """
+    try:
+        sum_fields = parse_aggregate_fields("sum", sums) if sums is not None else list(DEFAULT_SUM_FIELDS)
+        avg_fields = parse_aggregate_fields("avg", avgs)
+        filters = ZakazkyFilter.from_params(druh, klient, date_from, date_to)
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
-        zakazka_id = await firebase_service.add_zakazka(user_id, zakazka.dict())
-        if zakazka_id:
-            return {"message": "Zakázka úspěšně vytvořena", "zakazka_id": zakazka_id, "source": "firebase"}
+        result = await aggregation_service.aggregate(
+            user_id, None if filters.is_empty else filters, sum_fields, avg_fields
+        )
+        if result is not None:
+            return {"data": result, "source": "firebase"}
         else:
             return {"message": "Fallback na Supabase frontend", "source": "supabase_frontend"}
     except Exception as e:
         return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
 
+@api_router.get("/users/{user_id}/analytics")
+async def get_analytics(
+    request: Request,
+    response: Response,
+    user_id: str,
+    group_by: Optional[str] = Query(None, description="Dimenze: druh, klient, typ, month, year, district"),
+    metrics: Optional[str] = Query(None, description="Např. count,sum:zisk,avg:castka (výchozí count,sum:castka,sum:zisk)"),
+    sort: Optional[str] = Query(None, description="Metrika nebo dimenze, '-' = sestupně (výchozí první metrika sestupně)"),
+    limit: Optional[int] = Query(None, ge=1, description="Top-N skupin"),
+    druh: Optional[str] = Query(None),
+    klient: Optional[str] = Query(None),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+    include_calendar: bool = Query(False, description="Započítat i kalendářové zakázky (CAL-)"),
+):
+    """Seskupení a pivot zakázek (např. zisk podle druhu, tržby podle klienta a měsíce).
+
+    Počítá se vektorově nad sloupcovou (NumPy) kopií zakázek uživatele,
+    kterou drží ``OrderStore`` a průběžně upravují zápisy.
+    """
+    try:
+        keys = analytics.parse_group_by(group_by)
+        selected_metrics = analytics.parse_metrics(metrics)
+        sort_by = analytics.parse_sort(sort, keys, selected_metrics)
+        filters = ZakazkyFilter.from_params(druh, klient, date_from, date_to)
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    etag = await request_etag(request, user_id, "analytics")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    try:
+        columns = await firebase_service.get_order_columns(user_id)
+        if columns is None:
+            return {"message": "Fallback na Supabase frontend", "source": "supabase_frontend"}
+
+        def _compute():
+            with columns.lock:
+                columns.apply_pending()
+                mask = columns.mask(None if filters.is_empty else filters, include_calendar)
+                return analytics.group_by(columns, keys, selected_metrics, mask, sort_by, limit)
+
+        # Výpočet nad celou historií nesmí blokovat event loop
+        result = await asyncio.to_thread(_compute)
+        if etag:
+            response.headers["ETag"] = etag
+        return {"data": result, "source": "firebase"}
+    except Exception as e:
+        return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
+
+@api_router.get("/users/{user_id}/zakazky/changes")
+async def get_zakazky_changes(
+    user_id: str,
+    since: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """Delta synchronizace - zakázky změněné a smazané od watermarku ``since``.
+
+    Bez ``since`` vrátí všechny zakázky a watermark pro další volání.
+    Výsledek zahrnuje i okno před watermarkem (``ZAKAZKY_SYNC_OVERLAP_S``) -
+    klient zakázky slučuje podle ``id``. Při ``has_more`` volá hned znovu se
+    stejným ``since`` a vráceným ``cursor``; po poslední dávce si uloží
+    ``watermark``.
+    """
+    try:
+        watermark = parse_watermark(since) if since else None
+        if cursor:
+            if watermark is None:
+                raise QueryError("Parametr cursor vyžaduje since")
+            decode_changes_cursor(cursor)
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if watermark is None:
+            zakazky = await firebase_service.get_user_zakazky(user_id)
+            stamps = [z["updated_at"] for z in zakazky if isinstance(z.get("updated_at"), datetime)]
+            result = {
+                "changes": zakazky,
+                "deleted": [],
+                "watermark": max(stamps) if stamps else datetime.fromtimestamp(0, timezone.utc),
+                "has_more": False,
+                "cursor": None,
+            }
+        else:
+            result = await firebase_service.get_zakazky_changes(user_id, watermark, limit, cursor)
+        result["watermark"] = result["watermark"].isoformat()
+        return {**result, "source": "firebase" if firebase_service.db else "supabase_frontend"}
+    except Exception as e:
+        return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
+
+# Interval SSE komentáře, který udržuje spojení přes proxy
+SSE_HEARTBEAT_SECONDS = 15
+
+
+def sse_message(event: Dict[str, Any]) -> str:
+    lines = [f"event: {event['type']}"]
+    updated_at = (event.get("data") or {}).get("updated_at")
+    if isinstance(updated_at, datetime):
+        # Klient může po výpadku navázat přes /zakazky/changes?since=<id>
+        lines.append(f"id: {updated_at.isoformat()}")
+    lines.append("data: " + json.dumps(jsonable_encoder(event), ensure_ascii=False))
+    return "\n".join(lines) + "\n\n"
+
+
+@api_router.get("/users/{user_id}/zakazky/events")
+async def zakazky_events(request: Request, user_id: str, fields: Optional[str] = None):
+    """Živé změny zakázek jako Server-Sent Events (created/updated/deleted/resync).
+
+    ``fields`` zúží data v událostech stejně jako u výpisu. Událost
+    ``resync`` znamená, že klient nestíhal a má se dorovnat přes
+    ``/zakazky/changes``.
+    """
+    try:
+        selected_fields = parse_fields(fields)
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def stream():
+        async with firebase_service.events.subscribe(user_id) as subscription:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if selected_fields is not None and event.get("data") is not None:
+                    event = dict(event, data=project(dict(event["data"], id=event["id"]), selected_fields))
+                yield sse_message(event)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def schedule_warnings(user_id: str, zakazka_id: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """Překryvy a přetížení kapacity po zápisu zakázky - chyba kontroly zápis neovlivní.
+
+    Vrací (varování, zda kontrola proběhla). Se studeným indexem kalendáře a
+    bez ``ZAKAZKY_DATE_PUSHDOWN`` se kontrola vynechá - prázdná varování pak
+    neznamenají, že zakázka nekoliduje (``schedule_checked: false``).
+    """
+    try:
+        spans = await firebase_service.get_schedule_spans(user_id, zakazka_id)
+        if spans is None:
+            return [], False
+        return scheduling.order_warnings(spans, zakazka_id), True
+    except Exception as e:
+        logger.warning(f"Kontrola rozvrhu selhala: {e}")
+        return [], False
+
+IDEMPOTENCY_KEY_DESCRIPTION = "Klíč opakovaného pokusu - stejný klíč vrátí původní odpověď bez dalšího zápisu"
+
+
+async def idempotent(request: Request, user_id: str, key: Optional[str], handler):
+    """Provede zápis ``handler()`` nejvýše jednou pro daný ``Idempotency-Key``.
+
+    Ukládá se jen odpověď zápisu do Firebase a chyby klienta (4xx) - fallback
+    odpovědi a výjimky klíč uvolní, další pokus se provede znovu.
+    """
+    if key is None:
+        return await handler()
+    fingerprint = request_hash(request.method, request.url.path, request.url.query, await request.body())
+    try:
+        replay = await idempotency_keys.begin(user_id, key, fingerprint)
+    except IdempotencyError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if replay is not None:
+        status_code, body = replay
+        return JSONResponse(body, status_code=status_code, headers={REPLAYED_HEADER: "true"})
+
+    try:
+        async with idempotency_keys.hold(user_id, key, fingerprint):
+            result = await handler()
+    except HTTPException as e:
+        if e.status_code < 500:
+            await idempotency_keys.finish(user_id, key, fingerprint, e.status_code, jsonable_encoder({"detail": e.detail}))
+        else:
+            await idempotency_keys.abort(user_id, key)
+        raise
+    except BaseException:
+        await idempotency_keys.abort(user_id, key)
+        raise
+    if isinstance(result, dict) and result.get("source") == "firebase":
+        await idempotency_keys.finish(user_id, key, fingerprint, 200, jsonable_encoder(result))
+    else:
+        await idempotency_keys.abort(user_id, key)
+    return result
+
+
+@api_router.post("/users/{user_id}/zakazky")
+async def create_zakazka(
+    request: Request,
+    user_id: str,
+    zakazka: ZakazkaCreate,
+    duplicates: str = Query(DUPLICATES_FLAG, description="Pravděpodobná duplicita: flag = založit a označit, reject = odmítnout (409)"),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, description=IDEMPOTENCY_KEY_DESCRIPTION),
+):
+    """Vytvoření nové zakázky - Firebase s fallback na Supabase"""
+    return await idempotent(request, user_id, idempotency_key, lambda: _create_zakazka(user_id, zakazka, duplicates))
+
+
+async def _create_zakazka(user_id: str, zakazka: ZakazkaCreate, duplicates: str):
+    if duplicates not in DUPLICATE_MODES:
+        raise HTTPException(status_code=400, detail=f"Neplatný parametr duplicates: {duplicates} (povoleno: {', '.join(DUPLICATE_MODES)})")
+    try:
+        result = await firebase_service.add_zakazka_checked(user_id, zakazka.dict(), duplicates)
+    except Exception as e:
+        return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
+    if not result:
+        return {"message": "Fallback na Supabase frontend", "source": "supabase_frontend"}
+    if result["status"] == "duplicate":
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Stejná zakázka už existuje", "duplicate_of": result["duplicate_of"]},
+        )
+    zakazka_id = result["zakazka_id"]
+    warnings, schedule_checked = await schedule_warnings(user_id, zakazka_id)
+    return {
+        "message": "Zakázka úspěšně vytvořena",
+        "zakazka_id": zakazka_id,
+        "duplicate_of": result["duplicate_of"],
+        "warnings": warnings,
+        "schedule_checked": schedule_checked,
+        "source": "firebase",
+    }
+
+# Horní mez počtu položek v jednom hromadném požadavku
+MAX_BATCH_ITEMS = 5000
+
+# Nejvíce období v jedné časové řadě (10 let po dnech)
+MAX_TIMESERIES_POINTS = 3660
+
+# Nejdelší okno kalendáře (roční přehled)
+MAX_CALENDAR_DAYS = 366
+
+
+def validate_batch_items(items: List[Any], model) -> Tuple[List[Dict[str, Any]], List[Optional[BaseModel]]]:
+    """Zvaliduje položky hromadného požadavku v jednom průchodu.
+
+    Vrací (výsledky, data) - pro nevalidní položku je výsledek vyplněn
+    chybami a data jsou None; pro validní naopak.
+    """
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Maximálně {MAX_BATCH_ITEMS} položek v jednom požadavku")
+    results, valid = [], []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise TypeError("Položka musí být JSON objekt")
+            valid.append(model(**item))
+            results.append({"index": index})
+        except (ValidationError, TypeError) as e:
+            errors = e.errors(include_url=False) if isinstance(e, ValidationError) else [{"msg": str(e)}]
+            results.append({"index": index, "status": "invalid", "errors": jsonable_encoder(errors)})
+            valid.append(None)
+    return results, valid
+
+
+@api_router.post("/users/{user_id}/zakazky:batchCreate")
+async def batch_create_zakazky(
+    request: Request,
+    user_id: str,
+    zakazky: List[Any],
+    duplicates: str = Query(DUPLICATES_FLAG, description="flag = založit a označit, reject = duplicitní položky přeskočit"),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, description=IDEMPOTENCY_KEY_DESCRIPTION),
+):
+    """Hromadné vytvoření zakázek - validace v jednom průchodu, zápis po 500 v jednom commitu"""
+    return await idempotent(request, user_id, idempotency_key, lambda: _batch_create_zakazky(user_id, zakazky, duplicates))
+
+
+async def _batch_create_zakazky(user_id: str, zakazky: List[Any], duplicates: str):
+    if duplicates not in DUPLICATE_MODES:
+        raise HTTPException(status_code=400, detail=f"Neplatný parametr duplicates: {duplicates} (povoleno: {', '.join(DUPLICATE_MODES)})")
+    results, valid = validate_batch_items(zakazky, ZakazkaCreate)
+    to_create = [item.dict() for item in valid if item is not None]
+    try:
+        created = await firebase_service.add_zakazky_batch(user_id, to_create, duplicates)
+    except Exception as e:
+        return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
+
+    created_iter = iter(created)
+    for result, item in zip(results, valid):
+        if item is not None:
+            result.update(next(created_iter))
+    return {
+        "results": results,
+        "created": sum(1 for r in results if r["status"] == "created"),
+        "duplicates": sum(1 for r in results if r["status"] == "duplicate"),
+        "failed": sum(1 for r in results if r["status"] not in ("created", "duplicate")),
+        "source": "firebase" if firebase_service.db else "supabase_frontend",
+    }
+
+# Nejvíce chyb řádků v JSON odpovědi importu (NDJSON je posílá všechny)
+MAX_IMPORT_ERRORS = 1000
+
+
+async def import_events(user_id: str, reader, duplicates: str):
+    """Průběh importu jako proud událostí: chyby řádků, ``progress`` po každé dávce, nakonec ``done``.
+
+    Dávka se čte a převádí mimo event loop, validuje proti ``ZakazkaCreate``
+    a zapisuje jedním ``add_zakazky_batch`` (commity po 500 zápisech).
+    """
+    totals = {"rows": 0, "created": 0, "duplicates": 0, "invalid": 0, "failed": 0}
+    try:
+        while True:
+            try:
+                chunk = await asyncio.to_thread(reader.next_chunk, IMPORT_CHUNK_SIZE)
+            except ImportFormatError as e:
+                yield {"type": "error", "row": None, "errors": [{"msg": str(e)}]}
+                break
+            if not chunk:
+                break
+            valid = []
+            for row, data, errors in chunk:
+                if not errors:
+                    try:
+                        valid.append((row, ZakazkaCreate(**data).dict()))
+                        continue
+                    except ValidationError as e:
+                        errors = e.errors(include_url=False)
+                totals["invalid"] += 1
+                yield {"type": "error", "row": row, "status": "invalid", "errors": jsonable_encoder(errors)}
+            results = await firebase_service.add_zakazky_batch(user_id, [data for _, data in valid], duplicates)
+            for (row, _), result in zip(valid, results):
+                if result["status"] == "created":
+                    totals["created"] += 1
+                    continue
+                totals["duplicates" if result["status"] == "duplicate" else "failed"] += 1
+                yield {"type": "error", "row": row, **result}
+            totals["rows"] += len(chunk)
+            yield {"type": "progress", **totals}
+        yield {"type": "done", **totals, "source": "firebase" if firebase_service.db else "supabase_frontend"}
+    finally:
+        await asyncio.to_thread(reader.close)
+
+
+@api_router.post("/users/{user_id}/zakazky:import")
+async def import_zakazky(
+    request: Request,
+    user_id: str,
+    format: Optional[str] = Query(None, description="csv nebo xlsx (jinak podle Content-Type / obsahu)"),
+    duplicates: str = Query(DUPLICATES_REJECT, description="reject = řádky shodné s existující zakázkou přeskočit, flag = založit a označit"),
+):
+    """Hromadný import zakázek z CSV/XLSX (tělo požadavku = soubor).
+
+    Soubor se čte po řádcích, validuje a zapisuje po dávkách. S ``Accept:
+    application/x-ndjson`` se průběh a chyby řádků streamují průběžně,
+    jinak přijde souhrn na konci.
+    """
+    if duplicates not in DUPLICATE_MODES:
+        raise HTTPException(status_code=400, detail=f"Neplatný parametr duplicates: {duplicates} (povoleno: {', '.join(DUPLICATE_MODES)})")
+    if format is not None and format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Neznámý formát: {format} (povoleno: {', '.join(IMPORT_FORMATS)})")
+    try:
+        upload = await spool_upload(request.stream())
+        file_format = detect_format(format, request.headers.get("content-type"), upload.read(4))
+        upload.seek(0)
+        # Otevření souboru zavře upload i při chybě záhlaví
+        reader = await asyncio.to_thread(open_import, upload, file_format)
+    except ImportFormatError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    events = import_events(user_id, reader, duplicates)
+    if wants_ndjson(request):
+        return StreamingResponse(ndjson_lines(events), media_type=NDJSON_MEDIA_TYPE)
+
+    errors, error_count, summary = [], 0, {}
+    async for event in events:
+        if event["type"] == "error":
+            error_count += 1
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({key: value for key, value in event.items() if key != "type"})
+        elif event["type"] == "done":
+            summary = {key: value for key, value in event.items() if key != "type"}
+    return {**summary, "errors": errors, "errors_truncated": error_count > len(errors)}
+
+
+async def _chain_first(first: Dict[str, Any], items):
+    yield first
+    async for item in items:
+        yield item
+
+
+async def _export_body(chunks):
+    try:
+        async for chunk in chunks:
+            yield chunk
+    except Exception as e:
+        # Hlavičky už odešly - přerušené spojení klient pozná, nedokončený soubor ne
+        logger.error(f"❌ Export zakázek selhal: {e}")
+        raise
+
+
+@api_router.get("/users/{user_id}/zakazky:export")
+async def export_zakazky(
+    user_id: str,
+    format: str = Query(zakazky_export.FORMAT_CSV, description="csv nebo xlsx"),
+    gzip: bool = Query(False, description="Komprimovat CSV (soubor .csv.gz)"),
+    order_by: Optional[str] = None,
+    druh: Optional[str] = None,
+    klient: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+):
+    """Export celé historie zakázek do CSV/XLSX ke stažení.
+
+    Zakázky se čtou po stránkách (kurzorem, jako NDJSON výpis) a rovnou
+    zapisují do odpovědi - paměť nezávisí na velikosti historie. Filtry a
+    ``order_by`` jsou stejné jako u výpisu zakázek. Sloupce odpovídají
+    importu, export jde tedy znovu naimportovat.
+    """
+    if format not in zakazky_export.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Neznámý formát: {format} (povoleno: {', '.join(zakazky_export.EXPORT_FORMATS)})")
+    if gzip and format != zakazky_export.FORMAT_CSV:
+        # XLSX je už komprimovaný ZIP
+        raise HTTPException(status_code=400, detail="Parametr gzip je jen pro formát csv")
+    try:
+        filters = ZakazkyFilter.from_params(druh, klient, date_from, date_to)
+        parse_cursor_args(order_by, None, filters)
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if filters.is_empty:
+        filters = None
+
+    items = firebase_service.stream_user_zakazky(
+        user_id, order_by=order_by, fields=zakazky_export.EXPORT_FIELDS, filters=filters,
+        page_size=zakazky_export.EXPORT_PAGE_SIZE,
+    )
+    try:
+        # První stránka se načte ještě před hlavičkami - chyba dotazu vrátí běžnou odpověď
+        first = await anext(items, None)
+    except Exception as e:
+        return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
+    if first is None and not firebase_service.db:
+        return {"message": "Fallback na Supabase frontend", "source": "supabase_frontend"}
+    if first is not None:
+        items = _chain_first(first, items)
+
+    if format == zakazky_export.FORMAT_XLSX:
+        chunks = zakazky_export.xlsx_chunks(items)
+    else:
+        chunks = zakazky_export.csv_chunks(items)
+    media_type = zakazky_export.MEDIA_TYPES[format]
+    if gzip:
+        chunks = zakazky_export.gzip_chunks(chunks)
+        media_type = "application/gzip"
+    filename = zakazky_export.export_filename(format, gzip)
+    return StreamingResponse(
+        _export_body(chunks),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@api_router.post("/users/{user_id}/zakazky:batchUpdate")
+async def batch_update_zakazky(
+    request: Request,
+    user_id: str,
+    zakazky: List[Any],
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, description=IDEMPOTENCY_KEY_DESCRIPTION),
+):
+    """Hromadná aktualizace zakázek - položky ``{"id": ..., <měněná pole>}``"""
+    return await idempotent(request, user_id, idempotency_key, lambda: _batch_update_zakazky(user_id, zakazky))
+
+
+async def _batch_update_zakazky(user_id: str, zakazky: List[Any]):
+    results, valid = validate_batch_items(zakazky, ZakazkaBatchUpdate)
+    updates = [
+        (item.id, {k: v for k, v in item.dict().items() if v is not None and k != "id"})
+        for item in valid if item is not None
+    ]
+    try:
+        updated = await firebase_service.update_zakazky_batch(user_id, updates)
+    except Exception as e:
+        return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
+
+    updated_iter = iter(updated)
+    for result, item in zip(results, valid):
+        if item is not None:
+            result.update(next(updated_iter))
+    return {
+        "results": results,
+        "updated": sum(1 for r in results if r["status"] == "updated"),
+        "failed": sum(1 for r in results if r["status"] != "updated"),
+        "source": "firebase" if firebase_service.db else "supabase_frontend",
+    }
+
+@api_router.post("/users/{user_id}/zakazky:batchDelete")
+async def batch_delete_zakazky(
+    request: Request,
+    user_id: str,
+    ids: List[str],
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, description=IDEMPOTENCY_KEY_DESCRIPTION),
+):
+    """Hromadné smazání zakázek podle seznamu ID"""
+    return await idempotent(request, user_id, idempotency_key, lambda: _batch_delete_zakazky(user_id, ids))
+
+
+async def _batch_delete_zakazky(user_id: str, ids: List[str]):
+    if len(ids) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Maximálně {MAX_BATCH_ITEMS} položek v jednom požadavku")
+    try:
+        results = await firebase_service.delete_zakazky_batch(user_id, ids)
+    except Exception as e:
+        return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
+    return {
+        "results": [{"index": index, **result} for index, result in enumerate(results)],
+        "deleted": sum(1 for r in results if r["status"] == "deleted"),
+        "failed": sum(1 for r in results if r["status"] != "deleted"),
+        "source": "firebase" if firebase_service.db else "supabase_frontend",
+    }
+
 @api_router.put("/users/{user_id}/zakazky/{zakazka_id}")
 async def update_zakazka(user_id: str, zakazka_id: str, zakazka: ZakazkaUpdate):
     """Aktualizace zakázky - Firebase s fallback na Supabase"""
@@ -125,7 +843,16 @@ async def update_zakazka(user_id: str, zakazka_id: str, zakazka: ZakazkaUpdate):
         update_data = {k: v for k, v in zakazka.dict().items() if v is not None}
         success = await firebase_service.update_zakazka(user_id, zakazka_id, update_data)
         if success:
-            return {"message": "Zakázka úspěšně aktualizována", "source": "firebase"}
+            # Úprava mimo pole rozvrhu rozvrh nemění - není co kontrolovat
+            warnings, schedule_checked = [], bool(firebase_service.db)
+            if firebase_service.db and any(field in update_data for field in scheduling.SCHEDULE_FIELDS):
+                warnings, schedule_checked = await schedule_warnings(user_id, zakazka_id)
+            return {
+                "message": "Zakázka úspěšně aktualizována",
+                "warnings": warnings,
+                "schedule_checked": schedule_checked,
+                "source": "firebase",
+            }
         else:
             return {"message": "Fallback na Supabase frontend", "source": "supabase_frontend"}
     except Exception as e:
@@ -143,12 +870,181 @@ async def delete_zakazka(user_id: str, zakazka_id: str):
     except Exception as e:
         return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
 
+@api_router.get("/users/{user_id}/dashboard")
+async def get_dashboard(request: Request, response: Response, user_id: str):
+    """Souhrn dashboardu (tržby, zisk, počet, průměr, rozložení podle druhu) - O(1) vůči počtu zakázek"""
+    etag = await request_etag(request, user_id, "dashboard")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    try:
+        dashboard = await firebase_service.get_dashboard(user_id)
+        if dashboard is not None:
+            if etag:
+                response.headers["ETag"] = etag
+            return {"data": dashboard, "source": "firebase"}
+        else:
+            return {"message": "Fallback na Supabase frontend", "source": "supabase_frontend"}
+    except Exception as e:
+        return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
+
+@api_router.post("/users/{user_id}/dashboard:rebuild")
+async def rebuild_dashboard(user_id: str):
+    """Přepočet souhrnu dashboardu a rollupů časových řad ze všech zakázek (oprava rozladění)"""
+    try:
+        if await firebase_service.rebuild_aggregates(user_id):
+            dashboard = await firebase_service.get_dashboard(user_id)
+            return {"message": "Souhrn dashboardu přepočítán", "data": dashboard, "source": "firebase"}
+        else:
+            return {"message": "Fallback na Supabase frontend", "source": "supabase_frontend"}
+    except Exception as e:
+        return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
+
+@api_router.post("/users/{user_id}/zakazky:reprice")
+async def reprice_zakazky(
+    user_id: str,
+    dry_run: bool = Query(False, description="Jen spočítat, kolik zakázek by se změnilo"),
+    include_legacy: bool = Query(False, description="Přepočítat i zakázky bez verze ceníku (ručně zadané fee)"),
+):
+    """Přepočet fee a zisku všech zakázek uživatele podle aktuálního ceníku"""
+    try:
+        report = await firebase_service.reprice_zakazky(user_id, dry_run=dry_run, include_legacy=include_legacy)
+        if report is not None:
+            return {"message": "Fee a zisk přepočítány", "data": report, "source": "firebase"}
+        else:
+            return {"message": "Fallback na Supabase frontend", "source": "supabase_frontend"}
+    except Exception as e:
+        return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
+
+@api_router.get("/pricing")
+async def get_pricing():
+    """Ceník fee - historie verzí, aktuální je poslední"""
+    return {
+        "current": pricing.current_version().version,
+        "versions": [
+            {"version": version.version, "valid_from": version.valid_from.isoformat(), "fee_rate": version.fee_rate}
+            for version in pricing.PRICING_VERSIONS
+        ],
+    }
+
+@api_router.get("/users/{user_id}/timeseries")
+async def get_timeseries(
+    request: Request,
+    response: Response,
+    user_id: str,
+    granularity: str = Query("month", description="month, week nebo day"),
+    date_from: Optional[str] = Query(None, alias="from", description="Od data (ISO nebo 11. 4. 2025)"),
+    date_to: Optional[str] = Query(None, alias="to", description="Do data včetně"),
+):
+    """Časová řada tržeb, zisku, počtu zakázek a nákladů po obdobích (z rollup dokumentů)"""
+    try:
+        if granularity not in GRANULARITIES:
+            raise QueryError(f"Neplatná granularita: {granularity} (povoleno: {', '.join(GRANULARITIES)})")
+        first = parse_date_param("from", date_from)
+        last = parse_date_param("to", date_to)
+        if first and last and len(periods(granularity, first, last)) > MAX_TIMESERIES_POINTS:
+            raise QueryError(f"Maximálně {MAX_TIMESERIES_POINTS} období v jednom dotazu")
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    etag = await request_etag(request, user_id, "timeseries")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    try:
+        timeseries = await firebase_service.get_timeseries(
+            user_id, granularity, first, last, max_points=MAX_TIMESERIES_POINTS
+        )
+        if timeseries is not None:
+            if etag:
+                response.headers["ETag"] = etag
+            return {"data": timeseries, "source": "firebase"}
+        else:
+            return {"message": "Fallback na Supabase frontend", "source": "supabase_frontend"}
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
+
+@api_router.get("/users/{user_id}/calendar")
+async def get_calendar(
+    request: Request,
+    response: Response,
+    user_id: str,
+    date_from: str = Query(..., alias="from", description="První zobrazený den (ISO nebo 11. 4. 2025)"),
+    date_to: str = Query(..., alias="to", description="Poslední zobrazený den včetně"),
+    calendar_only: bool = Query(True, description="Jen kalendářové zakázky (CAL- nebo calendar_origin)"),
+):
+    """Zakázky, jejichž realizace (datum + doba_realizace) zasahuje do zobrazeného okna kalendáře"""
+    try:
+        first = parse_date_param("from", date_from)
+        last = parse_date_param("to", date_to)
+        if last < first:
+            raise QueryError("Parametr to musí být stejný nebo pozdější než from")
+        if (last - first).days + 1 > MAX_CALENDAR_DAYS:
+            raise QueryError(f"Maximálně {MAX_CALENDAR_DAYS} dní v jednom dotazu")
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    etag = await request_etag(request, user_id, "calendar")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    try:
+        index = await firebase_service.get_calendar_index(user_id)
+        if index is not None:
+            zakazky = index.query(first, last, calendar_only)
+            if etag:
+                response.headers["ETag"] = etag
+            return {"data": zakazky, "from": first.isoformat(), "to": last.isoformat(), "source": "firebase"}
+        else:
+            return {"message": "Fallback na Supabase frontend", "source": "supabase_frontend"}
+    except Exception as e:
+        return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
+
+@api_router.get("/users/{user_id}/schedule/conflicts")
+async def get_schedule_conflicts(
+    request: Request,
+    response: Response,
+    user_id: str,
+    date_from: Optional[str] = Query(None, alias="from", description="Od data (ISO nebo 11. 4. 2025); bez mezí celá historie"),
+    date_to: Optional[str] = Query(None, alias="to", description="Do data včetně"),
+    capacity: int = Query(scheduling.DEFAULT_CREW_SIZE, ge=1, description="Počet lidí k dispozici v jednom dni"),
+    calendar_only: bool = Query(False, description="Jen kalendářové zakázky"),
+):
+    """Překrývající se zakázky a dny s překročenou kapacitou (sweep-line nad intervaly zakázek)"""
+    try:
+        first = parse_date_param("from", date_from)
+        last = parse_date_param("to", date_to)
+        if first and last and last < first:
+            raise QueryError("Parametr to musí být stejný nebo pozdější než from")
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    etag = await request_etag(request, user_id, "schedule")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    try:
+        index = await firebase_service.get_calendar_index(user_id)
+        if index is not None:
+            spans = index.spans(first, last, calendar_only)
+            report = await asyncio.to_thread(scheduling.sweep, scheduling.jobs_from_spans(spans), capacity, first, last)
+            if etag:
+                response.headers["ETag"] = etag
+            return {"data": report, "source": "firebase"}
+        else:
+            return {"message": "Fallback na Supabase frontend", "source": "supabase_frontend"}
+    except Exception as e:
+        return {"message": f"Fallback na Supabase frontend: {str(e)}", "user_id": user_id}
+
 @api_router.get("/users/{user_id}")
-async def get_user_data(user_id: str):
-    """Získání všech dat uživatele - Firebase s fallback na Supabase"""
+async def get_user_data(request: Request, response: Response, user_id: str):
+    """Získání všech dat uživatele - Firebase s fallback na Supabase (s ETag)"""
+    etag = await request_etag(request, user_id, "user")
+    if etag_matches(request, etag):
+        return not_modified(etag)
     try:
         user_data = await firebase_service.get_user_data(user_id)
         if user_data:
+            if etag:
+                response.headers["ETag"] = etag
             return {"data": user_data, "source": "firebase"}
         else:
             return {"message": "Fallback na Supabase frontend", "source": "supabase_frontend"}
@@ -178,19 +1074,3 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-@app.on_event("startup")
-async def startup_event():
-    logger.info("🔥 Hybrid server spuštěn (Supabase + Firebase)")
-    logger.info("✅ Dušan - Správa zakázek API připraveno")
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    logger.info("🔥 Hybrid server zastaven")
@@ -0,0 +1,56 @@
+import hashlib
+from typing import Callable, Dict, Optional
+
+# Čítač verze dat v dokumentu ``users/{id}`` - každý commit dat uživatele ho
+# zvýší ve stejném zápisu (``FirebaseService._write_version``)
+DATA_VERSION_FIELD = 'data_version'
+
+
+class UserVersions:
+    """Verze dat uživatele pro ETagy a platnost lokálních kopií.
+
+    Verze je ``data_version`` z Firestore, takže ETag je stejný ve všech
+    procesech (workerech) a mění ho i zápisy mimo běžné cesty (migrace,
+    přepočty). Proces si pamatuje naposledy viděnou verzi a počítá vlastní
+    commity (``begin``/``end``); když přečtená verze neodpovídá, zapisoval
+    jiný proces a lokální kopie dat uživatele se zahodí (``on_stale``).
+    Zbytečné zahození (např. po opakovaném commitu) stojí jen novou stavbu.
+    """
+
+    def __init__(self, on_stale: Optional[Callable[[str], None]] = None):
+        self._on_stale = on_stale
+        self._seen: Dict[str, int] = {}
+        self._pending: Dict[str, int] = {}
+        self._stale = 0
+
+    def begin(self, user_id: str):
+        """Začíná commit, který verzi zvýší"""
+        self._pending[user_id] = self._pending.get(user_id, 0) + 1
+
+    def end(self, user_id: str, committed: bool):
+        """Commit skončil; potvrzený posune očekávanou verzi"""
+        pending = self._pending.get(user_id, 0) - 1
+        if pending > 0:
+            self._pending[user_id] = pending
+        else:
+            self._pending.pop(user_id, None)
+        if committed and user_id in self._seen:
+            self._seen[user_id] += 1
+
+    def observe(self, user_id: str, version: int) -> int:
+        """Zaznamená verzi přečtenou z Firestore; cizí zápis zneplatní lokální kopie"""
+        seen = self._seen.get(user_id)
+        if seen is None or not seen <= version <= seen + self._pending.get(user_id, 0):
+            self._seen[user_id] = version
+            self._stale += seen is not None
+            if self._on_stale:
+                self._on_stale(user_id)
+        return version
+
+    def etag(self, user_id: str, version: int, variant: str = '') -> str:
+        """Silný ETag pro verzi dat uživatele; ``variant`` odliší různé reprezentace"""
+        digest = hashlib.sha1(f"{user_id}\x00{variant}".encode('utf-8')).hexdigest()[:16]
+        return f'"{version}-{digest}"'
+
+    def stats(self) -> Dict[str, int]:
+        return {"users": len(self._seen), "stale": self._stale}
@@ -0,0 +1,150 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+def estimate_size(zakazka: Dict[str, Any]) -> int:
+    """Přibližná velikost zakázky v paměti (podle JSON reprezentace)"""
+    return len(json.dumps(zakazka, default=str, ensure_ascii=False)) * 2 + 200
+
+
+class _Entry:
+    __slots__ = ('zakazky', 'size', 'expires_at')
+
+    def __init__(self, zakazky: Dict[str, Dict[str, Any]], size: int, expires_at: float):
+        self.zakazky = zakazky
+        self.size = size
+        self.expires_at = expires_at
+
+
+class ZakazkyCache:
+    """In-process cache zakázek po uživatelích (LRU + TTL + limit paměti).
+
+    Čte a zapisuje se jen z event loopu, takže nepotřebuje zámky. Zápisy
+    přes ``FirebaseService`` cache hned upravují (``apply_write``), takže
+    uživatel vždy čte vlastní zápisy. Načtení, během kterého proběhl zápis,
+    se do cache neuloží (hlídá to generace uživatele).
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        max_users: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ):
+        self.max_bytes = max_bytes or int(float(os.environ.get('ZAKAZKY_CACHE_MAX_MB', '64')) * 1024 * 1024)
+        self.max_users = max_users or int(os.environ.get('ZAKAZKY_CACHE_MAX_USERS', '256'))
+        self.ttl = ttl if ttl is not None else float(os.environ.get('ZAKAZKY_CACHE_TTL', '300'))
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._bytes = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = {'lru': 0, 'ttl': 0, 'memory': 0}
+        self._invalidations = 0
+        self._patches = 0
+
+    def generation(self, user_id: str) -> int:
+        """Značka před načtením z Firestore - předává se do ``put``"""
+        return self._generations.get(user_id, 0)
+
+    def get(self, user_id: str) -> Optional[List[Dict[str, Any]]]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self._misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(user_id)
+            self._evictions['ttl'] += 1
+            self._misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self._hits += 1
+        return [dict(zakazka) for zakazka in entry.zakazky.values()]
+
+    def put(self, user_id: str, zakazky: List[Dict[str, Any]], generation: int):
+        """Uloží načtené zakázky, pokud se mezitím nic nezapsalo"""
+        if generation != self.generation(user_id):
+            return
+        by_id = {zakazka['id']: dict(zakazka) for zakazka in zakazky}
+        size = sum(estimate_size(zakazka) for zakazka in by_id.values())
+        if size > self.max_bytes:
+            return
+        self._remove(user_id)
+        self._entries[user_id] = _Entry(by_id, size, time.monotonic() + self.ttl)
+        self._bytes += size
+        self._evict()
+
+    def invalidate(self, user_id: str):
+        self._bump(user_id)
+        if self._remove(user_id):
+            self._invalidations += 1
+
+    def apply_write(self, user_id: str, kind: str, zakazka_id: Optional[str], data: Optional[Dict[str, Any]]):
+        """Promítne zápis do cache: created/updated/deleted upraví záznam, ostatní ho zahodí"""
+        self._bump(user_id)
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        if kind == 'created' and data is not None:
+            zakazka = dict(data, id=zakazka_id)
+            entry.zakazky[zakazka_id] = zakazka
+            self._resize(entry, estimate_size(zakazka))
+        elif kind == 'updated' and data is not None:
+            current = entry.zakazky.get(zakazka_id)
+            if current is None:
+                self.invalidate(user_id)
+                return
+            before = estimate_size(current)
+            current.update(data)
+            self._resize(entry, estimate_size(current) - before)
+        elif kind == 'deleted':
+            current = entry.zakazky.pop(zakazka_id, None)
+            if current is not None:
+                self._resize(entry, -estimate_size(current))
+        else:
+            self.invalidate(user_id)
+            return
+        self._patches += 1
+        self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "max_users": self.max_users,
+            "ttl_s": self.ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": round(self._hits / lookups, 3) if lookups else 0.0,
+            "evictions": dict(self._evictions),
+            "invalidations": self._invalidations,
+            "patches": self._patches,
+        }
+
+    def _bump(self, user_id: str):
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def _resize(self, entry: _Entry, delta: int):
+        entry.size += delta
+        self._bytes += delta
+
+    def _remove(self, user_id: str) -> bool:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return False
+        self._bytes -= entry.size
+        return True
+
+    def _evict(self):
+        while len(self._entries) > self.max_users:
+            self._remove(next(iter(self._entries)))
+            self._evictions['lru'] += 1
+        while self._bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self._evictions['memory'] += 1
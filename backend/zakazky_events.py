@@ -0,0 +1,124 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+# Událost, kterou dostane pomalý klient místo zahozených změn
+RESYNC_EVENT = {"type": "resync"}
+
+# fn(user_id, emit) -> funkce pro odhlášení (nebo None, když zdroj není k dispozici)
+WatchFactory = Callable[[str, Callable[[Dict[str, Any]], None]], Awaitable[Optional[Callable[[], None]]]]
+
+
+class Subscription:
+    """Fronta událostí jednoho SSE klienta (omezená velikost = backpressure)"""
+
+    def __init__(self, max_queue: int):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.overflows = 0
+
+    def offer(self, event: Dict[str, Any]) -> bool:
+        """Vloží událost; při plné frontě ji vyprázdní a nechá jen ``resync``"""
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(RESYNC_EVENT)
+            self.overflows += 1
+            return False
+
+    async def get(self) -> Dict[str, Any]:
+        return await self._queue.get()
+
+
+class ZakazkyEventHub:
+    """Rozesílání změn zakázek SSE klientům.
+
+    Pro každého uživatele běží nejvýše jeden zdroj změn (Firestore
+    ``on_snapshot``), který se spustí s prvním odběratelem a zastaví s
+    posledním. Každý odběratel má vlastní omezenou frontu - klient, který
+    nestíhá číst, místo zahozených změn dostane ``resync`` a má si data
+    dotáhnout přes ``/zakazky/changes``.
+    """
+
+    def __init__(self, max_queue: Optional[int] = None):
+        self.max_queue = max_queue or int(os.environ.get('ZAKAZKY_EVENTS_QUEUE_SIZE', '100'))
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._unwatch: Dict[str, Optional[Callable[[], None]]] = {}
+        self._watch_factory: Optional[WatchFactory] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._published = 0
+        self._overflows = 0
+
+    def set_watch_factory(self, factory: Optional[WatchFactory]):
+        self._watch_factory = factory
+
+    def has_subscribers(self, user_id: str) -> bool:
+        return bool(self._subscribers.get(user_id))
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: str):
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(self.max_queue)
+        subscribers = self._subscribers.setdefault(user_id, set())
+        first = not subscribers
+        subscribers.add(subscription)
+        try:
+            if first and self._watch_factory:
+                watch = asyncio.ensure_future(self._watch_factory(
+                    user_id, lambda event: self.publish_threadsafe(user_id, event)
+                ))
+                try:
+                    self._unwatch[user_id] = await asyncio.shield(watch)
+                except asyncio.CancelledError:
+                    # Klient odešel během spouštění - sledování se dokončí
+                    # na pozadí a převezme ho jiný odběratel, nebo se zastaví
+                    watch.add_done_callback(lambda task: self._adopt_watch(user_id, task))
+                    raise
+                except Exception as e:
+                    print(f"⚠️ Nepodařilo se spustit sledování změn pro {user_id}: {e}")
+            yield subscription
+        finally:
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+                unwatch = self._unwatch.pop(user_id, None)
+                if unwatch:
+                    unwatch()
+
+    def _adopt_watch(self, user_id: str, task: asyncio.Future):
+        """Sledování spuštěné pro odběratele, který mezitím odešel"""
+        if task.cancelled() or task.exception() is not None:
+            return
+        unwatch = task.result()
+        if not unwatch:
+            return
+        if self.has_subscribers(user_id) and not self._unwatch.get(user_id):
+            self._unwatch[user_id] = unwatch
+        else:
+            unwatch()
+
+    def publish(self, user_id: str, event: Dict[str, Any]):
+        """Rozešle událost všem odběratelům uživatele (volat z event loopu)"""
+        for subscription in list(self._subscribers.get(user_id, ())):
+            if not subscription.offer(event):
+                self._overflows += 1
+        self._published += 1
+
+    def publish_threadsafe(self, user_id: str, event: Dict[str, Any]):
+        """Varianta pro callbacky z vláken Firestore ``on_snapshot``"""
+        if self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.publish, user_id, event)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._subscribers),
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "watches": sum(1 for unwatch in self._unwatch.values() if unwatch),
+            "max_queue": self.max_queue,
+            "published": self._published,
+            "overflows": self._overflows,
+        }
@@ -0,0 +1,282 @@
+import csv
+import io
+import zipfile
+import zlib
+from datetime import date
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from datum_utils import parse_datum
+
+# Zakázek načtených z Firestore najednou (projekce jen exportovaných polí)
+EXPORT_PAGE_SIZE = 1000
+
+FORMAT_CSV = 'csv'
+FORMAT_XLSX = 'xlsx'
+EXPORT_FORMATS = (FORMAT_CSV, FORMAT_XLSX)
+
+MEDIA_TYPES = {
+    FORMAT_CSV: 'text/csv; charset=utf-8',
+    FORMAT_XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Sloupce exportu - záhlaví odpovídají ``zakazky_import.COLUMN_ALIASES``,
+# takže export jde znovu naimportovat
+EXPORT_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ('datum', 'Datum'),
+    ('druh', 'Druh'),
+    ('klient', 'Klient'),
+    ('idZakazky', 'Číslo'),
+    ('castka', 'Částka'),
+    ('fee', 'Fee'),
+    ('feeOff', 'Fee off'),
+    ('palivo', 'Palivo'),
+    ('material', 'Materiál'),
+    ('pomocnik', 'Pomocník'),
+    ('zisk', 'Zisk'),
+    ('adresa', 'Adresa'),
+    ('typ', 'Typ'),
+    ('telefon', 'Telefon'),
+    ('doba_realizace', 'Doba realizace'),
+    ('poznamky', 'Poznámky'),
+)
+
+EXPORT_FIELDS = [field for field, _ in EXPORT_COLUMNS]
+
+# Excel má nejvýše 1 048 576 řádků na list - delší historie pokračuje na dalším listu
+MAX_SHEET_ROWS = 1_048_576
+
+# Výstup se posílá po kouscích alespoň této velikosti
+FLUSH_BYTES = 64 * 1024
+
+_EXCEL_EPOCH = date(1899, 12, 30)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _csv_value(value: Any) -> str:
+    if value is None:
+        return ''
+    if _is_number(value):
+        # Desetinná čárka - český Excel pak čísla rozpozná i se středníkem jako oddělovačem
+        return str(int(value)) if float(value).is_integer() else repr(float(value)).replace('.', ',')
+    if isinstance(value, list):
+        return ', '.join(str(item) for item in value)
+    return str(value)
+
+
+async def csv_chunks(zakazky: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """CSV (UTF-8 s BOM, středník) po kouscích - v paměti je jen rozepsaný kousek"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';', lineterminator='\r\n')
+    buffer.write('﻿')
+    writer.writerow([header for _, header in EXPORT_COLUMNS])
+    async for zakazka in zakazky:
+        writer.writerow([_csv_value(zakazka.get(field)) for field in EXPORT_FIELDS])
+        if buffer.tell() >= FLUSH_BYTES:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _Sink(io.RawIOBase):
+    """Nepřevíjitelný cíl pro ``zipfile`` - zapsané bajty si export průběžně odebírá"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._size = 0
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._size += len(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # zipfile potřebuje pozici pro centrální adresář, převíjet nesmí
+        return self._position
+
+    def flush(self):
+        pass
+
+    @property
+    def pending(self) -> int:
+        return self._size
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks, self._size = [], 0
+        return data
+
+
+def _column_letter(index: int) -> str:
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+_COLUMN_LETTERS = [_column_letter(index) for index in range(len(EXPORT_COLUMNS))]
+
+
+def _xml_text(value: Any) -> str:
+    # XML 1.0 nepovoluje řídicí znaky kromě tabulátoru a konců řádků
+    text = _csv_value(value) if isinstance(value, list) else str(value)
+    text = ''.join(char for char in text if char >= ' ' or char in '\t\n\r')
+    return escape(text)
+
+
+def _xlsx_cell(reference: str, field: str, value: Any) -> str:
+    if value is None or value == '':
+        return ''
+    if field == 'datum':
+        parsed = parse_datum(value)
+        if parsed is not None:
+            # Skutečné datum (styl 1 = krátké datum) - v Excelu jde řadit a filtrovat
+            return f'<c r="{reference}" s="1"><v>{(parsed - _EXCEL_EPOCH).days}</v></c>'
+    if _is_number(value):
+        return f'<c r="{reference}"><v>{value!r}</v></c>'
+    return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{_xml_text(value)}</t></is></c>'
+
+
+def _xlsx_row(number: int, values: Iterable[Tuple[str, Any]]) -> str:
+    cells = ''.join(
+        _xlsx_cell(f'{letter}{number}', field, value) for letter, (field, value) in zip(_COLUMN_LETTERS, values)
+    )
+    return f'<row r="{number}">{cells}</row>'
+
+
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_END = '</sheetData></worksheet>'
+
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def _workbook_parts(sheets: int) -> Dict[str, str]:
+    """Části balíčku XLSX kromě listů - zapisují se až na konec, kdy je známý počet listů"""
+    overrides = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{index}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for index in range(1, sheets + 1)
+    )
+    sheet_entries = ''.join(
+        f'<sheet name="Zakázky{"" if index == 1 else f" {index}"}" sheetId="{index}" r:id="rId{index}"/>'
+        for index in range(1, sheets + 1)
+    )
+    sheet_rels = ''.join(
+        f'<Relationship Id="rId{index}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{index}.xml"/>'
+        for index in range(1, sheets + 1)
+    )
+    header = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    return {
+        '[Content_Types].xml': (
+            f'{header}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            f'{overrides}</Types>'
+        ),
+        '_rels/.rels': (
+            f'{header}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>'
+        ),
+        'xl/workbook.xml': (
+            f'{header}<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets>{sheet_entries}</sheets></workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': (
+            f'{header}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{sheet_rels}<Relationship Id="rId{sheets + 1}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+            'Target="styles.xml"/></Relationships>'
+        ),
+        'xl/styles.xml': _STYLES,
+    }
+
+
+async def xlsx_chunks(zakazky: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """XLSX zapisovaný rovnou do odpovědi.
+
+    Listy se píší jako proud XML do ZIPu nad nepřevíjitelným cílem (zipfile
+    pak použije data descriptory), každý kousek se hned odešle. Metadata
+    sešitu jdou do ZIPu až za listy - pořadí položek v balíčku nehraje roli.
+    """
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+    header = list(EXPORT_COLUMNS)
+    sheets, sheet, row = 0, None, MAX_SHEET_ROWS
+    try:
+        async for zakazka in zakazky:
+            if row >= MAX_SHEET_ROWS:
+                if sheet is not None:
+                    sheet.write(_SHEET_END.encode('utf-8'))
+                    sheet.close()
+                sheets += 1
+                sheet = archive.open(f'xl/worksheets/sheet{sheets}.xml', 'w', force_zip64=True)
+                sheet.write((_SHEET_START + _xlsx_row(1, header)).encode('utf-8'))
+                row = 1
+            row += 1
+            sheet.write(_xlsx_row(row, ((field, zakazka.get(field)) for field in EXPORT_FIELDS)).encode('utf-8'))
+            if sink.pending >= FLUSH_BYTES:
+                yield sink.drain()
+        if sheet is None:
+            # Prázdná historie - list jen se záhlavím
+            sheets = 1
+            sheet = archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+            sheet.write((_SHEET_START + _xlsx_row(1, header)).encode('utf-8'))
+        sheet.write(_SHEET_END.encode('utf-8'))
+        sheet.close()
+        for name, content in _workbook_parts(sheets).items():
+            archive.writestr(name, content)
+        archive.close()
+        yield sink.drain()
+    finally:
+        # Přerušený export - ZIP se jen zahodí
+        archive.fp = None
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Proudová komprese gzip (hlavička + deflate + patička)"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_filename(file_format: str, gzip: bool = False, today: Optional[date] = None) -> str:
+    name = f"zakazky-{(today or date.today()).isoformat()}.{file_format}"
+    return f"{name}.gz" if gzip else name
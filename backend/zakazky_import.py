@@ -0,0 +1,284 @@
+import codecs
+import csv
+import io
+import os
+import re
+import tempfile
+import unicodedata
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from datum_utils import parse_datum
+
+# Řádků validovaných a zapsaných najednou (jedna dávka = jeden hromadný zápis)
+IMPORT_CHUNK_SIZE = 500
+
+# Největší nahrávaný soubor
+IMPORT_MAX_BYTES = int(float(os.environ.get('IMPORT_MAX_MB', '50')) * 1024 * 1024)
+
+# Nahraný soubor se drží v paměti jen do této velikosti, pak se odkládá na disk
+SPOOL_MEMORY_BYTES = 1024 * 1024
+
+FORMAT_CSV = 'csv'
+FORMAT_XLSX = 'xlsx'
+IMPORT_FORMATS = (FORMAT_CSV, FORMAT_XLSX)
+
+_CONTENT_TYPES = {
+    'text/csv': FORMAT_CSV,
+    'application/csv': FORMAT_CSV,
+    'text/plain': FORMAT_CSV,
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': FORMAT_XLSX,
+}
+
+# Záhlaví sloupců (bez diakritiky, mezer a velikosti písmen) -> pole zakázky
+COLUMN_ALIASES = {
+    'datum': 'datum',
+    'druh': 'druh',
+    'druhprace': 'druh',
+    'klient': 'klient',
+    'zakaznik': 'klient',
+    'idzakazky': 'idZakazky',
+    'cislo': 'idZakazky',
+    'cislozakazky': 'idZakazky',
+    'castka': 'castka',
+    'cena': 'castka',
+    'fee': 'fee',
+    'feeoff': 'feeOff',
+    'hasfee': 'hasFee',
+    'palivo': 'palivo',
+    'material': 'material',
+    'pomocnik': 'pomocnik',
+    'zisk': 'zisk',
+    'adresa': 'adresa',
+    'typ': 'typ',
+    'typobjektu': 'typ',
+    'telefon': 'telefon',
+    'dobarealizace': 'doba_realizace',
+    'poznamky': 'poznamky',
+    'poznamka': 'poznamky',
+}
+
+# Sloupce, bez kterých import nemá smysl
+REQUIRED_COLUMNS = ('datum', 'druh', 'klient', 'castka', 'adresa')
+
+NUMBER_FIELDS = ('castka', 'fee', 'feeOff', 'palivo', 'material', 'pomocnik', 'zisk')
+
+# Prázdné buňky a chybějící sloupce (tabulky je často nevyplňují)
+IMPORT_DEFAULTS = {'idZakazky': '', 'feeOff': 0, 'palivo': 0, 'material': 0, 'pomocnik': 0}
+
+_CURRENCY = re.compile(r'(kč|czk|,-)$', re.IGNORECASE)
+_SPACES = re.compile(r"[\s']")
+_BOOLEANS = {'ano': True, 'a': True, 'yes': True, 'true': True, '1': True, 'ne': False, 'n': False, 'no': False, 'false': False, '0': False}
+
+
+class ImportFormatError(ValueError):
+    """Soubor nejde importovat jako celek (formát, záhlaví, velikost)"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _header_key(name: Any) -> str:
+    text = unicodedata.normalize('NFKD', str(name or ''))
+    return ''.join(char for char in text if char.isalnum()).casefold()
+
+
+def parse_decimal(value: Any) -> float:
+    """Číslo z buňky - "1 234,50 Kč", "1.234,50", "1,234.50" i "1234.5" """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    text = _SPACES.sub('', _CURRENCY.sub('', str(value).strip()))
+    if ',' in text and '.' in text:
+        # Oddělovač desetin je ten poslední, druhý odděluje tisíce
+        thousands = '.' if text.rfind(',') > text.rfind('.') else ','
+        text = text.replace(thousands, '')
+    text = text.replace(',', '.')
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError(f"Neplatné číslo: {value}")
+
+
+def format_datum(value: Any) -> str:
+    """Datum z buňky v českém formátu zakázek ("11. 4. 2025")"""
+    parsed = value.date() if isinstance(value, datetime) else parse_datum(value.strip() if isinstance(value, str) else value)
+    if parsed is None:
+        raise ValueError(f"Neplatné datum: {value} (očekává se např. 11. 4. 2025)")
+    return f"{parsed.day}. {parsed.month}. {parsed.year}"
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (datetime, date)):
+        return format_datum(value)
+    return str(value).strip()
+
+
+def _convert(field: str, value: Any) -> Tuple[str, Any]:
+    """(pole, hodnota) z buňky sloupce ``field``"""
+    if field == 'fee' and isinstance(value, str) and not value.strip()[:1].isdigit() and value.strip().casefold() in _BOOLEANS:
+        # Sloupec "Fee" s Ano/Ne jako ve formuláři - částku dopočítá server
+        return 'hasFee', _BOOLEANS[value.strip().casefold()]
+    if field == 'datum':
+        return field, format_datum(value)
+    if field in NUMBER_FIELDS:
+        return field, parse_decimal(value)
+    if field == 'doba_realizace':
+        number = parse_decimal(value)
+        if not number.is_integer():
+            raise ValueError(f"Doba realizace musí být celý počet dní: {value}")
+        return field, int(number)
+    if field == 'hasFee':
+        flag = _BOOLEANS.get(_text(value).casefold())
+        if flag is None:
+            raise ValueError(f"Neplatná hodnota Ano/Ne: {value}")
+        return field, flag
+    return field, _text(value)
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+class ImportReader:
+    """Řádky importovaného souboru převedené na data zakázek, po dávkách.
+
+    První neprázdný řádek je záhlaví; sloupce se mapují podle
+    ``COLUMN_ALIASES``, neznámé se ignorují. Hodnoty se převádějí z českých
+    formátů (datum, desetinná čárka, "Kč"), chyby převodu mají stejný tvar
+    jako chyby validace pydantic. Čte se po řádcích - v paměti je jen dávka.
+    """
+
+    def __init__(self, rows: Iterator[Sequence[Any]], close: Callable[[], None]):
+        self._rows = rows
+        self._close = close
+        self._row_number = 0
+        try:
+            header = self._next_row()
+            if header is None:
+                raise ImportFormatError("Soubor je prázdný")
+            self.columns: List[Optional[str]] = [COLUMN_ALIASES.get(_header_key(name)) for name in header]
+            missing = [field for field in REQUIRED_COLUMNS if field not in self.columns]
+            if missing:
+                raise ImportFormatError(f"V záhlaví chybí sloupce: {', '.join(missing)}")
+        except BaseException:
+            close()
+            raise
+
+    def next_chunk(self, size: int = IMPORT_CHUNK_SIZE) -> List[Tuple[int, Dict[str, Any], List[Dict[str, Any]]]]:
+        """Další dávka ``(číslo řádku, data, chyby převodu)``; prázdný seznam = konec souboru"""
+        chunk = []
+        while len(chunk) < size:
+            values = self._next_row()
+            if values is None:
+                break
+            data: Dict[str, Any] = dict(IMPORT_DEFAULTS)
+            errors = []
+            for field, value in zip(self.columns, values):
+                if field is None or _is_empty(value):
+                    continue
+                try:
+                    target, converted = _convert(field, value)
+                    data[target] = converted
+                except ValueError as e:
+                    errors.append({"type": "value_error", "loc": [field], "msg": str(e), "input": _text(value)})
+            chunk.append((self._row_number, data, errors))
+        return chunk
+
+    def close(self):
+        self._close()
+
+    def _next_row(self) -> Optional[Sequence[Any]]:
+        for values in self._rows:
+            self._row_number += 1
+            if not all(_is_empty(value) for value in values):
+                return values
+        return None
+
+
+def detect_format(requested: Optional[str], content_type: Optional[str], head: bytes) -> str:
+    """Formát podle parametru, Content-Type, nebo obsahu (XLSX je ZIP)"""
+    if requested:
+        return requested
+    detected = _CONTENT_TYPES.get((content_type or '').split(';')[0].strip().lower())
+    if detected:
+        return detected
+    return FORMAT_XLSX if head.startswith(b'PK\x03\x04') else FORMAT_CSV
+
+
+async def spool_upload(chunks: AsyncIterator[bytes], max_bytes: int = IMPORT_MAX_BYTES):
+    """Uloží tělo požadavku do dočasného souboru (nad ``SPOOL_MEMORY_BYTES`` na disk)"""
+    upload = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise ImportFormatError(f"Soubor je větší než {max_bytes // (1024 * 1024)} MB", status_code=413)
+            upload.write(chunk)
+    except BaseException:
+        upload.close()
+        raise
+    upload.seek(0)
+    return upload
+
+
+def _sample_encoding(sample: bytes) -> str:
+    try:
+        sample.decode('utf-8')
+        return 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # Vícebajtový znak useknutý koncem vzorku není chyba kódování
+        if e.start >= len(sample) - 3 and e.reason == 'unexpected end of data':
+            return 'utf-8-sig'
+        # Export z českého Excelu
+        return 'cp1250'
+
+
+def _open_csv(upload) -> ImportReader:
+    sample = upload.read(64 * 1024)
+    upload.seek(0)
+    encoding = _sample_encoding(sample)
+    text = codecs.decode(sample, encoding, errors='ignore')
+    try:
+        dialect = csv.Sniffer().sniff(text.split('\n', 1)[0], delimiters=';,\t')
+        delimiter = dialect.delimiter
+    except csv.Error:
+        delimiter = ';' if ';' in text else ','
+    stream = io.TextIOWrapper(upload, encoding=encoding, newline='')
+
+    def _rows():
+        try:
+            yield from csv.reader(stream, delimiter=delimiter)
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ImportFormatError(f"Soubor CSV nelze přečíst: {e}")
+
+    return ImportReader(_rows(), stream.close)
+
+
+def _open_xlsx(upload) -> ImportReader:
+    # openpyxl se importuje až při prvním XLSX importu
+    from openpyxl import load_workbook
+
+    try:
+        # read_only čte list proudově (XML po řádcích), data_only = hodnoty místo vzorců
+        workbook = load_workbook(upload, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFormatError(f"Soubor XLSX nelze otevřít: {e}")
+
+    def _close():
+        workbook.close()
+        upload.close()
+
+    return ImportReader(workbook.worksheets[0].iter_rows(values_only=True), _close)
+
+
+def open_import(upload, file_format: str) -> ImportReader:
+    """Otevře nahraný soubor a přečte záhlaví (blokující - volá se mimo event loop)"""
+    try:
+        return _open_xlsx(upload) if file_format == FORMAT_XLSX else _open_csv(upload)
+    except BaseException:
+        upload.close()
+        raise
@@ -0,0 +1,283 @@
+import base64
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from datum_utils import DATUM_DAY_FIELD, DATUM_ISO_FIELD, epoch_day, parse_datum
+
+# Výchozí a maximální velikost stránky (frontend zobrazuje 20 řádků na stránku)
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 500
+
+# Velikost stránky při streamování celé historie (NDJSON, exporty)
+STREAM_PAGE_SIZE = 300
+
+# Rozsah data se vyhodnocuje ve Firestore nad ``datum_epoch_day``. Zapnout až po
+# migraci (python manage.py backfill-dates --all) - dokumenty bez normalizovaného
+# data by Firestore z výsledků vynechal.
+DATE_PUSHDOWN = os.environ.get('ZAKAZKY_DATE_PUSHDOWN', 'false').lower() in ('1', 'true', 'yes')
+
+# Delta synchronizace čte změny od ``since`` minus toto okno - zápis potvrzený
+# těsně kolem watermarku se tak nepřeskočí. Vrácené zakázky se proto mohou
+# opakovat; klient je slučuje podle ``id``.
+SYNC_OVERLAP = timedelta(seconds=float(os.environ.get('ZAKAZKY_SYNC_OVERLAP_S', '5')))
+
+# Pole, podle kterých lze řadit stránkovaný výpis. '__name__' = ID dokumentu.
+# Jen pole, která má každá zakázka - Firestore dokumenty bez pole řazení z
+# výsledků vynechá (proto ne 'typ' ani 'updated_at'). Textové 'datum' by se
+# řadilo abecedně; podle data se řadí přes 'datum_iso', který je po migraci
+# (stejná podmínka jako DATE_PUSHDOWN) v každém dokumentu.
+ORDERABLE_FIELDS = {
+    '__name__', 'druh', 'klient', 'idZakazky', 'castka', 'zisk',
+    'fee', 'material', 'palivo', 'pomocnik', 'adresa',
+}
+if DATE_PUSHDOWN:
+    ORDERABLE_FIELDS |= {DATUM_ISO_FIELD, DATUM_DAY_FIELD}
+
+# Řazení, které jde kombinovat s filtry vyhodnocenými ve Firestore - jen pro ně
+# jsou složené indexy ve firestore.indexes.json (jinak FAILED_PRECONDITION)
+FILTERED_ORDER_FIELDS = {'__name__', 'castka', 'zisk'} | (ORDERABLE_FIELDS & {DATUM_ISO_FIELD, DATUM_DAY_FIELD})
+
+# Pole zakázky, která lze vybrat parametrem ``fields`` (projekce)
+ZAKAZKA_FIELDS = (
+    'datum', 'druh', 'klient', 'idZakazky', 'castka', 'fee', 'feeOff', 'palivo',
+    'material', 'pomocnik', 'zisk', 'adresa', 'typ', 'telefon', 'doba_realizace',
+    'poznamky', 'soubory', 'updated_at', DATUM_ISO_FIELD, DATUM_DAY_FIELD,
+)
+
+
+class QueryError(ValueError):
+    """Neplatný parametr dotazu (order_by, cursor, ...)"""
+
+
+def parse_order_by(order_by: Optional[str]) -> Tuple[str, bool]:
+    """Převede 'castka' / '-castka' na (pole, sestupně)"""
+    if not order_by:
+        return '__name__', False
+    descending = order_by.startswith('-')
+    field = order_by.lstrip('-+')
+    if field == 'id':
+        field = '__name__'
+    if field not in ORDERABLE_FIELDS:
+        raise QueryError(f"Nepodporované řazení: {order_by}")
+    return field, descending
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and '$dt' in value:
+        return datetime.fromisoformat(value['$dt'])
+    return value
+
+
+def _dump_cursor(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _load_cursor(cursor: str) -> Dict[str, Any]:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+
+
+def encode_cursor(order_by: str, descending: bool, last: Dict[str, Any]) -> str:
+    """Zakóduje pozici posledního vráceného dokumentu do neprůhledného kurzoru"""
+    return _dump_cursor({
+        'o': order_by,
+        'd': descending,
+        'id': last['id'],
+        'v': None if order_by == '__name__' else _encode_value(last.get(order_by)),
+    })
+
+
+def decode_cursor(cursor: str, order_by: str, descending: bool) -> Dict[str, Any]:
+    """Vrátí hodnoty pro Firestore ``start_after`` (pole řazení + '__name__')"""
+    try:
+        payload = _load_cursor(cursor)
+        doc_id = payload['id']
+    except Exception:
+        raise QueryError("Neplatný kurzor")
+    if payload.get('o') != order_by or bool(payload.get('d')) != descending:
+        raise QueryError("Kurzor nepatří k zadanému řazení")
+    values = {'__name__': doc_id}
+    if order_by != '__name__':
+        values[order_by] = _decode_value(payload.get('v'))
+    return values
+
+
+def encode_changes_cursor(positions: Dict[str, Tuple[datetime, str]], watermark: datetime) -> str:
+    """Kurzor další dávky delta synchronizace: poslední (značka, ID) v každé kolekci + dosavadní watermark"""
+    return _dump_cursor({
+        'p': {name: [_encode_value(stamp), doc_id] for name, (stamp, doc_id) in positions.items()},
+        'w': _encode_value(watermark),
+    })
+
+
+def decode_changes_cursor(cursor: str) -> Tuple[Dict[str, Tuple[datetime, str]], datetime]:
+    try:
+        payload = _load_cursor(cursor)
+        positions = {name: (_decode_value(stamp), str(doc_id)) for name, (stamp, doc_id) in payload['p'].items()}
+        watermark = _decode_value(payload['w'])
+    except Exception:
+        raise QueryError("Neplatný kurzor")
+    if not isinstance(watermark, datetime) or not all(isinstance(stamp, datetime) for stamp, _ in positions.values()):
+        raise QueryError("Neplatný kurzor")
+    return positions, watermark
+
+
+def parse_cursor_args(
+    order_by: Optional[str], cursor: Optional[str], filters: Optional['ZakazkyFilter'] = None
+) -> Tuple[str, bool, Optional[Dict[str, Any]]]:
+    """Zvaliduje order_by + cursor (a kombinaci s filtry); vrací (pole, sestupně, hodnoty pro start_after)"""
+    field, descending = parse_order_by(order_by)
+    if filters and filters.uses_where and field not in FILTERED_ORDER_FIELDS:
+        raise QueryError(
+            f"Řazení {order_by} nejde kombinovat s filtry druh/klient/datum "
+            f"(povoleno: {', '.join(sorted(FILTERED_ORDER_FIELDS - {'__name__'}) + ['id'])})"
+        )
+    start_after = decode_cursor(cursor, field, descending) if cursor else None
+    return field, descending, start_after
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Převede 'datum,druh,castka' na seznam polí pro projekci; None = všechna pole"""
+    if not fields:
+        return None
+    selected = []
+    for field in fields.split(','):
+        field = field.strip()
+        if not field or field == 'id':
+            continue  # ID dokumentu se vrací vždy
+        if field not in ZAKAZKA_FIELDS:
+            raise QueryError(f"Nepodporované pole: {field}")
+        if field not in selected:
+            selected.append(field)
+    return selected
+
+
+def project(zakazka: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Ponechá v zakázce jen vybraná pole (+ id)"""
+    if fields is None:
+        return zakazka
+    projected = {field: zakazka[field] for field in fields if field in zakazka}
+    projected['id'] = zakazka['id']
+    return projected
+
+
+@dataclass
+class ZakazkyFilter:
+    """Filtry výpisu zakázek (stejné jako filtry v přehledu zakázek na frontendu).
+
+    ``druh`` a ``klient`` (přesná shoda) se převádí na Firestore ``where``.
+    ``datum`` je uložené jako volný text ("11. 4. 2025"); rozsah
+    ``date_from``/``date_to`` jde do Firestore přes ``datum_epoch_day``, jen
+    pokud je zapnuté ``ZAKAZKY_DATE_PUSHDOWN``, jinak se vyhodnocuje až nad
+    načtenými dokumenty.
+    """
+    druh: Optional[str] = None
+    klient: Optional[str] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+
+    @classmethod
+    def from_params(
+        cls,
+        druh: Optional[str] = None,
+        klient: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+    ) -> 'ZakazkyFilter':
+        return cls(
+            druh=druh or None,
+            klient=klient or None,
+            date_from=parse_date_param('date_from', date_from),
+            date_to=parse_date_param('date_to', date_to),
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.druh or self.klient or self.date_from or self.date_to)
+
+    @property
+    def has_date_range(self) -> bool:
+        return bool(self.date_from or self.date_to)
+
+    @property
+    def uses_where(self) -> bool:
+        """Vyhodnocuje část filtrů Firestore (``where``)? Pak řazení potřebuje složený index."""
+        return bool(self.druh or self.klient or (DATE_PUSHDOWN and self.has_date_range))
+
+    @property
+    def post_filtered(self) -> bool:
+        """Musí se část filtrů vyhodnotit až nad načtenými dokumenty?"""
+        return self.has_date_range and not DATE_PUSHDOWN
+
+    def apply_where(self, query):
+        """Přidá do Firestore dotazu filtry, které umí vyhodnotit Firestore"""
+        from firebase_admin import firestore
+
+        if self.druh:
+            query = query.where(filter=firestore.FieldFilter('druh', '==', self.druh))
+        if self.klient:
+            query = query.where(filter=firestore.FieldFilter('klient', '==', self.klient))
+        if DATE_PUSHDOWN:
+            if self.date_from:
+                query = query.where(filter=firestore.FieldFilter(DATUM_DAY_FIELD, '>=', epoch_day(self.date_from)))
+            if self.date_to:
+                query = query.where(filter=firestore.FieldFilter(DATUM_DAY_FIELD, '<=', epoch_day(self.date_to)))
+        return query
+
+    def required_fields(self) -> List[str]:
+        """Pole, která musí projekce načíst kvůli dodatečnému filtrování"""
+        return ['datum'] if self.post_filtered else []
+
+    def matches_all(self, zakazka: Dict[str, Any]) -> bool:
+        """Všechny filtry vyhodnocené v paměti (např. nad cache)"""
+        if self.druh and zakazka.get('druh') != self.druh:
+            return False
+        if self.klient and zakazka.get('klient') != self.klient:
+            return False
+        return self.in_date_range(zakazka)
+
+    def matches(self, zakazka: Dict[str, Any]) -> bool:
+        """Dodatečný filtr nad dokumentem načteným z Firestore (rozsah data, pokud ho nevyhodnotil Firestore)"""
+        return not self.post_filtered or self.in_date_range(zakazka)
+
+    def in_date_range(self, zakazka: Dict[str, Any]) -> bool:
+        if not self.has_date_range:
+            return True
+        datum = parse_datum(zakazka.get('datum'))
+        if datum is None:
+            return False
+        if self.date_from and datum < self.date_from:
+            return False
+        if self.date_to and datum > self.date_to:
+            return False
+        return True
+
+
+def parse_date_param(name: str, value: Optional[str]) -> Optional[date]:
+    if not value:
+        return None
+    parsed = parse_datum(value)
+    if parsed is None:
+        raise QueryError(f"Neplatné datum v parametru {name}: {value}")
+    return parsed
+
+
+def parse_watermark(since: str) -> datetime:
+    """Watermark delta synchronizace (ISO 8601); bez časové zóny = UTC"""
+    try:
+        watermark = datetime.fromisoformat(since)
+    except ValueError:
+        raise QueryError(f"Neplatný watermark: {since}")
+    if watermark.tzinfo is None:
+        watermark = watermark.replace(tzinfo=timezone.utc)
+    return watermark
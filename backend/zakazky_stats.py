@@ -0,0 +1,226 @@
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from datum_utils import parse_datum
+
+# Sčítaná pole zakázky (souhrn dashboardu)
+SUMMARY_SUM_FIELDS = ['castka', 'zisk', 'fee', 'palivo', 'material', 'pomocnik']
+# Pole, která je potřeba načíst pro přepočet souhrnu a časových řad
+SUMMARY_SOURCE_FIELDS = SUMMARY_SUM_FIELDS + ['druh', 'idZakazky', 'calendar_origin', 'datum']
+# Pole, jejichž změna mění souhrn (ostatní úpravy ho nechávají beze změny)
+SUMMARY_INPUT_FIELDS = set(SUMMARY_SOURCE_FIELDS)
+
+UNCATEGORIZED = 'Nezařazeno'
+
+# Klíč souhrnu dashboardu mezi agregačními dokumenty (ostatní klíče jsou rollupy)
+SUMMARY_KEY = 'summary'
+
+# Granularita časových řad: rollup dokument users/{id}/rollups/{granularita}:{období}
+GRANULARITIES = ('month', 'week', 'day')
+
+Path = Tuple[str, ...]
+
+
+def is_calendar_order(zakazka: Dict[str, Any]) -> bool:
+    """Kalendářová zakázka (prefix CAL- nebo calendar_origin) se do dashboardu nepočítá - stejně jako na frontendu"""
+    for key in ('idZakazky', 'id_zakazky', 'cislo'):
+        value = zakazka.get(key)
+        if value is not None and str(value).startswith('CAL-'):
+            return True
+    return zakazka.get('calendar_origin') is True
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def contribution(zakazka: Optional[Dict[str, Any]]) -> Dict[Path, float]:
+    """Příspěvek jedné zakázky do souhrnu jako {cesta k poli: hodnota}"""
+    if not zakazka or is_calendar_order(zakazka):
+        return {}
+    druh = zakazka.get('druh') or UNCATEGORIZED
+    values = {('pocet',): 1.0, ('druhy', druh, 'pocet'): 1.0}
+    for field in SUMMARY_SUM_FIELDS:
+        values[(field,)] = _number(zakazka.get(field))
+    values[('druhy', druh, 'castka')] = _number(zakazka.get('castka'))
+    values[('druhy', druh, 'zisk')] = _number(zakazka.get('zisk'))
+    return values
+
+
+def diff(old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> Dict[Path, float]:
+    """Rozdíl souhrnu mezi starou a novou verzí zakázky (None = neexistuje); nulové položky vynechá"""
+    delta = dict(contribution(new))
+    for path, value in contribution(old).items():
+        delta[path] = delta.get(path, 0.0) - value
+    return {path: value for path, value in delta.items() if value}
+
+
+def merge(total: Dict[Path, float], delta: Dict[Path, float]) -> Dict[Path, float]:
+    """Přičte ``delta`` do ``total`` (na místě) - sčítání rozdílů v rámci jednoho batche"""
+    for path, value in delta.items():
+        total[path] = total.get(path, 0.0) + value
+    return total
+
+
+def nested(delta: Dict[Path, float], wrap: Callable[[float], Any] = lambda value: value) -> Dict[str, Any]:
+    """Převede {cesta: hodnota} na vnořený slovník pro Firestore ``set(..., merge=True)``"""
+    result: Dict[str, Any] = {}
+    for path, value in delta.items():
+        node = result
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = wrap(_integral(value))
+    return result
+
+
+def build_summary(zakazky: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Souhrn přepočítaný z kompletního seznamu zakázek (rebuild)"""
+    total: Dict[Path, float] = {('pocet',): 0.0}
+    for field in SUMMARY_SUM_FIELDS:
+        total[(field,)] = 0.0
+    for zakazka in zakazky:
+        merge(total, contribution(zakazka))
+    summary = nested(total)
+    summary.setdefault('druhy', {})
+    return summary
+
+
+def summary_view(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Data dashboardu ze souhrnného dokumentu (stejné ukazatele jako ``dashboardData`` v App.js)"""
+    pocet = int(summary.get('pocet') or 0)
+    zisk = _integral(_number(summary.get('zisk')))
+    druhy = {
+        druh: {key: _integral(_number(values.get(key))) for key in ('pocet', 'castka', 'zisk')}
+        for druh, values in (summary.get('druhy') or {}).items()
+        if _number(values.get('pocet')) > 0
+    }
+    return {
+        "celkoveTrzby": _integral(_number(summary.get('castka'))),
+        "celkovyZisk": zisk,
+        "pocetZakazek": pocet,
+        "prumernyZisk": round(zisk / pocet) if pocet > 0 else 0,
+        "naklady": {field: _integral(_number(summary.get(field))) for field in ('fee', 'palivo', 'material', 'pomocnik')},
+        "rozlozeni": {druh: values['zisk'] for druh, values in druhy.items()},
+        "druhy": druhy,
+        "rebuilt_at": summary.get('rebuilt_at'),
+        "updated_at": summary.get('updated_at'),
+    }
+
+
+def period_key(granularity: str, day: date) -> str:
+    """Období, do kterého den patří: '2025-04', '2025-W15' (ISO týden) nebo '2025-04-11'"""
+    if granularity == 'month':
+        return f"{day.year:04d}-{day.month:02d}"
+    if granularity == 'week':
+        year, week, _ = day.isocalendar()
+        return f"{year:04d}-W{week:02d}"
+    return day.isoformat()
+
+
+def period_start(granularity: str, day: date) -> date:
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def period_date(granularity: str, key: str) -> date:
+    """Začátek období z jeho klíče (opak ``period_key``)"""
+    if granularity == 'month':
+        year, month = key.split('-')
+        return date(int(year), int(month), 1)
+    if granularity == 'week':
+        year, week = key.split('-W')
+        return date.fromisocalendar(int(year), int(week), 1)
+    return date.fromisoformat(key)
+
+
+def next_period(granularity: str, start: date) -> date:
+    if granularity == 'month':
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=7 if granularity == 'week' else 1)
+
+
+def periods(granularity: str, date_from: date, date_to: date) -> List[Tuple[str, date]]:
+    """Všechna období (klíč, začátek) od ``date_from`` do ``date_to`` včetně"""
+    result = []
+    start = period_start(granularity, date_from)
+    while start <= date_to:
+        result.append((period_key(granularity, start), start))
+        start = next_period(granularity, start)
+    return result
+
+
+def rollup_id(granularity: str, key: str) -> str:
+    return f"{granularity}:{key}"
+
+
+def rollup_contribution(zakazka: Optional[Dict[str, Any]]) -> Dict[str, Dict[Path, float]]:
+    """Příspěvek zakázky do rollupů všech granularit ({ID rollupu: {cesta: hodnota}})"""
+    if not zakazka or is_calendar_order(zakazka):
+        return {}
+    day = parse_datum(zakazka.get('datum'))
+    if day is None:
+        return {}
+    values = {('pocet',): 1.0}
+    for field in SUMMARY_SUM_FIELDS:
+        values[(field,)] = _number(zakazka.get(field))
+    return {rollup_id(granularity, period_key(granularity, day)): values for granularity in GRANULARITIES}
+
+
+def aggregate_diff(old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> Dict[str, Dict[Path, float]]:
+    """Rozdíly všech agregačních dokumentů (souhrn + rollupy) pro změnu zakázky old -> new"""
+    deltas = {SUMMARY_KEY: diff(old, new)}
+    new_rollups = rollup_contribution(new)
+    old_rollups = rollup_contribution(old)
+    for doc_id in set(new_rollups) | set(old_rollups):
+        delta = dict(new_rollups.get(doc_id, {}))
+        for path, value in old_rollups.get(doc_id, {}).items():
+            delta[path] = delta.get(path, 0.0) - value
+        deltas[doc_id] = {path: value for path, value in delta.items() if value}
+    return {doc_id: delta for doc_id, delta in deltas.items() if delta}
+
+
+def merge_aggregates(total: Dict[str, Dict[Path, float]], deltas: Dict[str, Dict[Path, float]]) -> Dict[str, Dict[Path, float]]:
+    """Sečte rozdíly agregačních dokumentů (na místě)"""
+    for doc_id, delta in deltas.items():
+        merge(total.setdefault(doc_id, {}), delta)
+    return total
+
+
+def rollup_fields(doc_id: str) -> Dict[str, Any]:
+    """Popisná pole rollup dokumentu (granularita, období)"""
+    granularity, key = doc_id.split(':', 1)
+    return {'granularity': granularity, 'period': key}
+
+
+def build_rollups(zakazky: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Rollupy přepočítané z kompletního seznamu zakázek ({ID rollupu: dokument})"""
+    totals: Dict[str, Dict[Path, float]] = {}
+    for zakazka in zakazky:
+        merge_aggregates(totals, rollup_contribution(zakazka))
+    return {doc_id: dict(nested(total), **rollup_fields(doc_id)) for doc_id, total in totals.items()}
+
+
+def rollup_view(period: Tuple[str, date], rollup: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Jeden bod časové řady; chybějící rollup = nulové období"""
+    key, start = period
+    rollup = rollup or {}
+    point = {"period": key, "start": start.isoformat(), "pocet": int(_number(rollup.get('pocet')))}
+    for field in SUMMARY_SUM_FIELDS:
+        point[field] = _integral(_number(rollup.get(field)))
+    return point
+
+
+def touches_summary(fields: Iterable[str]) -> bool:
+    """Mění úprava těchto polí souhrn? (jinak není potřeba číst původní zakázku)"""
+    return any(field in SUMMARY_INPUT_FIELDS for field in fields)
+
+
+def _integral(value: float):
+    """Celé částky jako int - Firestore Increment pak zůstane celočíselný"""
+    return int(value) if float(value).is_integer() else round(value, 6)
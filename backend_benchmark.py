@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""Benchmarky backendu Dušan - Správa zakázek.
+
+Použití:
+    python backend_benchmark.py throughput --url http://localhost:8001
+    python backend_benchmark.py startup
+    python backend_benchmark.py analytics --orders 100000
+    python backend_benchmark.py scheduling --orders 100000 --years 10
+"""
+import argparse
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+
+def get_backend_url():
+    return os.environ.get("BACKEND_URL", "http://localhost:8001")
+
+
+def sample_order(i):
+    return {
+        "datum": f"{(i % 28) + 1}. {(i % 12) + 1}. 2025",
+        "druh": ["MvČ", "Adam", "Korálek", "Ostatní"][i % 4],
+        "klient": f"Benchmark klient {i % 50}",
+        "idZakazky": f"BENCH-{i:06d}",
+        "castka": 10000 + (i % 7) * 1000,
+        "fee": 2610,
+        "feeOff": 0,
+        "palivo": 250,
+        "material": 800,
+        "pomocnik": 2000,
+        "zisk": 4340 + (i % 7) * 1000,
+        "adresa": f"Testovací {i % 100}, Praha {(i % 10) + 1}",
+        "telefon": "",
+        "doba_realizace": 1 + i % 3,
+        "poznamky": "",
+        "soubory": [],
+    }
+
+
+def run_throughput(args):
+    """Měří propustnost GET/POST na /api/users/{user_id}/zakazky při rostoucím souběhu.
+
+    S neblokujícím Firestore executorem by req/s měly růst s počtem
+    souběžných požadavků, dokud se nenarazí na limit executoru.
+    """
+    api_url = f"{args.url}/api/users/{args.user_id}/zakazky"
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    print(f"Throughput benchmark: {api_url}")
+    print("=" * 60)
+    print(f"{'souběh':>8} {'požadavků':>10} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'chyby':>7}")
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=max(levels), pool_maxsize=max(levels))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def one_request(i):
+        started = time.perf_counter()
+        try:
+            if args.write_ratio and i % round(1 / args.write_ratio) == 0:
+                response = session.post(api_url, json=sample_order(i), timeout=args.timeout)
+            else:
+                response = session.get(api_url, timeout=args.timeout)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    results = []
+    for level in levels:
+        total = level * args.requests_per_worker
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=level) as pool:
+            samples = list(pool.map(one_request, range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(sample[0] * 1000 for sample in samples)
+        errors = sum(1 for sample in samples if not sample[1])
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+        rps = total / elapsed
+        results.append((level, rps))
+        print(f"{level:>8} {total:>10} {rps:>10.1f} {statistics.median(latencies):>10.1f} {p95:>10.1f} {errors:>7}")
+
+    if len(results) > 1:
+        base = results[0][1]
+        print("-" * 60)
+        print("Škálování oproti souběhu 1: " + ", ".join(f"{level}×→{rps / base:.1f}×" for level, rps in results))
+
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url, deadline, expected_status=200):
+    while time.perf_counter() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code == expected_status:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.01)
+    return False
+
+
+def run_startup(args):
+    """Měří studený start backendu: import server.py, první odpověď, readiness, první dotaz na zakázky"""
+    print(f"Startup benchmark ({args.runs} běhů, backend: {BACKEND_DIR})")
+    print("=" * 60)
+
+    import_times = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-c", "import time; t = time.perf_counter(); import server; "
+                                   "print(time.perf_counter() - t)"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        import_times.append(float(output) * 1000)
+    print(f"import server.py:       p50 {statistics.median(import_times):8.1f} ms  max {max(import_times):8.1f} ms")
+
+    first_response, ready, first_request = [], [], []
+    for _ in range(args.runs):
+        port = _free_port()
+        base = f"http://127.0.0.1:{port}/api"
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            deadline = started + args.timeout
+            if not _wait_for(f"{base}/", deadline):
+                print("❌ Server neodpověděl včas")
+                continue
+            first_response.append((time.perf_counter() - started) * 1000)
+            if _wait_for(f"{base}/ready", deadline):
+                ready.append((time.perf_counter() - started) * 1000)
+            request_started = time.perf_counter()
+            requests.get(f"{base}/users/{args.user_id}/zakazky", timeout=args.timeout)
+            first_request.append((time.perf_counter() - request_started) * 1000)
+        finally:
+            process.terminate()
+            process.wait()
+
+    for label, samples in [
+        ("první odpověď /api/", first_response),
+        ("/api/ready = 200", ready),
+        ("první GET zakázek", first_request),
+    ]:
+        if samples:
+            print(f"{label + ':':<23} p50 {statistics.median(samples):8.1f} ms  max {max(samples):8.1f} ms")
+
+
+def run_analytics(args):
+    """Měří group-by nad sloupcovou (NumPy) kopií zakázek proti čistě Pythonovému reduceru"""
+    sys.path.insert(0, str(BACKEND_DIR))
+    import analytics
+
+    typy = ["byt", "dům", "pension", "obchod", "provozovna"]
+    orders = []
+    for i in range(args.orders):
+        order = sample_order(i)
+        order.update(
+            id=f"bench-{i}",
+            datum=f"{(i % 28) + 1}. {(i % 12) + 1}. {2020 + i % 6}",
+            klient=f"Benchmark klient {i % args.clients}",
+            typ=typy[i % len(typy)],
+            zisk=order["zisk"] + (i % 997),
+        )
+        orders.append(order)
+
+    print(f"Analytics benchmark: {args.orders} zakázek, {args.clients} klientů, {args.repeat} opakování")
+    print("=" * 60)
+
+    started = time.perf_counter()
+    columns = analytics.OrderColumns.from_orders(orders)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f"{'sloupcová kopie':<28} {build_ms:10.1f} ms  ({columns.nbytes / 1024 / 1024:.1f} MB)")
+
+    def python_group_by(keys, field):
+        totals = {}
+        for order in orders:
+            day, month, year = (part.strip() for part in order["datum"].split("."))
+            values = {"druh": order["druh"], "klient": order["klient"], "typ": order["typ"],
+                      "month": f"{year}-{int(month):02d}", "year": year}
+            group = tuple(values[key] for key in keys)
+            totals[group] = totals.get(group, 0) + order[field]
+        return totals
+
+    print(f"{'dotaz':<28} {'numpy ms':>10} {'python ms':>10} {'zrychlení':>10}")
+    for keys, field in [(["druh"], "zisk"), (["klient"], "castka"), (["druh", "month"], "zisk"), (["typ", "year"], "castka")]:
+        metrics = [("sum", field)]
+        mask = columns.mask()
+        numpy_times, python_times = [], []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = analytics.group_by(columns, keys, metrics, mask)
+            numpy_times.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            expected = python_group_by(keys, field)
+            python_times.append((time.perf_counter() - started) * 1000)
+        got = {tuple(group[key] for key in keys): group[f"sum_{field}"] for group in result["groups"]}
+        if got != expected:
+            print(f"❌ Výsledek pro {','.join(keys)} nesouhlasí s referenčním výpočtem")
+        numpy_ms, python_ms = statistics.median(numpy_times), statistics.median(python_times)
+        label = f"sum:{field} by {','.join(keys)}"
+        print(f"{label:<28} {numpy_ms:>10.1f} {python_ms:>10.1f} {python_ms / numpy_ms:>9.1f}×")
+
+
+def run_scheduling(args):
+    """Měří hledání překryvů a přetížení kapacity (sweep-line) nad syntetickým kalendářem"""
+    sys.path.insert(0, str(BACKEND_DIR))
+    from datetime import date, timedelta
+
+    import scheduling
+    from calendar_index import CalendarIndex
+    from datum_utils import epoch_day
+
+    rng = random.Random(args.seed)
+    first_day = date(2025 - args.years, 1, 1)
+    days = args.years * 365
+    orders = []
+    for i in range(args.orders):
+        start = first_day + timedelta(days=rng.randrange(days))
+        order = sample_order(i)
+        order.update(
+            id=f"bench-{i}",
+            datum=f"{start.day}. {start.month}. {start.year}",
+            doba_realizace=rng.choice([1, 1, 1, 2, 3, 5, 10, 30]),
+            pomocnik=rng.choice([0, 0, 2000]),
+        )
+        orders.append(order)
+
+    print(f"Scheduling benchmark: {args.orders} zakázek za {args.years} let, kapacita {args.crew}, {args.repeat} opakování")
+    print("=" * 60)
+
+    def measure(fn):
+        times = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = fn()
+            times.append((time.perf_counter() - started) * 1000)
+        return statistics.median(times), result
+
+    build_ms, index = measure(lambda: CalendarIndex.from_orders(orders))
+    print(f"{'intervalový index':<28} {build_ms:10.1f} ms")
+
+    spans = index.spans()
+    jobs = scheduling.jobs_from_spans(spans)
+    full_ms, report = measure(lambda: scheduling.sweep(jobs, args.crew))
+    print(f"{'celá historie':<28} {full_ms:10.1f} ms  ({report['overlaps_total']} překryvů, {len(report['overruns'])} přetížení)")
+
+    month_from = first_day + timedelta(days=days // 2)
+    month_to = month_from + timedelta(days=30)
+
+    def month_report():
+        window = index.spans(month_from, month_to)
+        return scheduling.sweep(scheduling.jobs_from_spans(window), args.crew, month_from, month_to)
+
+    month_ms, _ = measure(month_report)
+    print(f"{'měsíční okno':<28} {month_ms:10.2f} ms")
+
+    checked = rng.sample(orders, min(200, len(orders)))
+
+    def warnings():
+        for order in checked:
+            span = index.span(order["id"])
+            window = index.spans(first_day + timedelta(days=span[0] - epoch_day(first_day)),
+                                 first_day + timedelta(days=span[1] - 1 - epoch_day(first_day)))
+            scheduling.order_warnings(window, order["id"], args.crew)
+
+    warnings_ms, _ = measure(warnings)
+    print(f"{'varování po zápisu':<28} {warnings_ms / len(checked):10.3f} ms / zakázku")
+
+    # Kontrola proti naivnímu O(n²) porovnání na vzorku
+    sample = jobs[:args.verify]
+    expected = sum(
+        1 for i, a in enumerate(sample) for b in sample[i + 1:] if max(a.start, b.start) < min(a.end, b.end)
+    )
+    got = scheduling.sweep(sample, args.crew, max_overlaps=0)["overlaps_total"]
+    print(f"{'kontrola (' + str(len(sample)) + ' zakázek)':<28} {'✅' if got == expected else '❌'} {got} překryvů")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarky backendu Dušan - Správa zakázek")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    throughput = subparsers.add_parser("throughput", help="propustnost GET/POST zakázek při souběhu")
+    throughput.add_argument("--url", default=get_backend_url())
+    throughput.add_argument("--user-id", default="benchmark-user")
+    throughput.add_argument("--concurrency", default="1,2,4,8,16,32")
+    throughput.add_argument("--requests-per-worker", type=int, default=20)
+    throughput.add_argument("--write-ratio", type=float, default=0.2, help="podíl POST požadavků (0 = jen GET)")
+    throughput.add_argument("--timeout", type=float, default=30)
+    throughput.set_defaults(func=run_throughput)
+
+    startup = subparsers.add_parser("startup", help="studený start: import, první odpověď, readiness")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--user-id", default="benchmark-user")
+    startup.add_argument("--timeout", type=float, default=60)
+    startup.set_defaults(func=run_startup)
+
+    analytics = subparsers.add_parser("analytics", help="group-by nad sloupcovou kopií zakázek (in-process)")
+    analytics.add_argument("--orders", type=int, default=100_000)
+    analytics.add_argument("--clients", type=int, default=5000)
+    analytics.add_argument("--repeat", type=int, default=5)
+    analytics.set_defaults(func=run_analytics)
+
+    scheduling = subparsers.add_parser("scheduling", help="překryvy a kapacita nad syntetickým kalendářem (in-process)")
+    scheduling.add_argument("--orders", type=int, default=100_000)
+    scheduling.add_argument("--years", type=int, default=10)
+    scheduling.add_argument("--crew", type=int, default=2, help="počet lidí k dispozici v jednom dni")
+    scheduling.add_argument("--repeat", type=int, default=3)
+    scheduling.add_argument("--verify", type=int, default=2000, help="velikost vzorku pro kontrolu proti O(n²)")
+    scheduling.add_argument("--seed", type=int, default=1)
+    scheduling.set_defaults(func=run_scheduling)
+
+    args = parser.parse_args()
+    args.func(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
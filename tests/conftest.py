@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Moduly backendu se importují jako top-level (stejně jako při spuštění serveru z backend/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
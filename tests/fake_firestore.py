@@ -0,0 +1,332 @@
+"""Firestore v paměti - jen ta část API, kterou používá ``FirebaseService``.
+
+Dotazy se vyhodnocují jako ve Firestore: dokument bez pole řazení se vynechá,
+``start_after`` začíná za pozicí kurzoru (ne za shodným dokumentem), ``select``
+vrací jen vybraná pole. Zápisy batche se provedou až při ``commit``.
+"""
+import copy
+import itertools
+from datetime import datetime, timedelta, timezone
+
+import firebase_service
+from firebase_service import FirebaseService
+
+
+class _ServerTimestamp:
+    def __repr__(self):
+        return 'SERVER_TIMESTAMP'
+
+
+SERVER_TIMESTAMP = _ServerTimestamp()
+
+
+class Increment:
+    def __init__(self, value):
+        self.value = value
+
+
+class ArrayUnion:
+    def __init__(self, values):
+        self.values = list(values)
+
+
+class ArrayRemove:
+    def __init__(self, values):
+        self.values = list(values)
+
+
+_OPERATORS = {
+    '==': lambda a, b: a == b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    'in': lambda a, b: a in (b or []),
+}
+
+
+class FieldFilter:
+    def __init__(self, field_path, op_string, value):
+        self.field_path, self.op_string, self.value = field_path, op_string, value
+
+
+def _matches(field_filter, data):
+    """Vyhodnotí náš i skutečný ``FieldFilter`` (oba mají field_path, op_string, value)"""
+    value = data.get(field_filter.field_path)
+    return value is not None and _OPERATORS[field_filter.op_string](value, field_filter.value)
+
+
+class Snapshot:
+    create_time = None
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class Query:
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+
+    def __init__(self, db, path, filters=(), orders=(), limit=None, fields=None, after=None):
+        self._db, self._path = db, path
+        self._filters, self._orders = tuple(filters), tuple(orders)
+        self._limit, self._fields, self._after = limit, fields, after
+
+    def _copy(self, **changes):
+        state = dict(
+            filters=self._filters, orders=self._orders, limit=self._limit, fields=self._fields, after=self._after
+        )
+        state.update(changes)
+        return Query(self._db, self._path, **state)
+
+    def where(self, filter=None):
+        return self._copy(filters=self._filters + (filter,))
+
+    def order_by(self, field, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def start_after(self, values):
+        return self._copy(after=dict(values))
+
+    def _key(self, doc_id, data):
+        return [doc_id if field == '__name__' else data.get(field) for field, _ in self._orders]
+
+    def _before_or_at(self, key, cursor):
+        """Je dokument s klíčem ``key`` v pořadí dotazu před kurzorem nebo na něm?"""
+        for (_, direction), value, bound in zip(self._orders, key, cursor):
+            if value != bound:
+                return value < bound if direction == self.ASCENDING else value > bound
+        return True
+
+    def stream(self, transaction=None):
+        self._db.reads += 1
+        ordered = [field for field, _ in self._orders if field != '__name__']
+        docs = [
+            (path[-1], data) for path, data in self._db.docs.items()
+            if path[:-1] == self._path
+            and all(_matches(flt, data) for flt in self._filters)
+            and all(data.get(field) is not None for field in ordered)
+        ]
+        for field, direction in reversed(self._orders or (('__name__', self.ASCENDING),)):
+            docs.sort(
+                key=lambda item: item[0] if field == '__name__' else item[1][field],
+                reverse=direction == self.DESCENDING,
+            )
+        if self._after is not None:
+            cursor = [self._after.get(field) for field, _ in self._orders]
+            docs = [item for item in docs if not self._before_or_at(self._key(*item), cursor)]
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        for doc_id, data in docs:
+            data = copy.deepcopy(data)
+            if self._fields is not None:
+                data = {field: value for field, value in data.items() if field in self._fields}
+            yield Snapshot(DocumentReference(self._db, self._path + (doc_id,)), data)
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+
+class CollectionReference(Query):
+    def __init__(self, db, path):
+        super().__init__(db, path)
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            doc_id = f'auto{next(self._db.ids):05d}'
+        return DocumentReference(self._db, self._path + (doc_id,))
+
+    def list_documents(self):
+        depth = len(self._path)
+        ids = sorted({path[depth] for path in self._db.docs if len(path) > depth and path[:depth] == self._path})
+        return [self.document(doc_id) for doc_id in ids]
+
+
+class DocumentReference:
+    def __init__(self, db, path):
+        self._db, self.path, self.id = db, path, path[-1]
+
+    def collection(self, name):
+        return CollectionReference(self._db, self.path + (name,))
+
+    def get(self, transaction=None, field_paths=None):
+        self._db.reads += 1
+        return Snapshot(self, copy.deepcopy(self._db.docs.get(self.path)))
+
+    def set(self, data, merge=False):
+        self._db.apply(self.path, lambda now: _merged(self._db.docs.get(self.path) if merge else None, data, now))
+
+    def update(self, data):
+        def _update(now):
+            if self.path not in self._db.docs:
+                raise KeyError(f"Dokument neexistuje: {'/'.join(self.path)}")
+            current = copy.deepcopy(self._db.docs[self.path])
+            for key, value in data.items():
+                node = current
+                parts = key.split('.')
+                for part in parts[:-1]:
+                    node = node.setdefault(part, {})
+                _put(node, parts[-1], value, now, merge=False)
+            return current
+
+        self._db.apply(self.path, _update)
+
+    def delete(self):
+        self._db.apply(self.path, lambda now: None)
+
+
+def _put(node, key, value, now, merge):
+    if value is SERVER_TIMESTAMP:
+        node[key] = now
+    elif isinstance(value, Increment):
+        node[key] = (node.get(key) or 0) + value.value
+    elif isinstance(value, ArrayUnion):
+        current = list(node.get(key) or [])
+        node[key] = current + [item for item in value.values if item not in current]
+    elif isinstance(value, ArrayRemove):
+        node[key] = [item for item in node.get(key) or [] if item not in value.values]
+    elif isinstance(value, dict):
+        # Transformace (Increment, SERVER_TIMESTAMP) platí i ve vnořených mapách
+        child = node.get(key) if merge and isinstance(node.get(key), dict) else {}
+        for child_key, child_value in value.items():
+            _put(child, child_key, child_value, now, merge)
+        node[key] = child
+    else:
+        node[key] = copy.deepcopy(value)
+
+
+def _merged(current, data, now):
+    result = copy.deepcopy(current) if current else {}
+    for key, value in data.items():
+        _put(result, key, value, now, merge=current is not None)
+    return result
+
+
+class WriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+        self._creates = []
+        self.commit_time = None
+
+    def set(self, reference, data, merge=False):
+        self._writes.append(lambda: reference.set(data, merge=merge))
+
+    def update(self, reference, data):
+        self._writes.append(lambda: reference.update(data))
+
+    def delete(self, reference):
+        self._writes.append(reference.delete)
+
+    def create(self, reference, data):
+        self._creates.append(reference.path)
+        self._writes.append(lambda: reference.set(data))
+
+    def commit(self):
+        from google.api_core import exceptions
+
+        assert len(self._writes) <= 500, len(self._writes)
+        for path in self._creates:
+            if path in self._db.docs:
+                raise exceptions.AlreadyExists(f"Dokument existuje: {'/'.join(path)}")
+        # Zápisy batche se projeví najednou - chyba uprostřed nic nezapíše
+        self.commit_time = self._db.tick()
+        docs = self._db.docs
+        self._db.docs = copy.deepcopy(docs)
+        self._db.now = self.commit_time
+        try:
+            for write in self._writes:
+                write()
+        except BaseException:
+            self._db.docs = docs
+            raise
+        finally:
+            self._db.now = None
+        self._db.commits.append(len(self._writes))
+
+
+class FakeFirestoreClient:
+    """Klient (``FirebaseService._db``) nad slovníkem {cesta: data}"""
+
+    def __init__(self):
+        self.docs = {}
+        self.commits = []
+        self.reads = 0
+        self.ids = itertools.count(1)
+        self.now = None
+        self._clock = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def tick(self):
+        self._clock += timedelta(milliseconds=1)
+        return self._clock
+
+    def apply(self, path, change):
+        value = change(self.now or self.tick())
+        if value is None:
+            self.docs.pop(path, None)
+        else:
+            self.docs[path] = value
+
+    def collection(self, name):
+        return CollectionReference(self, (name,))
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self):
+        return WriteBatch(self)
+
+    def get_all(self, references, transaction=None):
+        return [reference.get() for reference in references]
+
+    def collection_docs(self, *path):
+        """Dokumenty kolekce ``path`` jako {ID: data}"""
+        return {key[-1]: data for key, data in self.docs.items() if key[:-1] == path}
+
+
+def _transactional(function):
+    def run(transaction, *args, **kwargs):
+        result = function(transaction, *args, **kwargs)
+        transaction.commit()
+        return result
+
+    return run
+
+
+class FakeFirestoreModule:
+    """Náhrada modulu ``firebase_admin.firestore`` (``firebase_service._firestore()``)"""
+    SERVER_TIMESTAMP = SERVER_TIMESTAMP
+    Increment = Increment
+    ArrayUnion = ArrayUnion
+    ArrayRemove = ArrayRemove
+    FieldFilter = FieldFilter
+    Query = Query
+    transactional = staticmethod(_transactional)
+
+
+async def started_service(monkeypatch, client: FakeFirestoreClient) -> FirebaseService:
+    """Nová instance ``FirebaseService`` připojená k ``client`` (volat uvnitř event loopu)"""
+    import asyncio
+
+    monkeypatch.setattr(firebase_service, '_firestore', lambda: FakeFirestoreModule)
+    monkeypatch.setattr(FirebaseService, '_instance', None)
+    service = FirebaseService()
+    service._init_future = asyncio.get_running_loop().create_future()
+    service._init_future.set_result(None)
+    service._db = client
+    return service
@@ -0,0 +1,134 @@
+import random
+
+import pytest
+
+from analytics import UNKNOWN, OrderColumns, district, group_by, metric_alias, parse_metrics
+from datum_utils import parse_datum
+
+METRICS = parse_metrics('count,sum:castka,avg:zisk,min:material,max:fee,sum:palivo')
+
+KEYS = [[], ['druh'], ['klient', 'typ'], ['month', 'district'], ['year', 'druh', 'klient']]
+
+
+def _random_order(rng):
+    zakazka = {
+        'druh': rng.choice(['MvČ', 'Adam', 'Korálek', 'štuky', None, '  ']),
+        'klient': rng.choice(['Novák', 'Dvořák', 'Svoboda', 'Černá', '']),
+        'datum': rng.choice(['11. 4. 2025', '2025-05-02', '1. 12. 2024', '31. 1. 2024', 'zítra', None]),
+        'adresa': rng.choice(['Národní 15, 110 00 Praha 1', 'Hlavní 3, Brno', 'Brno', '', None]),
+    }
+    if rng.random() < 0.7:
+        zakazka['typ'] = rng.choice(['byt', 'dům', 'kancelář'])
+    for field in ('castka', 'zisk', 'material', 'fee', 'palivo'):
+        # Celá čísla a poloviny - součty jsou přesné v libovolném pořadí
+        zakazka[field] = rng.choice([rng.randint(-500, 20000), rng.randint(0, 400) / 2, None, 'n/a', True])
+    return zakazka
+
+
+def _label(value):
+    value = '' if value is None else str(value).strip()
+    return value or UNKNOWN
+
+
+def _labels(zakazka):
+    day = parse_datum(zakazka.get('datum'))
+    return {
+        'druh': _label(zakazka.get('druh')),
+        'klient': _label(zakazka.get('klient')),
+        'typ': _label(zakazka.get('typ')),
+        'month': f"{day.year:04d}-{day.month:02d}" if day else UNKNOWN,
+        'year': f"{day.year:04d}" if day else UNKNOWN,
+        'district': district(zakazka.get('adresa')),
+    }
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _reduce(orders, keys, metrics):
+    """Referenční seskupení v čistém Pythonu - skupiny seřazené podle popisků"""
+    groups = {}
+    for zakazka in orders.values():
+        labels = _labels(zakazka)
+        groups.setdefault(tuple(labels[key] for key in keys), []).append(zakazka)
+    output = []
+    for labels, members in sorted(groups.items()):
+        group = dict(zip(keys, labels))
+        for op, field in metrics:
+            values = [_number(zakazka.get(field)) for zakazka in members] if field else []
+            values = [value for value in values if value is not None]
+            if op == 'count':
+                result = len(members)
+            elif op == 'sum':
+                result = sum(values)
+            elif not values:
+                result = None
+            else:
+                result = {'avg': lambda v: sum(v) / len(v), 'min': min, 'max': max}[op](values)
+            if isinstance(result, float):
+                result = int(result) if result.is_integer() else round(result, 6)
+            group[metric_alias((op, field))] = result
+        output.append(group)
+    return output
+
+
+def _assert_matches(columns, orders):
+    assert len(columns) == len(orders)
+    for keys in KEYS:
+        result = group_by(columns, keys, METRICS)
+        expected = _reduce(orders, keys, METRICS)
+        assert result['groups'] == expected, keys
+        assert (result['total_groups'], result['orders']) == (len(expected), len(orders))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_group_by_matches_python_reducer(seed):
+    rng = random.Random(seed)
+    orders = {f'z{i}': _random_order(rng) for i in range(rng.randint(1, 150))}
+    _assert_matches(OrderColumns.from_orders([dict(zakazka, id=zakazka_id) for zakazka_id, zakazka in orders.items()]), orders)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_group_by_matches_after_upserts_deletes_and_compaction(seed):
+    rng = random.Random(seed)
+    orders = {f'z{i}': _random_order(rng) for i in range(120)}
+    columns = OrderColumns.from_orders([dict(zakazka, id=zakazka_id) for zakazka_id, zakazka in orders.items()])
+    compacted = False
+    for step in range(400):
+        action = rng.random()
+        if action < 0.4 and orders:
+            zakazka_id = rng.choice(sorted(orders))
+            del orders[zakazka_id]
+            size = columns.size
+            columns.delete(zakazka_id)
+            compacted |= columns.size < size
+        elif action < 0.7 and orders:
+            # Částečná úprava přepíše jen předaná pole
+            zakazka_id = rng.choice(sorted(orders))
+            changes = {field: value for field, value in _random_order(rng).items() if rng.random() < 0.4}
+            orders[zakazka_id] = dict(orders[zakazka_id], **changes)
+            columns.upsert(zakazka_id, changes)
+        else:
+            zakazka_id = f'n{step}'
+            orders[zakazka_id] = _random_order(rng)
+            columns.upsert(zakazka_id, orders[zakazka_id])
+        if step % 50 == 49:
+            _assert_matches(columns, orders)
+    assert compacted
+    _assert_matches(columns, orders)
+
+
+def test_group_by_sort_and_limit_follow_reducer():
+    rng = random.Random(7)
+    orders = {f'z{i}': _random_order(rng) for i in range(80)}
+    columns = OrderColumns.from_orders([dict(zakazka, id=zakazka_id) for zakazka_id, zakazka in orders.items()])
+    expected = _reduce(orders, ['klient', 'druh'], METRICS)
+    # Stabilní řazení: shodné hodnoty zůstanou v pořadí popisků, skupiny bez hodnoty na konci
+    for column, descending in (('avg_zisk', True), ('min_material', False), ('klient', True)):
+        with_value = [group for group in expected if group[column] is not None]
+        ordered = sorted(with_value, key=lambda group: group[column], reverse=descending)
+        ordered += [group for group in expected if group[column] is None]
+        result = group_by(columns, ['klient', 'druh'], METRICS, sort=(column, descending), limit=5)
+        assert result['groups'] == ordered[:5], column
+        assert result['total_groups'] == len(expected)
@@ -0,0 +1,54 @@
+import asyncio
+
+from tests.fake_firestore import FakeFirestoreClient, started_service
+
+ZAKAZKY = [
+    {'datum': '3. 2. 2025', 'druh': 'malování', 'klient': 'Novák', 'castka': 12000, 'fee': 500, 'material': 1500},
+    {'datum': '10. 2. 2025', 'druh': 'štuky', 'klient': 'Dvořák', 'castka': 8000, 'fee': 0, 'material': 900},
+    {'datum': '2. 3. 2025', 'druh': 'malování', 'klient': 'Svoboda', 'castka': 5000, 'fee': 200, 'material': 300},
+]
+
+
+async def _service_with_zakazky(monkeypatch):
+    service = await started_service(monkeypatch, FakeFirestoreClient())
+    created = await service.add_zakazky_batch('u1', [dict(zakazka) for zakazka in ZAKAZKY])
+    assert await service.rebuild_aggregates('u1')
+    return service, [result['zakazka_id'] for result in created]
+
+
+async def _dashboard(service):
+    dashboard = await service.get_dashboard('u1')
+    del dashboard['rebuilt_at'], dashboard['updated_at']
+    return dashboard
+
+
+async def _rebuilt_dashboard(service):
+    assert await service.rebuild_aggregates('u1')
+    return await _dashboard(service)
+
+
+def test_repeated_id_in_batch_delete_is_subtracted_once(monkeypatch):
+    async def scenario():
+        service, ids = await _service_with_zakazky(monkeypatch)
+        results = await service.delete_zakazky_batch('u1', [ids[0], ids[0], ids[1]])
+        return results, await _dashboard(service), await _rebuilt_dashboard(service)
+
+    results, dashboard, rebuilt = asyncio.run(scenario())
+    assert [result['status'] for result in results] == ['deleted', 'invalid', 'deleted']
+    assert 'vícekrát' in results[1]['errors'][0]['msg']
+    # Přírůstkový souhrn = souhrn přepočítaný ze zbylé zakázky
+    assert dashboard == rebuilt
+    assert dashboard['pocetZakazek'] == 1
+
+
+def test_repeated_id_in_batch_update_writes_first_occurrence(monkeypatch):
+    async def scenario():
+        service, ids = await _service_with_zakazky(monkeypatch)
+        results = await service.update_zakazky_batch('u1', [(ids[0], {'castka': 20000}), (ids[0], {'castka': 1})])
+        stored = service._db.collection_docs('users', 'u1', 'zakazky')[ids[0]]
+        return results, stored, await _dashboard(service), await _rebuilt_dashboard(service)
+
+    results, stored, dashboard, rebuilt = asyncio.run(scenario())
+    assert [result['status'] for result in results] == ['updated', 'invalid']
+    assert stored['castka'] == 20000
+    assert dashboard == rebuilt
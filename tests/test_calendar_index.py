@@ -0,0 +1,87 @@
+import random
+from datetime import date, timedelta
+
+from calendar_index import CalendarIndex, interval
+from datum_utils import epoch_day
+
+BASE = date(2025, 1, 1)
+
+
+def _random_order(rng, zakazka_id):
+    start = BASE + timedelta(days=rng.randrange(200))
+    zakazka = {'id': zakazka_id, 'datum': f"{start.day}. {start.month}. {start.year}"}
+    kind = rng.random()
+    if kind < 0.4:
+        zakazka['doba_realizace'] = rng.choice([2, 3, 7, 8, 31, 40, 400])
+    elif kind < 0.6:
+        zakazka['endDate'] = (start + timedelta(days=rng.randrange(-2, 60))).isoformat()
+    elif kind < 0.65:
+        zakazka['datum'] = 'neznámé'
+    if rng.random() < 0.3:
+        zakazka['idZakazky'] = 'CAL-1'
+    return zakazka
+
+
+def _brute(zakazky, date_from, date_to):
+    first, end = epoch_day(date_from), epoch_day(date_to) + 1
+    found = []
+    for zakazka in zakazky.values():
+        span = interval(zakazka)
+        if span is not None and span[0] < end and span[1] > first:
+            found.append(zakazka['id'])
+    return sorted(found)
+
+
+def test_spans_match_brute_force_under_writes():
+    rng = random.Random(19)
+    zakazky = {f'z{i}': _random_order(rng, f'z{i}') for i in range(150)}
+    index = CalendarIndex.from_orders(zakazky.values())
+    for step in range(400):
+        action = rng.random()
+        if action < 0.3:
+            zakazka_id = f'n{step}'
+            zakazky[zakazka_id] = _random_order(rng, zakazka_id)
+            index.upsert(zakazka_id, zakazky[zakazka_id])
+        elif action < 0.6:
+            zakazka_id = rng.choice(sorted(zakazky))
+            change = {k: v for k, v in _random_order(rng, zakazka_id).items() if k != 'id'}
+            zakazky[zakazka_id] = dict(zakazky[zakazka_id], **change)
+            index.upsert(zakazka_id, change)
+        elif action < 0.75:
+            zakazka_id = rng.choice(sorted(zakazky))
+            del zakazky[zakazka_id]
+            index.delete(zakazka_id)
+        date_from = BASE + timedelta(days=rng.randrange(-30, 260))
+        date_to = date_from + timedelta(days=rng.randrange(0, 40))
+        got = [zakazka['id'] for _, zakazka in index.spans(date_from, date_to)]
+        assert sorted(got) == _brute(zakazky, date_from, date_to)
+    assert len(index) == len(zakazky)
+
+
+def test_interval_rules():
+    assert interval({'datum': '1. 1. 1970'}) == (0, 1)
+    assert interval({'datum': '1. 1. 1970', 'doba_realizace': 5}) == (0, 5)
+    assert interval({'datum': '1. 1. 1970', 'endDate': '1970-01-03'}) == (0, 3)
+    assert interval({'datum': '3. 1. 1970', 'endDate': '1970-01-01'}) == (2, 3)
+    assert interval({'datum': ''}) is None
+
+
+def test_query_calendar_only_and_order():
+    index = CalendarIndex.from_orders([
+        {'id': 'b', 'datum': '2. 4. 2025', 'idZakazky': 'CAL-2'},
+        {'id': 'a', 'datum': '1. 4. 2025', 'calendar_origin': True, 'doba_realizace': 3},
+        {'id': 'c', 'datum': '2. 4. 2025', 'idZakazky': 'Z3'},
+    ])
+    assert [z['id'] for z in index.query(date(2025, 4, 2), date(2025, 4, 2))] == ['a', 'b']
+    assert [z['id'] for z in index.query(date(2025, 4, 2), date(2025, 4, 2), calendar_only=False)] == ['a', 'b', 'c']
+    assert index.query(date(2025, 4, 4), date(2025, 4, 30)) == []
+
+
+def test_deferred_writes_apply_in_order():
+    index = CalendarIndex.from_orders([{'id': 'a', 'datum': '1. 4. 2025'}])
+    index.defer('created', 'b', {'datum': '2. 4. 2025'})
+    index.defer('deleted', 'a', None)
+    assert index.pending_exists('a') is False
+    assert index.pending_exists('c') is None
+    assert index.apply_pending() == 2
+    assert [z['id'] for z in index.query(date(2025, 4, 1), date(2025, 4, 30), calendar_only=False)] == ['b']
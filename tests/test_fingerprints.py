@@ -0,0 +1,92 @@
+import unicodedata
+from datetime import datetime, timezone
+
+import pytest
+
+from fingerprints import fingerprint, group_duplicates, split_duplicates, stored_fingerprint, touches_fingerprint
+
+BASE = {'datum': '11. 4. 2025', 'klient': 'Jan Novák', 'castka': 1500, 'druh': 'MvČ', 'adresa': 'Národní 15, Praha 1'}
+
+
+@pytest.mark.parametrize('changes', [
+    {'datum': '2025-04-11'},
+    {'datum': '11.4.2025'},
+    {'datum': '11. 04. 2025'},
+    {'castka': 1500.0},
+    {'castka': '1500.00'},
+    {'klient': '  jan   NOVÁK '},
+    {'druh': 'mvč', 'adresa': 'národní 15,\tpraha 1'},
+    # Složené a rozložené ("a" + háček) písmeno je tentýž text
+    {'klient': 'Jan Novák'},
+    # Pole mimo otisk ho nemění
+    {'zisk': 900, 'poznamka': 'jiná', 'updated_at': 'dnes'},
+])
+def test_fingerprint_normalizes_equivalent_orders(changes):
+    assert fingerprint(dict(BASE, **changes)) == fingerprint(BASE)
+
+
+@pytest.mark.parametrize('changes', [
+    {'datum': '12. 4. 2025'},
+    {'datum': '2025-11-04'},
+    {'castka': 1500.5},
+    {'castka': 15000},
+    {'klient': 'Jana Nováková'},
+    {'druh': 'Adam'},
+    {'adresa': None},
+])
+def test_fingerprint_differs_for_other_orders(changes):
+    assert fingerprint(dict(BASE, **changes)) != fingerprint(BASE)
+
+
+def test_fingerprint_keeps_unparsed_values_apart():
+    # Nerozpoznané datum se porovnává jako text, chybějící pole jako prázdný text
+    assert fingerprint(dict(BASE, datum='zítra')) == fingerprint(dict(BASE, datum=' ZÍTRA '))
+    assert fingerprint(dict(BASE, datum='zítra')) != fingerprint(dict(BASE, datum=None))
+    assert fingerprint({}) == fingerprint({'datum': None, 'klient': '', 'castka': None})
+    # Logická hodnota není částka 1
+    assert fingerprint(dict(BASE, castka=True)) != fingerprint(dict(BASE, castka=1))
+
+
+def test_touches_fingerprint_and_stored_value():
+    assert touches_fingerprint(['zisk', 'castka'])
+    assert not touches_fingerprint(['zisk', 'poznamka'])
+    assert stored_fingerprint({'fingerprint': 'abc'}) == 'abc'
+    assert stored_fingerprint(None) is None
+
+
+def test_group_duplicates_by_fingerprint():
+    zakazky = [
+        dict(BASE, id='a'),
+        dict(BASE, id='b', datum='2025-04-11', klient='JAN NOVÁK'),
+        dict(BASE, id='c', castka=2000),
+        dict(BASE, id='d', castka=1500.0),
+    ]
+    groups = group_duplicates(zakazky)
+    assert sorted([z['id'] for z in group] for group in groups.values()) == [['a', 'b', 'd'], ['c']]
+    assert groups[fingerprint(BASE)][0]['id'] == 'a'
+
+
+def _stamp(day):
+    return datetime(2025, 4, day, 8, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize('group, keep', [
+    # Nejdříve upravená zůstane
+    ([{'id': 'a', 'updated_at': _stamp(3)}, {'id': 'b', 'updated_at': _stamp(1)}, {'id': 'c', 'updated_at': _stamp(2)}], 'b'),
+    # Při shodném čase rozhoduje nejmenší ID (jako MIN(id) v SQL)
+    ([{'id': 'b', 'updated_at': _stamp(1)}, {'id': 'a', 'updated_at': _stamp(1)}], 'a'),
+    # Zakázky bez updated_at jsou až za těmi s časem, mezi sebou podle ID
+    ([{'id': 'a'}, {'id': 'c', 'updated_at': _stamp(5)}, {'id': 'b'}], 'c'),
+    ([{'id': 'z'}, {'id': 'y', 'updated_at': None}], 'y'),
+])
+def test_split_duplicates_keeps_oldest(group, keep):
+    kept, extra = split_duplicates(group)
+    assert kept['id'] == keep
+    assert sorted(z['id'] for z in extra) == sorted(z['id'] for z in group if z['id'] != keep)
+
+
+def test_split_duplicates_order_of_extras_is_stable():
+    group = [{'id': 'c'}, {'id': 'a', 'updated_at': _stamp(2)}, {'id': 'b', 'updated_at': _stamp(1)}]
+    kept, extra = split_duplicates(group)
+    assert (kept['id'], [z['id'] for z in extra]) == ('b', ['a', 'c'])
+    assert split_duplicates(list(reversed(group)))[0]['id'] == 'b'
@@ -0,0 +1,60 @@
+import itertools
+import json
+import os
+
+import pytest
+
+import zakazky_query
+from datum_utils import DATUM_DAY_FIELD, DATUM_ISO_FIELD
+from zakazky_query import FILTERED_ORDER_FIELDS, ORDERABLE_FIELDS, QueryError, ZakazkyFilter, parse_cursor_args
+
+INDEXES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'firestore.indexes.json')
+
+
+def _indexes():
+    with open(INDEXES_PATH, encoding='utf-8') as f:
+        config = json.load(f)
+    return {
+        tuple((field['fieldPath'], field['order']) for field in index['fields'])
+        for index in config['indexes']
+        if index['collectionGroup'] == 'zakazky'
+    }
+
+
+def _required(equality, order_field, descending, date_range):
+    """Pole složeného indexu pro dotaz výpisu (rovnost, řazení, implicitní řazení podle rozsahu)"""
+    direction = 'DESCENDING' if descending else 'ASCENDING'
+    fields = [(field, 'ASCENDING') for field in equality]
+    if order_field != '__name__':
+        fields.append((order_field, direction))
+    if date_range and order_field != DATUM_DAY_FIELD:
+        fields.append((DATUM_DAY_FIELD, direction))
+    return tuple(fields)
+
+
+@pytest.mark.parametrize('equality', [(), ('druh',), ('klient',), ('druh', 'klient')])
+@pytest.mark.parametrize('date_range', [False, True])
+@pytest.mark.parametrize('descending', [False, True])
+def test_every_accepted_filtered_ordering_has_an_index(equality, date_range, descending):
+    indexes = _indexes()
+    for field in FILTERED_ORDER_FIELDS | {DATUM_ISO_FIELD, DATUM_DAY_FIELD}:
+        required = _required(equality, field, descending, date_range)
+        # Jedno pole pokryjí automatické jednopolové indexy
+        if len(required) > 1:
+            assert required in indexes, required
+
+
+def test_raw_datum_is_not_indexed():
+    assert not any(field == 'datum' for index in _indexes() for field, _ in index)
+
+
+def test_uncovered_filtered_ordering_is_rejected(monkeypatch):
+    for field, druh in itertools.product(sorted(ORDERABLE_FIELDS - FILTERED_ORDER_FIELDS), ('MvČ', None)):
+        filters = ZakazkyFilter.from_params(druh=druh, date_from='1. 4. 2025')
+        monkeypatch.setattr(zakazky_query, 'DATE_PUSHDOWN', druh is None)
+        with pytest.raises(QueryError):
+            parse_cursor_args(f'-{field}', None, filters)
+    monkeypatch.setattr(zakazky_query, 'DATE_PUSHDOWN', False)
+    # Rozsah data vyhodnocený v paměti na řazení nemá vliv
+    assert parse_cursor_args('fee', None, ZakazkyFilter.from_params(date_from='1. 4. 2025'))[0] == 'fee'
+    assert parse_cursor_args('-castka', None, ZakazkyFilter.from_params(klient='Novák'))[:2] == ('castka', True)
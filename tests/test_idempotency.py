@@ -0,0 +1,121 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+import idempotency
+from idempotency import IdempotencyError, IdempotencyKeys, MemoryIdempotencyStore, key_id, request_hash
+
+
+def _keys(**kwargs):
+    return IdempotencyKeys(MemoryIdempotencyStore(), ttl=60, **kwargs)
+
+
+def test_replay_returns_stored_response():
+    async def scenario():
+        keys = _keys()
+        assert await keys.begin('u1', 'k', 'h') is None
+        await keys.finish('u1', 'k', 'h', 200, {'zakazka_id': 'z1'})
+        assert await keys.begin('u1', 'k', 'h') == (200, {'zakazka_id': 'z1'})
+        # Klíče jsou po uživatelích
+        assert await keys.begin('u2', 'k', 'h') is None
+        return keys.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats['stored'], stats['replayed']) == (1, 1)
+
+
+def test_key_reused_for_other_request_or_while_running():
+    async def scenario():
+        keys = _keys()
+        await keys.begin('u1', 'k', 'h')
+        with pytest.raises(IdempotencyError) as running:
+            await keys.begin('u1', 'k', 'h')
+        with pytest.raises(IdempotencyError) as other:
+            await keys.begin('u1', 'k', 'other')
+        return running.value.status_code, other.value.status_code
+
+    assert asyncio.run(scenario()) == (409, 422)
+
+
+def test_abort_releases_key():
+    async def scenario():
+        keys = _keys()
+        await keys.begin('u1', 'k', 'h')
+        await keys.abort('u1', 'k')
+        return await keys.begin('u1', 'k', 'h')
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_expired_lock_can_be_taken_over():
+    async def scenario():
+        keys = _keys(lock_ttl=0.05)
+        await keys.begin('u1', 'k', 'h')
+        await asyncio.sleep(0.1)
+        return await keys.begin('u1', 'k', 'h')
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_hold_renews_lock_while_work_runs():
+    async def scenario():
+        keys = _keys(lock_ttl=0.06)
+        await keys.begin('u1', 'k', 'h')
+        async with keys.hold('u1', 'k', 'h'):
+            await asyncio.sleep(0.2)
+            with pytest.raises(IdempotencyError):
+                await keys.begin('u1', 'k', 'h')
+        await keys.finish('u1', 'k', 'h', 201, {'ok': True})
+        return keys.stats()['renewed'], await keys.begin('u1', 'k', 'h')
+
+    renewed, replay = asyncio.run(scenario())
+    assert renewed > 0
+    assert replay == (201, {'ok': True})
+
+
+def test_renew_does_not_touch_finished_or_foreign_record():
+    async def scenario():
+        store = MemoryIdempotencyStore()
+        keys = IdempotencyKeys(store, ttl=60)
+        await keys.begin('u1', 'k', 'h')
+        expires_at = idempotency._now() + timedelta(hours=1)
+        foreign = await store.renew('u1', key_id('k'), 'other', expires_at)
+        await keys.finish('u1', 'k', 'h', 200, {})
+        finished = await store.renew('u1', key_id('k'), 'h', expires_at)
+        return foreign, finished
+
+    assert asyncio.run(scenario()) == (False, False)
+
+
+def test_too_large_response_is_not_stored_but_not_repeated(monkeypatch):
+    monkeypatch.setattr(idempotency, 'MAX_STORED_RESPONSE_BYTES', 10)
+
+    async def scenario():
+        keys = _keys()
+        await keys.begin('u1', 'k', 'h')
+        await keys.finish('u1', 'k', 'h', 200, {'data': list(range(1000))})
+        return await keys.begin('u1', 'k', 'h')
+
+    status_code, body = asyncio.run(scenario())
+    assert status_code == 200
+    assert 'detail' in body
+
+
+def test_invalid_key_and_request_hash():
+    with pytest.raises(IdempotencyError):
+        asyncio.run(_keys().begin('u1', '', 'h'))
+    assert request_hash('post', '/a', '', b'{}') == request_hash('POST', '/a', '', b'{}')
+    assert request_hash('POST', '/a', 'x=1', b'') != request_hash('POST', '/a', '', b'x=1')
+
+
+def test_memory_store_evicts_oldest_keys():
+    async def scenario():
+        keys = IdempotencyKeys(MemoryIdempotencyStore(max_keys=2), ttl=60)
+        for key in ('a', 'b', 'c'):
+            await keys.begin('u1', key, 'h')
+            await keys.finish('u1', key, 'h', 200, {'key': key})
+        evictions = keys.stats()['evictions']
+        return evictions, await keys.begin('u1', 'a', 'h'), await keys.begin('u1', 'c', 'h')
+
+    assert asyncio.run(scenario()) == (1, None, (200, {'key': 'c'}))
@@ -0,0 +1,124 @@
+import asyncio
+import math
+import threading
+
+import analytics
+from analytics import DIMENSIONS, NUMERIC_FIELDS, OrderColumns
+from order_store import OrderStore
+from tests.fake_firestore import FakeFirestoreClient, started_service
+
+ZAKAZKY = [
+    {'id': f'z{i}', 'datum': f'{i % 28 + 1}. 4. 2025', 'druh': ['MvČ', 'Adam'][i % 2], 'klient': f'k{i % 3}',
+     'castka': 1000 * i, 'zisk': 400 * i, 'adresa': f'Ulice {i}, Brno'}
+    for i in range(1, 9)
+]
+
+
+def _content(columns):
+    """Obsah kopie nezávislý na rozložení řádků: {ID: (čísla, popisky, kalendář)}"""
+    with columns.lock:
+        columns.apply_pending()
+        calendar = columns.calendar
+        content = {}
+        for zakazka_id, row in columns._rows.items():
+            numbers = tuple(
+                None if math.isnan(columns.numeric[field][row]) else float(columns.numeric[field][row])
+                for field in NUMERIC_FIELDS
+            )
+            labels = tuple(columns.labels[dim][columns.codes[dim][row]] for dim in DIMENSIONS)
+            content[zakazka_id] = (numbers, labels, int(columns.days[row]), bool(calendar[row]))
+        return content
+
+
+def _fresh(client):
+    docs = client.collection_docs('users', 'u1', 'zakazky')
+    return _content(OrderColumns.from_orders([dict(data, id=zakazka_id) for zakazka_id, data in docs.items()]))
+
+
+def _seed(client):
+    for zakazka in ZAKAZKY:
+        data = dict(zakazka)
+        client.docs[('users', 'u1', 'zakazky', data.pop('id'))] = data
+
+
+def test_build_interrupted_by_writes_is_rebuilt(monkeypatch):
+    client = FakeFirestoreClient()
+    _seed(client)
+    build = OrderColumns.from_orders
+
+    async def scenario():
+        service = await started_service(monkeypatch, client)
+        loop = asyncio.get_running_loop()
+
+        async def _writes():
+            await service.update_zakazka('u1', 'z1', {'castka': 99000, 'druh': 'Korálek'})
+            await service.delete_zakazka('u1', 'z2')
+            await service.add_zakazka('u1', {'datum': '1. 5. 2025', 'druh': 'Adam', 'klient': 'k9', 'castka': 700})
+
+        def _build_with_writes(orders):
+            # Zápisy doběhnou v event loopu, zatímco se kopie staví ve vlákně ze starších dat
+            asyncio.run_coroutine_threadsafe(_writes(), loop).result()
+            return build(orders)
+
+        monkeypatch.setattr(analytics.OrderColumns, 'from_orders', _build_with_writes)
+        stale = await service.get_order_columns('u1')
+        monkeypatch.setattr(analytics.OrderColumns, 'from_orders', build)
+        # Stavba, během které se zapisovalo, se do store neuloží
+        assert service._orders.get('u1') is None
+        return stale, await service.get_order_columns('u1'), service
+
+    stale, columns, service = asyncio.run(scenario())
+    assert 'z2' in stale and 'z2' not in columns
+    assert _content(columns) == _fresh(client)
+    assert service._orders.get('u1') is columns
+
+
+def test_writes_deferred_while_columns_are_locked(monkeypatch):
+    client = FakeFirestoreClient()
+    _seed(client)
+
+    async def scenario():
+        service = await started_service(monkeypatch, client)
+        columns = await service.get_order_columns('u1')
+        # Výpočet ve vlákně drží zámek - zápisy se jen zařadí do fronty
+        locked, release = threading.Event(), threading.Event()
+
+        def _hold():
+            with columns.lock:
+                locked.set()
+                release.wait()
+
+        holder = threading.Thread(target=_hold)
+        holder.start()
+        locked.wait()
+        try:
+            await service.update_zakazka('u1', 'z3', {'castka': 1, 'adresa': 'Náměstí 1, 602 00 Brno'})
+            await service.delete_zakazka('u1', 'z4')
+            created = await service.add_zakazka('u1', {'datum': '2025-06-01', 'klient': 'k5', 'castka': 300})
+            await service.update_zakazka('u1', created, {'zisk': 120})
+            await service.delete_zakazka('u1', 'z5')
+            await service.add_zakazka('u1', {'datum': '2. 6. 2025', 'klient': 'k5', 'castka': 400, 'idZakazky': 'CAL-7'})
+            assert 'z4' in columns and created not in columns
+            deferred = service._orders.stats()['deferred']
+        finally:
+            release.set()
+            holder.join()
+        return columns, deferred, service
+
+    columns, deferred, service = asyncio.run(scenario())
+    assert deferred == 6
+    # Čtenář promítne frontu a dostane totéž co nová stavba z Firestore
+    assert _content(columns) == _fresh(client)
+    assert service._orders.get('u1') is columns
+
+
+def test_put_rejects_build_older_than_write():
+    store = OrderStore(ttl=60)
+    generation = store.generation('u1')
+    store.apply_write('u1', 'created', 'z1', {'castka': 1})
+    assert not store.put('u1', OrderColumns.from_orders([]), generation)
+    assert store.get('u1') is None
+    # Změna uživatelského dokumentu stavbu nezneplatní
+    generation = store.generation('u1')
+    store.apply_write('u1', 'user', None, {'jmeno': 'x'})
+    assert store.put('u1', OrderColumns.from_orders([]), generation)
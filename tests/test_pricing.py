@@ -0,0 +1,88 @@
+import random
+from datetime import date
+
+import pytest
+
+import pricing
+from datum_utils import epoch_day
+from pricing import HAS_FEE_FIELD, PRICING_VERSION_FIELD, PricingVersion, price, reprice, stale_prices, version_for
+
+VERSIONS = (
+    PricingVersion(1, date(2000, 1, 1), 0.261),
+    PricingVersion(2, date(2025, 1, 1), 0.3),
+    PricingVersion(3, date(2025, 7, 1), 0.25),
+)
+
+
+@pytest.fixture
+def versions(monkeypatch):
+    monkeypatch.setattr(pricing, 'PRICING_VERSIONS', VERSIONS)
+    monkeypatch.setattr(pricing, '_VALID_FROM_DAYS', [epoch_day(version.valid_from) for version in VERSIONS])
+
+
+@pytest.mark.parametrize('day, expected', [
+    (date(1999, 12, 31), 1),
+    (date(2000, 1, 1), 1),
+    (date(2024, 12, 31), 1),
+    (date(2025, 1, 1), 2),
+    (date(2025, 6, 30), 2),
+    (date(2025, 7, 1), 3),
+    (None, 3),
+])
+def test_version_for_date(versions, day, expected):
+    assert version_for(epoch_day(day) if day else None).version == expected
+
+
+def test_price_uses_rate_valid_at_order_date(versions):
+    zakazka = {'castka': 10000, 'material': 500, 'pomocnik': 1000, 'palivo': 250, HAS_FEE_FIELD: True}
+    assert price(dict(zakazka, datum='31. 12. 2024')) == {
+        'fee': 2610.0, 'zisk': 5640.0, HAS_FEE_FIELD: True, PRICING_VERSION_FIELD: 1,
+    }
+    assert price(dict(zakazka, datum='2025-03-01'))['fee'] == 3000.0
+    assert price(dict(zakazka, datum='1. 7. 2025', hasFee=False))['zisk'] == 8250.0
+
+
+def test_fee_rounds_half_up():
+    assert price({'castka': 50, 'fee': 1})['fee'] == 13.0  # 13.05
+    assert price({'castka': 2, HAS_FEE_FIELD: True})['fee'] == 1.0  # 0.522
+
+
+def test_reprice_treats_sent_fee_as_choice():
+    old = {'castka': 1000, 'datum': '1. 4. 2025', HAS_FEE_FIELD: True, 'fee': 261, 'zisk': 739}
+    assert reprice(old, {'fee': 0}) == {'fee': 0.0, 'zisk': 1000.0, HAS_FEE_FIELD: False, PRICING_VERSION_FIELD: 1}
+    assert reprice(old, {'castka': 2000})['fee'] == 522.0
+
+
+def test_vectorized_prices_match_scalar(versions):
+    rng = random.Random(23)
+    orders = []
+    for _ in range(500):
+        zakazka = {
+            'castka': rng.choice([0, 1, 999, 10000, 12345.5, -100, 'x']),
+            'datum': rng.choice(['1. 1. 2020', '31. 12. 2024', '2025-01-01', '15. 8. 2025', '', 'brzy']),
+            'fee': rng.choice([0, 100, None]),
+            PRICING_VERSION_FIELD: rng.choice([1, 2, 3]),
+        }
+        if rng.random() < 0.5:
+            zakazka[HAS_FEE_FIELD] = rng.random() < 0.5
+        for field in pricing.COST_FIELDS:
+            zakazka[field] = rng.choice([0, 100, 2000.5])
+        if rng.random() < 0.5:
+            zakazka.update(price(zakazka))
+        orders.append(zakazka)
+
+    changed = dict(stale_prices(orders))
+    for position, zakazka in enumerate(orders):
+        expected = price(zakazka)
+        if position in changed:
+            assert changed[position] == expected
+        else:
+            assert {field: zakazka.get(field) for field in pricing.PRICING_FIELDS} == expected
+
+
+def test_legacy_orders_are_left_alone_by_default():
+    orders = [{'castka': 1000, 'datum': '1. 4. 2019', 'fee': 300, 'zisk': 700}]
+    assert stale_prices(orders) == []
+    assert stale_prices(orders, include_legacy=True) == [
+        (0, {'fee': 261.0, 'zisk': 739.0, HAS_FEE_FIELD: True, PRICING_VERSION_FIELD: 1}),
+    ]
@@ -0,0 +1,112 @@
+import asyncio
+import random
+from datetime import date
+
+import pytest
+
+from datum_utils import epoch_day, from_epoch_day
+from scheduling import Job, crew_size, order_warnings, sweep
+
+BASE = epoch_day(date(2025, 1, 1))
+
+
+def _brute(jobs, capacity, first, end):
+    """Překryvy a přetížené dny hrubou silou (dvojice zakázek, den po dni)"""
+    pairs = set()
+    for i, job in enumerate(jobs):
+        for other in jobs[i + 1:]:
+            start, stop = max(job.start, other.start), min(job.end, other.end)
+            if start < stop and stop > first and start < end:
+                pairs.add(frozenset((job.zakazka_id, other.zakazka_id)))
+    loads = {}
+    for job in jobs:
+        for day in range(max(job.start, first), min(job.end, end)):
+            loads[day] = loads.get(day, 0) + job.crew
+    return pairs, {day: load for day, load in loads.items() if load > capacity}
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_sweep_matches_brute_force(seed):
+    rng = random.Random(seed)
+    jobs = []
+    for i in range(rng.randrange(1, 60)):
+        start = BASE + rng.randrange(100)
+        jobs.append(Job(start, start + rng.choice([1, 1, 2, 3, 7, 30]), f'z{i}', rng.choice([1, 2])))
+    capacity = rng.choice([1, 2, 3])
+    date_from = date_to = None
+    first, end = -10 ** 9, 10 ** 9
+    if seed % 2:
+        first = BASE + rng.randrange(100)
+        end = first + rng.randrange(30) + 1
+        date_from, date_to = from_epoch_day(first), from_epoch_day(end - 1)
+
+    report = sweep(jobs, capacity, date_from, date_to, max_overlaps=None)
+    pairs, overloaded = _brute(jobs, capacity, first, end)
+
+    assert {frozenset(overlap['zakazky']) for overlap in report['overlaps']} == pairs
+    assert report['overlaps_total'] == len(pairs)
+    days = {}
+    for overrun in report['overruns']:
+        for day in range(epoch_day(date.fromisoformat(overrun['from'])), epoch_day(date.fromisoformat(overrun['to'])) + 1):
+            assert day not in days
+            days[day] = overrun['load']
+    assert days == overloaded
+
+
+def test_overlaps_are_truncated_but_counted():
+    jobs = [Job(BASE, BASE + 10, f'z{i}', 1) for i in range(6)]
+    report = sweep(jobs, capacity=10, max_overlaps=4)
+    assert len(report['overlaps']) == 4
+    assert report['overlaps_total'] == 15
+    assert report['truncated']
+
+
+def test_crew_size():
+    assert crew_size({'pomocnik': 1500}) == 2
+    assert crew_size({'pomocnik': 0}) == 1
+    assert crew_size({'pomocnik': '1500'}) == 1
+
+
+def test_order_warnings():
+    spans = [
+        ((BASE, BASE + 5), {'id': 'a', 'klient': 'A'}),
+        ((BASE + 3, BASE + 4), {'id': 'b', 'klient': 'B', 'pomocnik': 1500}),
+        ((BASE + 5, BASE + 6), {'id': 'c'}),
+    ]
+    warnings = order_warnings(spans, 'b')
+    assert [(w['type'], w.get('zakazka_id'), w['from'], w['to']) for w in warnings] == [
+        ('overlap', 'a', '2025-01-04', '2025-01-04'),
+        ('capacity', None, '2025-01-04', '2025-01-04'),
+    ]
+    assert order_warnings(spans, 'c') == []
+    assert order_warnings(spans, 'missing') == []
+
+
+def test_update_reports_whether_schedule_was_checked(monkeypatch):
+    import firebase_service
+    import server
+    from tests.fake_firestore import FakeFirestoreClient, started_service
+
+    # Bez pushdownu se se studeným indexem kalendáře kontrola vynechá
+    monkeypatch.setattr(firebase_service, 'DATE_PUSHDOWN', False)
+    client = FakeFirestoreClient()
+    for zakazka_id, datum in (('a', '3. 2. 2025'), ('b', '5. 2. 2025')):
+        client.docs[('users', 'u1', 'zakazky', zakazka_id)] = {'datum': datum, 'doba_realizace': 3, 'klient': zakazka_id}
+
+    async def scenario():
+        service = await started_service(monkeypatch, client)
+        monkeypatch.setattr(server, 'firebase_service', service)
+        cold = await server.update_zakazka('u1', 'b', server.ZakazkaUpdate(datum='4. 2. 2025'))
+        # Index se mezitím postavil na pozadí
+        for _ in range(200):
+            if service._calendars.get('u1') is not None:
+                break
+            await asyncio.sleep(0.01)
+        warm = await server.update_zakazka('u1', 'b', server.ZakazkaUpdate(datum='4. 2. 2025'))
+        unrelated = await server.update_zakazka('u1', 'b', server.ZakazkaUpdate(castka=100))
+        return cold, warm, unrelated
+
+    cold, warm, unrelated = asyncio.run(scenario())
+    assert (cold['warnings'], cold['schedule_checked']) == ([], False)
+    assert warm['schedule_checked'] and [w['zakazka_id'] for w in warm['warnings']] == ['a']
+    assert (unrelated['warnings'], unrelated['schedule_checked']) == ([], True)
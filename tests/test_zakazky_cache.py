@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+
+import pytest
+
+import zakazky_cache
+from zakazky_cache import ZakazkyCache, estimate_size
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(zakazky_cache, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def _zakazky(*ids):
+    return [{'id': zakazka_id, 'castka': 1000} for zakazka_id in ids]
+
+
+def _fill(cache, user_id, *ids):
+    cache.put(user_id, _zakazky(*ids), cache.generation(user_id))
+
+
+def test_lru_evicts_least_recently_read(clock):
+    cache = ZakazkyCache(max_users=2, ttl=60)
+    _fill(cache, 'a', 'z1')
+    _fill(cache, 'b', 'z2')
+    assert cache.get('a') is not None
+    _fill(cache, 'c', 'z3')
+    # 'b' se četl naposledy nejdřív - vypadne on, ne starší záznam 'a'
+    assert cache.get('b') is None
+    assert [z['id'] for z in cache.get('a')] == ['z1']
+    assert [z['id'] for z in cache.get('c')] == ['z3']
+    assert cache.stats()['evictions'] == {'lru': 1, 'ttl': 0, 'memory': 0}
+
+
+def test_memory_limit_evicts_oldest_and_skips_oversized(clock):
+    size = estimate_size(_zakazky('z1')[0])
+    cache = ZakazkyCache(max_bytes=size * 2, max_users=10, ttl=60)
+    _fill(cache, 'a', 'z1')
+    _fill(cache, 'b', 'z2')
+    _fill(cache, 'c', 'z3')
+    assert cache.get('a') is None and cache.get('b') is not None
+    # Uživatel, který se do limitu nevejde vůbec, se neukládá
+    _fill(cache, 'd', 'z4', 'z5', 'z6')
+    assert cache.get('d') is None
+    assert cache.stats()['bytes'] == size * 2
+    assert cache.stats()['evictions']['memory'] == 1
+
+
+def test_ttl_expiry(clock):
+    cache = ZakazkyCache(ttl=60)
+    _fill(cache, 'a', 'z1')
+    clock.now += 59.9
+    assert cache.get('a') is not None
+    # Čtení TTL neprodlužuje
+    clock.now += 0.1
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert (stats['entries'], stats['bytes'], stats['evictions']['ttl']) == (0, 0, 1)
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+
+def test_write_keeps_entry_fresh_without_extending_ttl(clock):
+    cache = ZakazkyCache(ttl=60)
+    _fill(cache, 'a', 'z1', 'z2')
+    clock.now += 30
+    cache.apply_write('a', 'updated', 'z1', {'castka': 5})
+    cache.apply_write('a', 'deleted', 'z2', None)
+    cache.apply_write('a', 'created', 'z3', {'castka': 7})
+    assert sorted((z['id'], z['castka']) for z in cache.get('a')) == [('z1', 5), ('z3', 7)]
+    assert cache.stats()['bytes'] == sum(estimate_size(z) for z in cache.get('a'))
+    clock.now += 30
+    assert cache.get('a') is None
+
+
+def test_fill_started_before_invalidate_is_not_stored(clock):
+    cache = ZakazkyCache(ttl=60)
+    # Načítání z Firestore začne, během něj se zakázky zneplatní
+    generation = cache.generation('a')
+    cache.invalidate('a')
+    cache.put('a', _zakazky('stara'), generation)
+    assert cache.get('a') is None
+    # Načtení po zneplatnění se uloží
+    _fill(cache, 'a', 'nova')
+    assert [z['id'] for z in cache.get('a')] == ['nova']
+
+
+def test_fill_started_before_write_is_not_stored(clock):
+    cache = ZakazkyCache(ttl=60)
+    _fill(cache, 'a', 'z1')
+    clock.now += 61
+    assert cache.get('a') is None
+    generation = cache.generation('a')
+    # Zápis během načítání - záznam v cache už není, ale generace se zvýší
+    cache.apply_write('a', 'created', 'z2', {'castka': 1})
+    cache.put('a', _zakazky('z1'), generation)
+    assert cache.get('a') is None
+    # Generace jsou po uživatelích
+    other = cache.generation('b')
+    cache.invalidate('a')
+    cache.put('b', _zakazky('z9'), other)
+    assert cache.get('b') is not None
@@ -0,0 +1,79 @@
+import asyncio
+import csv
+import gzip
+import io
+from datetime import date, datetime
+
+import zakazky_export
+from zakazky_export import EXPORT_COLUMNS, FORMAT_CSV, FORMAT_XLSX, csv_chunks, export_filename, gzip_chunks, xlsx_chunks
+from zakazky_import import open_import
+
+ZAKAZKY = [
+    {
+        'id': 'z1', 'datum': '11. 4. 2025', 'druh': 'MvČ', 'klient': 'Novák; syn', 'idZakazky': 'Z-1',
+        'castka': 12000, 'fee': 3132.0, 'zisk': 8868.5, 'adresa': 'Praha\n1', 'doba_realizace': 3,
+        'soubory': ['a.pdf'], 'poznamky': ['první', 'druhá'],
+    },
+    {'id': 'z2', 'datum': 'neznámé', 'druh': 'Adam', 'klient': 'Svoboda\x07', 'castka': 500, 'adresa': 'Brno'},
+]
+
+
+async def _orders(zakazky):
+    for zakazka in zakazky:
+        yield zakazka
+
+
+def _collect(chunks):
+    async def _join():
+        return b''.join([chunk async for chunk in chunks])
+
+    return asyncio.run(_join())
+
+
+def test_csv_format():
+    data = _collect(csv_chunks(_orders(ZAKAZKY)))
+    assert data.startswith(b'\xef\xbb\xbf')
+    assert data.decode('utf-8').split('\r\n', 1)[0].endswith(';Doba realizace;Poznámky')
+    header, first, second = csv.reader(io.StringIO(data.decode('utf-8-sig'), newline=''), delimiter=';')
+    assert header == [header for _, header in EXPORT_COLUMNS]
+    assert first == [
+        '11. 4. 2025', 'MvČ', 'Novák; syn', 'Z-1', '12000', '3132', '', '', '', '', '8868,5', 'Praha\n1', '', '', '3',
+        'první, druhá',
+    ]
+    assert second[:5] == ['neznámé', 'Adam', 'Svoboda\x07', '', '500']
+
+
+def test_xlsx_format(monkeypatch):
+    from openpyxl import load_workbook
+
+    monkeypatch.setattr(zakazky_export, 'MAX_SHEET_ROWS', 2)
+    workbook = load_workbook(io.BytesIO(_collect(xlsx_chunks(_orders(ZAKAZKY)))))
+    assert len(workbook.worksheets) == 2
+    first, second = ([row for row in sheet.iter_rows(values_only=True)] for sheet in workbook.worksheets)
+    assert first[0] == second[0] == tuple(header for _, header in EXPORT_COLUMNS)
+    # Rozpoznané datum je datum Excelu, čísla jsou čísla
+    assert first[1][:6] == (datetime(2025, 4, 11), 'MvČ', 'Novák; syn', 'Z-1', 12000, 3132)
+    assert first[1][-1] == 'první, druhá'
+    assert second[1][:3] == ('neznámé', 'Adam', 'Svoboda')
+
+
+def test_empty_xlsx_has_header_only():
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(_collect(xlsx_chunks(_orders([])))))
+    assert [row for row in workbook.active.iter_rows(values_only=True)] == [tuple(h for _, h in EXPORT_COLUMNS)]
+
+
+def test_export_can_be_imported_again():
+    for file_format, chunks in ((FORMAT_CSV, csv_chunks), (FORMAT_XLSX, xlsx_chunks)):
+        reader = open_import(io.BytesIO(_collect(chunks(_orders(ZAKAZKY[:1])))), file_format)
+        (_, data, errors), = reader.next_chunk()
+        reader.close()
+        assert errors == []
+        assert (data['datum'], data['klient'], data['castka'], data['zisk']) == ('11. 4. 2025', 'Novák; syn', 12000, 8868.5)
+
+
+def test_gzip_and_filename():
+    data = _collect(gzip_chunks(csv_chunks(_orders(ZAKAZKY))))
+    assert gzip.decompress(data) == _collect(csv_chunks(_orders(ZAKAZKY)))
+    assert export_filename(FORMAT_XLSX, gzip=True, today=date(2025, 4, 11)) == 'zakazky-2025-04-11.xlsx.gz'
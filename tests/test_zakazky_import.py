@@ -0,0 +1,122 @@
+import asyncio
+import io
+from datetime import datetime
+
+import pytest
+
+from zakazky_import import (
+    FORMAT_CSV, FORMAT_XLSX, ImportFormatError, detect_format, open_import, parse_decimal, spool_upload,
+)
+
+HEADER = 'Datum;Druh práce;Zákazník;Cena;Adresa;Fee;Doba realizace;Poznámka'
+
+
+def _read_all(reader):
+    rows = []
+    while True:
+        chunk = reader.next_chunk(size=2)
+        if not chunk:
+            break
+        rows.extend(chunk)
+    reader.close()
+    return rows
+
+
+def _csv(text, encoding='utf-8'):
+    return io.BytesIO(text.encode(encoding))
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('1 234,50 Kč', 1234.5),
+    ('1.234,50', 1234.5),
+    ('1,234.50', 1234.5),
+    ("12'000,-", 12000.0),
+    ('1234.5', 1234.5),
+    (15, 15.0),
+])
+def test_parse_decimal(value, expected):
+    assert parse_decimal(value) == expected
+
+
+def test_csv_rows_with_per_row_errors():
+    text = '\n'.join([
+        HEADER,
+        '11. 4. 2025;MvČ;Novák;12 000 Kč;Praha;Ano;3;první',
+        ';;;;;;;',
+        '2025-04-12;Adam;Svoboda;abc;Brno;Ne;1,5;',
+        '31. 2. 2025;MvČ;Dvořák;500;Plzeň;;;',
+    ])
+    rows = _read_all(open_import(_csv(text, 'cp1250'), FORMAT_CSV))
+
+    assert [number for number, _, _ in rows] == [2, 4, 5]
+    number, data, errors = rows[0]
+    assert errors == []
+    assert data == {
+        'idZakazky': '', 'feeOff': 0, 'palivo': 0, 'material': 0, 'pomocnik': 0,
+        'datum': '11. 4. 2025', 'druh': 'MvČ', 'klient': 'Novák', 'castka': 12000.0, 'adresa': 'Praha',
+        'hasFee': True, 'doba_realizace': 3, 'poznamky': 'první',
+    }
+    _, data, errors = rows[1]
+    assert data['datum'] == '12. 4. 2025' and data['hasFee'] is False
+    assert [error['loc'] for error in errors] == [['castka'], ['doba_realizace']]
+    assert errors[0]['input'] == 'abc'
+    _, _, errors = rows[2]
+    assert [error['loc'] for error in errors] == [['datum']]
+
+
+def test_csv_with_comma_delimiter_and_bom():
+    text = '\ufeffdatum,druh,klient,castka,adresa,neznamy\n1. 1. 2025,MvČ,A,"1,5",X,ignorováno\n'
+    (_, data, errors), = _read_all(open_import(_csv(text), FORMAT_CSV))
+    assert errors == []
+    assert data['castka'] == 1.5 and 'neznamy' not in data
+
+
+def test_missing_required_columns():
+    with pytest.raises(ImportFormatError) as error:
+        open_import(_csv('datum;klient\n1. 1. 2025;A\n'), FORMAT_CSV)
+    assert 'druh' in str(error.value)
+    with pytest.raises(ImportFormatError):
+        open_import(_csv('\n\n'), FORMAT_CSV)
+
+
+def test_xlsx_rows():
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Datum', 'Druh', 'Klient', 'Částka', 'Adresa', 'Číslo zakázky', 'Pomocník'])
+    sheet.append([datetime(2025, 4, 11), 'MvČ', 'Novák', 12000, 'Praha', 1042.0, '=1+1'])
+    sheet.append([None, None, None, None, None, None, None])
+    sheet.append(['zítra', 'Adam', 'Svoboda', 500.5, 'Brno', 'Z-7', 0])
+    upload = io.BytesIO()
+    workbook.save(upload)
+    upload.seek(0)
+
+    rows = _read_all(open_import(upload, detect_format(None, None, upload.getvalue()[:4])))
+    assert [number for number, _, _ in rows] == [2, 4]
+    _, data, errors = rows[0]
+    assert data['datum'] == '11. 4. 2025' and data['idZakazky'] == '1042' and data['castka'] == 12000.0
+    # Vzorec bez uložené hodnoty (soubor nespočítaný Excelem) je prázdná buňka
+    assert data['pomocnik'] == 0 and errors == []
+    _, data, errors = rows[1]
+    assert data['castka'] == 500.5
+    assert [error['loc'] for error in errors] == [['datum']]
+
+
+def test_detect_format():
+    assert detect_format('csv', FORMAT_XLSX, b'PK\x03\x04') == FORMAT_CSV
+    assert detect_format(None, 'text/csv; charset=utf-8', b'PK\x03\x04') == FORMAT_CSV
+    assert detect_format(None, 'application/octet-stream', b'PK\x03\x04') == FORMAT_XLSX
+    assert detect_format(None, None, b'datum;') == FORMAT_CSV
+
+
+def test_spool_upload_limit():
+    async def chunks():
+        for _ in range(4):
+            yield b'x' * 1024
+
+    with pytest.raises(ImportFormatError) as error:
+        asyncio.run(spool_upload(chunks(), max_bytes=3000))
+    assert error.value.status_code == 413
+    upload = asyncio.run(spool_upload(chunks(), max_bytes=4096))
+    assert upload.read() == b'x' * 4096
@@ -0,0 +1,170 @@
+import asyncio
+from datetime import date, datetime, timezone
+
+import pytest
+
+from zakazky_query import (
+    QueryError, ZakazkyFilter, decode_cursor, encode_cursor, parse_cursor_args, parse_fields, parse_order_by, project,
+)
+from tests.fake_firestore import FakeFirestoreClient, started_service
+
+
+def _orders(count):
+    return [
+        {'id': f'z{i:03d}', 'castka': (i * 7) % 5 * 1000, 'klient': f'k{i % 3}', 'datum': f'{i % 28 + 1}. 4. 2025'}
+        for i in range(count)
+    ]
+
+
+def _expected(zakazky, order_by=None):
+    """Pořadí Firestore: pole řazení, při shodě ID dokumentu (ve stejném směru)"""
+    field, descending = parse_order_by(order_by)
+    key = (lambda z: z['id']) if field == '__name__' else (lambda z: (z[field], z['id']))
+    return [z['id'] for z in sorted(zakazky, key=key, reverse=descending)]
+
+
+async def _service(monkeypatch, zakazky):
+    client = FakeFirestoreClient()
+    for zakazka in zakazky:
+        data = dict(zakazka)
+        client.docs[('users', 'u1', 'zakazky', data.pop('id'))] = data
+    return await started_service(monkeypatch, client)
+
+
+async def _all_pages(service, limit, order_by=None, fields=None, filters=None):
+    pages, cursor = [], None
+    while True:
+        page, cursor = await service.get_user_zakazky_page('u1', limit, cursor, order_by, fields, filters)
+        pages.append(page)
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize('order_by', [None, 'id', 'castka', '-castka', 'klient', '-__name__'])
+@pytest.mark.parametrize('limit', [1, 7, 50])
+def test_paging_returns_every_order_once(monkeypatch, order_by, limit):
+    zakazky = _orders(43)
+
+    async def scenario():
+        service = await _service(monkeypatch, zakazky)
+        streamed = [z['id'] async for z in service.stream_user_zakazky('u1', order_by, page_size=limit)]
+        return await _all_pages(service, limit, order_by), streamed
+
+    pages, streamed = asyncio.run(scenario())
+    assert [z['id'] for page in pages for z in page] == _expected(zakazky, order_by) == streamed
+    assert all(len(page) == limit for page in pages[:-1])
+
+
+def test_paging_with_projection_keeps_cursor_field(monkeypatch):
+    zakazky = _orders(20)
+
+    async def scenario():
+        return await _all_pages(await _service(monkeypatch, zakazky), 6, '-castka', fields=['klient'])
+
+    pages = asyncio.run(scenario())
+    # Pole řazení se načte kvůli kurzoru, ve výsledku ale není
+    assert all(set(z) == {'id', 'klient'} for page in pages for z in page)
+    assert [z['id'] for page in pages for z in page] == _expected(zakazky, '-castka')
+
+
+@pytest.mark.parametrize('params, order_by', [
+    ({'date_from': '20. 4. 2025'}, None),
+    ({'date_from': '20. 4. 2025', 'date_to': '24. 4. 2025'}, '-castka'),
+    ({'klient': 'k1'}, '-castka'),
+])
+def test_paging_with_filters(monkeypatch, params, order_by):
+    import zakazky_query
+
+    # Rozsah data se filtruje až nad načtenými dokumenty - stránky se doplňují dalšími dotazy
+    monkeypatch.setattr(zakazky_query, 'DATE_PUSHDOWN', False)
+    zakazky = _orders(60)
+    filters = ZakazkyFilter.from_params(**params)
+
+    async def scenario():
+        service = await _service(monkeypatch, zakazky)
+        return await _all_pages(service, 2, order_by, filters=filters), service._db.reads
+
+    pages, reads = asyncio.run(scenario())
+    matching = [z for z in zakazky if filters.matches_all(z)]
+    assert matching and [z['id'] for page in pages for z in page] == _expected(matching, order_by)
+    assert all(len(page) == 2 for page in pages[:-1])
+    if filters.post_filtered:
+        assert reads > len(pages)
+
+
+def test_cursor_roundtrip_keeps_value_and_id():
+    stamp = datetime(2025, 4, 11, 8, 30, tzinfo=timezone.utc)
+    cursor = encode_cursor('updated_at', True, {'id': 'abc', 'updated_at': stamp})
+    assert decode_cursor(cursor, 'updated_at', True) == {'__name__': 'abc', 'updated_at': stamp}
+
+
+def test_cursor_for_other_ordering_is_rejected():
+    cursor = encode_cursor('castka', False, {'id': 'abc', 'castka': 1000})
+    with pytest.raises(QueryError):
+        decode_cursor(cursor, 'castka', True)
+    with pytest.raises(QueryError):
+        decode_cursor(cursor, 'zisk', False)
+
+
+@pytest.mark.parametrize('cursor', ['!!!', 'e30', 'bm90LWpzb24'])
+def test_invalid_cursor(cursor):
+    with pytest.raises(QueryError):
+        parse_cursor_args(None, cursor)
+
+
+def test_order_by_only_on_fields_every_order_has():
+    assert parse_order_by('-castka') == ('castka', True)
+    assert parse_order_by('id') == ('__name__', False)
+    for field in ('datum', 'typ', 'updated_at', 'neexistuje'):
+        with pytest.raises(QueryError):
+            parse_order_by(field)
+
+
+def test_fields_projection_keeps_id():
+    fields = parse_fields('datum, castka,id,castka')
+    assert fields == ['datum', 'castka']
+    assert project({'id': 'z1', 'datum': '1. 4. 2025', 'castka': 5, 'zisk': 2}, fields) == {
+        'datum': '1. 4. 2025', 'castka': 5, 'id': 'z1',
+    }
+    with pytest.raises(QueryError):
+        parse_fields('heslo')
+
+
+FILTERED = [
+    {'id': 'a', 'druh': 'MvČ', 'klient': 'Novák', 'datum': '11. 4. 2025'},
+    {'id': 'b', 'druh': 'MvČ', 'klient': 'Svoboda', 'datum': '2025-04-30'},
+    {'id': 'c', 'druh': 'Adam', 'klient': 'Novák', 'datum': '1. 5. 2025'},
+    {'id': 'd', 'druh': 'MvČ', 'klient': 'Novák', 'datum': 'zítra'},
+]
+
+
+@pytest.mark.parametrize('params, expected', [
+    ({}, ['a', 'b', 'c', 'd']),
+    ({'druh': 'MvČ'}, ['a', 'b', 'd']),
+    ({'klient': 'Novák', 'druh': 'MvČ'}, ['a', 'd']),
+    ({'date_from': '2025-04-11'}, ['a', 'b', 'c']),
+    ({'date_from': '12. 4. 2025', 'date_to': '30. 4. 2025'}, ['b']),
+    ({'date_to': '2025-04-11', 'klient': 'Novák'}, ['a']),
+])
+def test_filter_matches_all(params, expected):
+    filters = ZakazkyFilter.from_params(**params)
+    assert [z['id'] for z in FILTERED if filters.matches_all(z)] == expected
+
+
+def test_filter_date_range_needs_datum_when_post_filtered(monkeypatch):
+    import zakazky_query
+
+    filters = ZakazkyFilter.from_params(date_from='1. 4. 2025')
+    assert filters.date_from == date(2025, 4, 1)
+    monkeypatch.setattr(zakazky_query, 'DATE_PUSHDOWN', False)
+    assert filters.post_filtered and filters.required_fields() == ['datum']
+    assert not filters.matches({'id': 'x', 'datum': '31. 3. 2025'})
+    monkeypatch.setattr(zakazky_query, 'DATE_PUSHDOWN', True)
+    assert not filters.post_filtered and filters.required_fields() == []
+    assert filters.matches({'id': 'x', 'datum': '31. 3. 2025'})
+
+
+def test_filter_rejects_invalid_date():
+    with pytest.raises(QueryError):
+        ZakazkyFilter.from_params(date_from='32. 13. 2025')
+    assert ZakazkyFilter.from_params(druh='', klient='').is_empty
@@ -0,0 +1,117 @@
+import random
+from datetime import date
+
+import pytest
+
+import zakazky_stats
+from zakazky_stats import (
+    SUMMARY_KEY, aggregate_diff, build_rollups, build_summary, merge_aggregates, nested, period_date, period_key,
+    periods, rollup_fields, summary_view,
+)
+
+DRUHY = ['MvČ', 'Adam', 'Korálek', None]
+
+
+def _random_order(rng):
+    zakazka = {
+        'druh': rng.choice(DRUHY),
+        'datum': f"{rng.randint(1, 28)}. {rng.randint(1, 12)}. {rng.choice([2024, 2025])}",
+        'idZakazky': rng.choice(['Z1', 'Z2', 'CAL-7']),
+    }
+    for field in zakazky_stats.SUMMARY_SUM_FIELDS:
+        zakazka[field] = rng.randint(0, 20000)
+    return zakazka
+
+
+def _replay(seed, steps=300):
+    """Náhodné vytváření, úpravy a mazání; vrací (konečné zakázky, sečtené rozdíly agregací)"""
+    rng = random.Random(seed)
+    zakazky, totals = {}, {}
+    for step in range(steps):
+        action = rng.random()
+        if not zakazky or action < 0.4:
+            old, new, zakazka_id = None, _random_order(rng), f'z{step}'
+        elif action < 0.8:
+            zakazka_id = rng.choice(sorted(zakazky))
+            old = zakazky[zakazka_id]
+            new = dict(old, **{k: v for k, v in _random_order(rng).items() if rng.random() < 0.5})
+        else:
+            zakazka_id = rng.choice(sorted(zakazky))
+            old, new = zakazky[zakazka_id], None
+        merge_aggregates(totals, aggregate_diff(old, new))
+        if new is None:
+            del zakazky[zakazka_id]
+        else:
+            zakazky[zakazka_id] = new
+    return list(zakazky.values()), totals
+
+
+def test_summary_diffs_match_rebuild():
+    for seed in range(5):
+        zakazky, totals = _replay(seed)
+        assert summary_view(nested(totals.get(SUMMARY_KEY, {}))) == summary_view(build_summary(zakazky))
+
+
+def test_calendar_orders_are_not_counted():
+    zakazka = {'idZakazky': 'CAL-1', 'druh': 'MvČ', 'castka': 1000, 'datum': '1. 4. 2025'}
+    assert aggregate_diff(None, zakazka) == {}
+    assert aggregate_diff(None, dict(zakazka, idZakazky='Z1', calendar_origin=True)) == {}
+
+
+def test_update_outside_summary_fields_changes_nothing():
+    zakazka = {'druh': 'MvČ', 'castka': 1000, 'zisk': 400, 'datum': '1. 4. 2025'}
+    assert not zakazky_stats.touches_summary(['telefon', 'poznamky'])
+    assert aggregate_diff(zakazka, dict(zakazka, telefon='777')) == {}
+
+
+def test_summary_view():
+    view = summary_view(build_summary([
+        {'druh': 'MvČ', 'castka': 1000, 'zisk': 400, 'fee': 261},
+        {'druh': 'MvČ', 'castka': '500', 'zisk': 101},
+        {'castka': 200, 'zisk': 'x'},
+    ]))
+    assert view['pocetZakazek'] == 3
+    assert view['celkoveTrzby'] == 1700
+    assert view['prumernyZisk'] == 167
+    assert view['rozlozeni'] == {'MvČ': 501, zakazky_stats.UNCATEGORIZED: 0}
+    assert view['naklady']['fee'] == 261
+
+
+def test_rollup_diffs_match_rebuild():
+    for seed in range(5):
+        zakazky, totals = _replay(seed)
+        incremental = {
+            doc_id: dict(nested(total), **rollup_fields(doc_id))
+            for doc_id, total in totals.items()
+            if doc_id != SUMMARY_KEY and total.get(('pocet',))
+        }
+        assert incremental == build_rollups(zakazky)
+
+
+def test_moving_an_order_moves_its_rollup():
+    zakazka = {'druh': 'MvČ', 'castka': 1000, 'zisk': 400, 'datum': '30. 4. 2025'}
+    deltas = aggregate_diff(zakazka, dict(zakazka, datum='1. 5. 2025'))
+    assert SUMMARY_KEY not in deltas
+    assert deltas['month:2025-04'][('castka',)] == -1000
+    assert deltas['month:2025-05'][('pocet',)] == 1
+    assert 'week:2025-W18' not in deltas  # 30. 4. i 1. 5. 2025 jsou ve stejném ISO týdnu
+
+
+@pytest.mark.parametrize('granularity, day, key', [
+    ('month', date(2025, 4, 11), '2025-04'),
+    ('week', date(2025, 4, 11), '2025-W15'),
+    ('week', date(2024, 12, 30), '2025-W01'),
+    ('day', date(2025, 4, 11), '2025-04-11'),
+])
+def test_period_key_roundtrip(granularity, day, key):
+    assert period_key(granularity, day) == key
+    assert period_date(granularity, key) == zakazky_stats.period_start(granularity, day)
+
+
+def test_periods_cover_range_without_gaps():
+    months = periods('month', date(2024, 11, 15), date(2025, 2, 1))
+    assert [key for key, _ in months] == ['2024-11', '2024-12', '2025-01', '2025-02']
+    weeks = periods('week', date(2025, 1, 1), date(2025, 1, 31))
+    assert weeks[0] == ('2025-W01', date(2024, 12, 30))
+    assert len(weeks) == 5
+    assert len(periods('day', date(2024, 2, 1), date(2024, 3, 1))) == 30